@@ -0,0 +1,38 @@
+"""Add product embedding (pgvector)
+
+Revision ID: 3f9a1c2b7d40
+Revises: deeb946775c8
+Create Date: 2026-10-18 09:12:40.118204+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import pgvector.sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2b7d40'
+down_revision: Union[str, None] = 'deeb946775c8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    op.add_column('products', sa.Column('embedding', pgvector.sqlalchemy.Vector(dim=512), nullable=True))
+    op.create_index(
+        'ix_products_embedding_hnsw',
+        'products',
+        ['embedding'],
+        unique=False,
+        postgresql_using='hnsw',
+        postgresql_with={'m': 16, 'ef_construction': 64},
+        postgresql_ops={'embedding': 'vector_cosine_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_embedding_hnsw', table_name='products', postgresql_using='hnsw')
+    op.drop_column('products', 'embedding')
@@ -0,0 +1,101 @@
+"""Partition search_tasks by month of created_at
+
+Revision ID: 8b4d2f6e1a93
+Revises: 3f9a1c2b7d40
+Create Date: 2026-10-18 14:03:27.504711+00:00
+
+"""
+import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b4d2f6e1a93'
+down_revision: Union[str, None] = '3f9a1c2b7d40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Số tháng tạo sẵn partition phía trước (sau đó job dọn dẹp định kỳ tạo tiếp)
+MONTHS_AHEAD = 3
+
+
+def _add_months(month: datetime.datetime, n: int) -> datetime.datetime:
+    index = month.year * 12 + month.month - 1 + n
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def _create_search_tasks(partitioned: bool) -> None:
+    # Bảng partition: khoá chính phải chứa khoá partition -> (id, created_at)
+    op.execute(f"""
+        CREATE TABLE search_tasks (
+            id UUID NOT NULL,
+            user_id UUID REFERENCES users (id),
+            status VARCHAR,
+            input_image_url VARCHAR,
+            result JSON,
+            error_message VARCHAR,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            updated_at TIMESTAMP WITH TIME ZONE,
+            PRIMARY KEY ({'id, created_at' if partitioned else 'id'})
+        ){' PARTITION BY RANGE (created_at)' if partitioned else ''}
+    """)
+
+
+def _copy_rows(source: str) -> None:
+    op.execute(f"""
+        INSERT INTO search_tasks (id, user_id, status, input_image_url, result, error_message, created_at, updated_at)
+        SELECT id, user_id, status, input_image_url, result, error_message, COALESCE(created_at, now()), updated_at
+        FROM {source}
+    """)
+
+
+def _create_indexes() -> None:
+    op.create_index(op.f('ix_search_tasks_status'), 'search_tasks', ['status'], unique=False)
+    op.create_index('ix_search_tasks_user_id_created_at', 'search_tasks', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def upgrade() -> None:
+    # Postgres không chuyển bảng thường thành bảng partition tại chỗ:
+    # đổi tên bảng cũ -> tạo bảng partition -> chép dữ liệu -> xoá bảng cũ
+    op.rename_table('search_tasks', 'search_tasks_unpartitioned')
+    op.execute("ALTER INDEX ix_search_tasks_status RENAME TO ix_search_tasks_status_unpartitioned")
+    op.execute("ALTER TABLE search_tasks_unpartitioned RENAME CONSTRAINT search_tasks_pkey TO search_tasks_unpartitioned_pkey")
+
+    _create_search_tasks(partitioned=True)
+    # Dòng không thuộc partition tháng nào (chưa kịp tạo) rơi vào đây thay vì lỗi INSERT
+    op.execute("CREATE TABLE search_tasks_default PARTITION OF search_tasks DEFAULT")
+
+    # 1 partition / tháng: từ tháng của task cũ nhất tới MONTHS_AHEAD tháng sau tháng hiện tại
+    bind = op.get_bind()
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM search_tasks_unpartitioned")).scalar()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    month = (oldest or now).astimezone(datetime.timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last = _add_months(now.replace(day=1, hour=0, minute=0, second=0, microsecond=0), MONTHS_AHEAD)
+    while month <= last:
+        end = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE search_tasks_p{month:%Y_%m} PARTITION OF search_tasks "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{end.isoformat()}')"
+        )
+        month = end
+
+    _copy_rows('search_tasks_unpartitioned')
+    op.drop_table('search_tasks_unpartitioned')
+    # Index tạo trên bảng cha -> tự tạo trên mọi partition (kể cả partition tạo sau này)
+    _create_indexes()
+
+
+def downgrade() -> None:
+    op.rename_table('search_tasks', 'search_tasks_partitioned')
+    op.drop_index('ix_search_tasks_user_id_created_at', table_name='search_tasks_partitioned')
+    op.drop_index(op.f('ix_search_tasks_status'), table_name='search_tasks_partitioned')
+    op.execute("ALTER TABLE search_tasks_partitioned RENAME CONSTRAINT search_tasks_pkey TO search_tasks_partitioned_pkey")
+
+    _create_search_tasks(partitioned=False)
+    _copy_rows('search_tasks_partitioned')
+    # Xoá bảng cha partition xoá luôn mọi partition
+    op.drop_table('search_tasks_partitioned')
+    op.create_index(op.f('ix_search_tasks_status'), 'search_tasks', ['status'], unique=False)
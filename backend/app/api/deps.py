@@ -1,13 +1,17 @@
 from typing import Generator, Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Form, HTTPException, Query, status
+from pydantic import ValidationError
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
-from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
 from app.core import security
+from app.core.metrics import REJECTED_REQUESTS
 from app.db.session import AsyncSessionLocal
 from app.db.models.user import User
 from app.schemas.token import TokenPayload
+from app.schemas.search import SearchFilters
+from app.services.principal_cache import principal_cache
+from app.services.rate_limit import search_rate_limiter
 from sqlalchemy import select
 
 # Token URL này chỉ để Swagger UI biết chỗ login
@@ -18,7 +22,6 @@ async def get_db() -> Generator:
         yield session
 
 async def get_current_user(
-    db: AsyncSession = Depends(get_db),
     token: str = Depends(reusable_oauth2)
 ) -> User:
     try:
@@ -29,11 +32,71 @@ async def get_current_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    
-    # Query Async
-    result = await db.execute(select(User).where(User.id == token_data.sub))
-    user = result.scalars().first()
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return user
\ No newline at end of file
+
+    # Fast lane: user vừa xác thực gần đây -> không cần Postgres (và không mượn connection nào)
+    user = principal_cache.get(token_data.sub)
+    if user is None:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(User).where(User.id == token_data.sub))
+            user = result.scalars().first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        principal_cache.set(user)
+
+    if user.is_active is False:
+        raise HTTPException(status_code=403, detail="Inactive user")
+    return user
+
+def too_many_requests(detail: str, retry_after: int, reason: str) -> HTTPException:
+    REJECTED_REQUESTS.labels(reason=reason).inc()
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(retry_after)},
+    )
+
+async def check_rate_limit(user: User, cost: int = 1):
+    """Token bucket theo user cho các endpoint tìm kiếm (batch: cost = số ảnh)."""
+    decision = await search_rate_limiter.acquire(user.id, cost)
+    if not decision.allowed:
+        raise too_many_requests("Rate limit exceeded", decision.retry_after, "rate_limit")
+
+async def get_rate_limited_user(
+    current_user: User = Depends(get_current_user)
+) -> User:
+    await check_rate_limit(current_user)
+    return current_user
+
+def get_search_filters(
+    category: Optional[str] = Form(None),
+    min_price: Optional[float] = Form(None),
+    max_price: Optional[float] = Form(None),
+    currency: Optional[str] = Form(None),
+) -> SearchFilters:
+    """Đọc filter từ multipart form (đi kèm file ảnh)."""
+    try:
+        return SearchFilters(
+            category=category,
+            min_price=min_price,
+            max_price=max_price,
+            currency=currency,
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=[err["msg"] for err in e.errors()])
+
+def get_query_filters(
+    category: Optional[str] = Query(None),
+    min_price: Optional[float] = Query(None),
+    max_price: Optional[float] = Query(None),
+    currency: Optional[str] = Query(None),
+) -> SearchFilters:
+    """Đọc filter từ query string (các endpoint GET)."""
+    try:
+        return SearchFilters(
+            category=category,
+            min_price=min_price,
+            max_price=max_price,
+            currency=currency,
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=[err["msg"] for err in e.errors()])
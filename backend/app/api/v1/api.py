@@ -1,6 +1,7 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, search
+from app.api.v1.endpoints import auth, search, stylist
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
 api_router.include_router(search.router, prefix="/search", tags=["search"])
+api_router.include_router(stylist.router, prefix="/stylist", tags=["stylist"])
@@ -6,6 +6,7 @@ from sqlalchemy import select
 
 from app.api import deps
 from app.core import security
+from app.services.principal_cache import principal_cache
 from app.db.models.user import User
 from app.schemas.user import UserCreate, UserResponse
 from app.schemas.token import Token
@@ -30,7 +31,7 @@ async def register(
     
     user = User(
         email=user_in.email,
-        hashed_password=security.get_password_hash(user_in.password),
+        hashed_password=await security.get_password_hash_async(user_in.password),
         full_name=user_in.full_name,
     )
     db.add(user)
@@ -49,9 +50,13 @@ async def login(
     result = await db.execute(select(User).where(User.email == form_data.username))
     user = result.scalars().first()
 
-    if not user or not security.verify_password(form_data.password, user.hashed_password):
+    if not user or not await security.verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect email or password")
-    
+    if user.is_active is False:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    # User vừa đăng nhập sẽ gọi API ngay -> nạp sẵn vào cache
+    principal_cache.set(user)
+
     return {
         "access_token": security.create_access_token(user.id),
         "token_type": "bearer",
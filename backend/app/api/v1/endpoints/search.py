@@ -1,61 +1,361 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import defer
+from typing import List, Optional, Tuple
 from uuid import UUID
+import base64
+import datetime
+import uuid
 
-from app.services.storage import S3Client
+from app.core.preprocess import ImageTooLarge, open_image
+from app.core.config import settings
+from app.core.metrics import SEARCH_REQUESTS
+from app.core.tracing import span
+from app.services.storage import storage
+from app.services.search_cache import search_cache, hash_image
+from app.services.inline_search import inline_search
+from app.services.text_search import text_search
+from app.services.product_cache import product_cache
+from app.services.batch_search import batch_search, fuse_rankings
+from app.services.task_events import TaskEventSubscription, build_event
+from app.services.task_results import compact_result, hydrate_result
+from app.services.task_state import task_state
+from app.services.admission import admission_control
 from app.api import deps
 from app.db.models.user import User
-from app.db.models.task import SearchTask
-from app.schemas.task import TaskCreateResponse, TaskStatusResponse
+from app.db.models.task import SearchTask, utcnow
+from app.schemas.task import TaskCreateResponse, TaskStatusResponse, TaskHistoryResponse
+from app.schemas.search import (
+    SearchFilters, SearchResponse, ProductResponse, TextSearchRequest, BatchImageResult, BatchSearchResponse,
+)
 
 # Import task từ worker (chỉ import function definition)
-from app.worker.tasks import process_visual_search
+from app.worker.tasks import process_visual_search, attach_stylist_advice, build_search_result, advice_pending
 
 router = APIRouter()
 
 @router.post("/visual", response_model=TaskCreateResponse)
 async def search_visual(
     file: UploadFile = File(...),
+    filters: SearchFilters = Depends(deps.get_search_filters),
     db: AsyncSession = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
+    current_user: User = Depends(deps.get_rate_limited_user)
 ):
     # Validate
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
-    
-    # 1. Upload S3
-    s3_client = S3Client()
-    file_key = await s3_client.upload_file(file)
-    
-    # 2. Lưu Task vào DB (PENDING)
+
+    # 0. Hash nội dung ảnh -> key cho cache và S3 (cùng ảnh = cùng key)
+    contents = await file.read()
+    # Chỉ đọc header (rẻ): từ chối ảnh hỏng / decompression bomb trước khi tốn S3 + worker
+    try:
+        open_image(contents)
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid image file")
+    image_hash = hash_image(contents)
+
+    # Cache hit kết quả: bỏ qua S3, CLIP và Vector DB, trả task COMPLETED luôn
+    with span("cache_lookup"):
+        cached_result = await run_in_threadpool(search_cache.get_results, image_hash, 5, filters)
+    if cached_result is not None:
+        new_task = SearchTask(
+            user_id=current_user.id,
+            input_image_url=None,
+            status="COMPLETED",
+            result=compact_result(cached_result)
+        )
+        with span("db_insert"):
+            db.add(new_task)
+            await db.commit()
+            await db.refresh(new_task)
+        await task_state.asave(new_task, cached_result, final=True)
+        SEARCH_REQUESTS.labels(served_by="cache").inc()
+        # Entry cache ghi trước khi Stylist trả lời (hoặc Stylist lỗi) -> hỏi lại cho task này
+        if advice_pending(cached_result):
+            attach_stylist_advice.delay(
+                str(new_task.id),
+                image_hash,
+                filters.model_dump(exclude_none=True) or None,
+                created_at=new_task.created_at.isoformat()
+            )
+        return {
+            "task_id": new_task.id,
+            "created_at": new_task.created_at,
+            "status": "COMPLETED",
+            "message": "Served from cache.",
+            "served_by": "cache",
+            "result": cached_result
+        }
+
+    # Lane inference đang ùn (queue dài / task cũ nhất chờ quá lâu): từ chối ngay, trước cả
+    # inline search (không nhận thêm inference trong API), không upload S3, không tạo task
+    # phải chờ hàng phút -> client thử lại sau Retry-After
+    decision = await admission_control.check()
+    if not decision.admitted:
+        raise deps.too_many_requests("Search queue is busy, please retry later", decision.retry_after, decision.reason)
+
+    # Fast path: queue đang rảnh thì tìm luôn trong request với bytes đang có,
+    # không qua S3 + Celery. Quá budget/đang bận -> None -> đi luồng task như cũ.
+    with span("inline_search"):
+        products = await inline_search.try_search(contents, image_hash, filters)
+    if products is not None:
+        inline_result = build_search_result(products) if products else []
+        new_task = SearchTask(
+            user_id=current_user.id,
+            input_image_url=None,
+            status="COMPLETED",
+            result=compact_result(inline_result)
+        )
+        with span("db_insert"):
+            db.add(new_task)
+            await db.commit()
+            await db.refresh(new_task)
+        # Client poll / stream chờ lời khuyên Stylist -> đọc từ Redis
+        await task_state.asave(new_task, inline_result, final=True)
+        await run_in_threadpool(search_cache.set_results, image_hash, inline_result, 5, filters)
+        SEARCH_REQUESTS.labels(served_by="inline").inc()
+        # Stylist (Gemini) chậm hơn budget nhiều -> bổ sung sau trên queue "llm"
+        if products:
+            attach_stylist_advice.delay(
+                str(new_task.id),
+                image_hash,
+                filters.model_dump(exclude_none=True) or None,
+                created_at=new_task.created_at.isoformat()
+            )
+        return {
+            "task_id": new_task.id,
+            "created_at": new_task.created_at,
+            "status": "COMPLETED",
+            "message": "Served inline.",
+            "served_by": "inline",
+            "result": inline_result
+        }
+
+    # 1. Upload S3 (key theo hash). Nếu embedding đã có trong cache thì
+    # worker không cần tải ảnh nữa -> bỏ qua luôn bước upload.
+    file_extension = file.filename.split(".")[-1] if file.filename and "." in file.filename else "jpg"
+    file_key = f"{image_hash}.{file_extension}"
+    if not await run_in_threadpool(search_cache.has_embedding, image_hash):
+        with span("s3_upload"):
+            await storage.upload_bytes(contents, file_key, content_type=file.content_type, sha256_hex=image_hash)
+
+    # 2. Tạo Task (PENDING): task đang chạy chỉ sống trong Redis (hot store),
+    # worker ghi Postgres 1 lần khi task kết thúc. Redis lỗi -> ghi Postgres như trước.
     new_task = SearchTask(
+        id=uuid.uuid4(),
         user_id=current_user.id,
         input_image_url=file_key,
-        status="PENDING"
+        status="PENDING",
+        created_at=utcnow()
     )
-    db.add(new_task)
-    await db.commit()
-    await db.refresh(new_task)
-    
+    with span("task_state_save"):
+        saved = await task_state.asave(new_task)
+    if not saved:
+        with span("db_insert"):
+            db.add(new_task)
+            await db.commit()
+
     # 3. KÍCH HOẠT WORKER (QUAN TRỌNG NHẤT)
     # .delay() sẽ gửi message vào Redis, Worker sẽ bắt lấy và chạy nền
-    process_visual_search.delay(str(new_task.id))
-    
+    # Kèm đủ thông tin để worker dựng lại task nếu key Redis hết hạn / bị evict trong lúc chờ queue
+    process_visual_search.delay(
+        str(new_task.id),
+        image_hash,
+        filters.model_dump(exclude_none=True) or None,
+        user_id=str(current_user.id),
+        input_image_url=file_key,
+        created_at=new_task.created_at.isoformat()
+    )
+    SEARCH_REQUESTS.labels(served_by="queue").inc()
+
     return {
         "task_id": new_task.id,
+        "created_at": new_task.created_at,
         "status": "PENDING",
-        "message": "Image uploaded. AI processing started."
+        "message": "Image uploaded. AI processing started.",
+        "served_by": "queue"
     }
 
+@router.post("/visual/batch", response_model=BatchSearchResponse)
+async def search_visual_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    k: int = Form(5, ge=1, le=50),
+    fuse: bool = Form(False),
+    filters: SearchFilters = Depends(deps.get_search_filters),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    Nhiều ảnh (1 bộ outfit, nhiều góc chụp) trong 1 request multipart: embed chung 1 batch,
+    1 lần multi-query vector search, trả kết quả từng ảnh (+ xếp hạng gộp nếu fuse=true).
+    Ảnh lỗi chỉ làm hỏng phần kết quả của chính nó.
+    """
+    if len(files) > settings.BATCH_SEARCH_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_SEARCH_MAX_IMAGES} images per request")
+    # Mỗi ảnh 1 token: 1 request batch không lách được rate limit
+    await deps.check_rate_limit(current_user, cost=len(files))
+
+    images = [BatchImageResult(index=i, filename=f.filename) for i, f in enumerate(files)]
+    valid, contents = [], []
+    for entry, file in zip(images, files):
+        if not (file.content_type or "").startswith("image/"):
+            entry.error = "File must be an image"
+            continue
+        data = await file.read()
+        try:
+            open_image(data)
+        except ValueError as e:
+            entry.error = str(e) if isinstance(e, ImageTooLarge) else "Invalid image file"
+            continue
+        valid.append(entry)
+        contents.append(data)
+
+    outcomes = await run_in_threadpool(batch_search.search, contents, k, filters) if contents else []
+
+    base_url = str(request.base_url).rstrip("/")
+    product_lists = []
+    for entry, outcome in zip(valid, outcomes):
+        if isinstance(outcome, Exception):
+            entry.error = str(outcome) or "Search failed"
+            continue
+        product_lists.append(outcome)
+        entry.results = [ProductResponse.from_product(p, base_url) for p in outcome]
+
+    fused = None
+    if fuse:
+        fused = [ProductResponse.from_product(p, base_url) for p in fuse_rankings(product_lists, k)]
+    return BatchSearchResponse(images=images, fused=fused)
+
+async def _search_text(request: Request, query: str, k: int, filters: SearchFilters) -> SearchResponse:
+    query = query.strip()
+    if not query:
+        raise HTTPException(status_code=422, detail="Query must not be empty")
+    # Encode text (CPU) + truy vấn Vector DB: chạy trong threadpool
+    products = await run_in_threadpool(text_search.search, query, k, filters)
+    # Không lọc theo SEARCH_THRESHOLD như tìm bằng ảnh: độ tương đồng text-ảnh của CLIP
+    # thấp hơn hẳn ảnh-ảnh, top-k theo thứ tự là đủ.
+    base_url = str(request.base_url).rstrip("/")
+    return SearchResponse(results=[ProductResponse.from_product(p, base_url) for p in products])
+
+@router.get("/text", response_model=SearchResponse)
+async def search_text(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=settings.TEXT_QUERY_MAX_LENGTH),
+    k: int = Query(5, ge=1, le=50),
+    filters: SearchFilters = Depends(deps.get_query_filters),
+    current_user: User = Depends(deps.get_rate_limited_user)
+):
+    """Tìm sản phẩm bằng câu mô tả, vd: /search/text?q=váy hoa đi biển"""
+    return await _search_text(request, q, k, filters)
+
+@router.post("/text", response_model=SearchResponse)
+async def search_text_post(
+    request: Request,
+    body: TextSearchRequest,
+    current_user: User = Depends(deps.get_rate_limited_user)
+):
+    return await _search_text(request, body.query, body.k, body.filters)
+
+@router.get("/cache/stats")
+async def get_cache_stats(
+    current_user: User = Depends(deps.get_current_user)
+):
+    """Số lần hit/miss/evict của cache embedding, cache kết quả, cache vector truy vấn text và cache sản phẩm."""
+    stats = await run_in_threadpool(search_cache.stats)
+    return {**stats, "text_embeddings": text_search.stats(), "products": product_cache.stats()}
+
+def _encode_cursor(task: SearchTask) -> str:
+    raw = f"{task.created_at.isoformat()}|{task.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> Tuple[datetime.datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, task_id = raw.split("|")
+        return datetime.datetime.fromisoformat(created_at), UUID(task_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/tasks", response_model=TaskHistoryResponse)
+async def list_tasks(
+    limit: int = Query(20, ge=1, le=settings.SEARCH_TASK_HISTORY_MAX_LIMIT),
+    cursor: Optional[str] = Query(None),
+    include_results: bool = Query(False),
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    Lịch sử tìm kiếm, mới nhất trước. Keyset pagination trên (user_id, created_at, id):
+    mỗi trang là 1 lần quét index, không OFFSET (không chậm dần ở các trang sau).
+    Mặc định không kèm result (nặng), include_results=true để lấy kèm.
+    Task đi queue chỉ có dòng Postgres khi đã kết thúc (trước đó nằm trong Redis) nên chưa có ở đây.
+    """
+    query = (
+        select(SearchTask)
+        .where(SearchTask.user_id == current_user.id)
+        .order_by(SearchTask.created_at.desc(), SearchTask.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        created_at, task_id = _decode_cursor(cursor)
+        query = query.where(tuple_(SearchTask.created_at, SearchTask.id) < tuple_(created_at, task_id))
+    if not include_results:
+        query = query.options(defer(SearchTask.result))
+    tasks = (await db.execute(query)).scalars().all()
+
+    page = tasks[:limit]
+    results = [None] * len(page)
+    if include_results:
+        # 1 lần vào threadpool cho cả trang (product_cache gom theo từng task)
+        results = await run_in_threadpool(lambda: [hydrate_result(task.result) for task in page])
+    items = [
+        TaskStatusResponse(
+            task_id=task.id,
+            status=task.status,
+            result=result,
+            error=task.error_message,
+            created_at=task.created_at,
+        )
+        for task, result in zip(page, results)
+    ]
+    next_cursor = _encode_cursor(page[-1]) if len(tasks) > limit else None
+    return TaskHistoryResponse(items=items, next_cursor=next_cursor)
+
+async def _find_task(db: AsyncSession, task_id: UUID, created_at: Optional[datetime.datetime]) -> Optional[SearchTask]:
+    # PK (id, created_at) trên bảng partition: có created_at (client nhận lúc tạo task)
+    # thì Postgres chỉ quét partition của tháng đó, không có thì dò mọi partition
+    query = select(SearchTask).where(SearchTask.id == task_id)
+    if created_at is not None:
+        query = query.where(SearchTask.created_at == created_at)
+    result = await db.execute(query)
+    return result.scalars().first()
+
 @router.get("/tasks/{task_id}", response_model=TaskStatusResponse)
 async def get_task_status(
     task_id: UUID,
+    created_at: Optional[datetime.datetime] = Query(None),
     db: AsyncSession = Depends(deps.get_db),
     current_user: User = Depends(deps.get_current_user)
 ):
-    result = await db.execute(select(SearchTask).where(SearchTask.id == task_id))
-    task = result.scalars().first()
+    # Task đang chạy (hoặc vừa xong): Redis, không chạm Postgres
+    state = await task_state.aload(task_id)
+    if state is not None:
+        if state["user_id"] != str(current_user.id):
+            raise HTTPException(status_code=403, detail="Not authorized to view this task")
+        return {
+            "task_id": task_id,
+            "status": state["status"],
+            "result": state["result"],
+            "error": state["error"],
+            "created_at": state["created_at"]
+        }
+
+    task = await _find_task(db, task_id, created_at)
     
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -66,7 +366,51 @@ async def get_task_status(
     return {
         "task_id": task.id,
         "status": task.status,
-        "result": task.result,
+        "result": await run_in_threadpool(hydrate_result, task.result),
         "error": task.error_message,
         "created_at": task.created_at
-    }
\ No newline at end of file
+    }
+
+@router.get("/tasks/{task_id}/events")
+async def stream_task_status(
+    task_id: UUID,
+    created_at: Optional[datetime.datetime] = Query(None),
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: User = Depends(deps.get_current_user)
+):
+    """
+    Server-Sent Events thay cho polling: gửi trạng thái hiện tại, sau đó đẩy
+    mỗi lần worker đổi trạng thái (PROCESSING, COMPLETED kèm kết quả, FAILED)
+    và đóng stream khi task kết thúc.
+    """
+    # Subscribe trước rồi mới đọc trạng thái -> không lỡ event nào xảy ra ở giữa
+    subscription = TaskEventSubscription(str(task_id))
+    await subscription.subscribe()
+    try:
+        # Trạng thái hiện tại: Redis trước (task đang chạy), không có mới đọc Postgres
+        state = await task_state.aload(task_id)
+        if state is not None:
+            if state["user_id"] != str(current_user.id):
+                raise HTTPException(status_code=403, detail="Not authorized to view this task")
+            initial = build_event(task_id, state["status"], state["result"], state["error"])
+        else:
+            task = await _find_task(db, task_id, created_at)
+
+            if not task:
+                raise HTTPException(status_code=404, detail="Task not found")
+
+            if task.user_id != current_user.id:
+                raise HTTPException(status_code=403, detail="Not authorized to view this task")
+            initial = build_event(task.id, task.status, await run_in_threadpool(hydrate_result, task.result), task.error_message)
+    except Exception:
+        await subscription.close()
+        raise
+
+    # Trả connection Postgres về pool ngay, stream có thể mở vài phút
+    await db.close()
+
+    return StreamingResponse(
+        subscription.stream(initial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,85 @@
+import json
+from typing import Iterator
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from app.api import deps
+from app.db.models.user import User
+from app.schemas.stylist import AdviceRequest, AdviceResponse
+from app.services.ai.stylist import stylist_service
+from app.services.product_cache import product_cache
+
+router = APIRouter()
+
+
+async def get_product_or_404(product_id: str) -> dict:
+    """Retrieval: lấy thông tin sản phẩm qua product_cache (Postgres là nguồn thật, chỉ chạm khi miss)."""
+    try:
+        product_id = str(UUID(product_id))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Product not found")
+    product = await run_in_threadpool(product_cache.get, product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return product
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _stream_advice_events(product: dict, user_question: str) -> Iterator[str]:
+    try:
+        for text in stylist_service.stream_advice(product, user_question):
+            yield _sse("token", {"text": text})
+    except Exception as e:
+        print(f"❌ Lỗi khi stream Gemini: {e}")
+        yield _sse("error", {"detail": "Xin lỗi, stylist đang bận suy nghĩ, bạn thử lại sau nhé!"})
+        return
+    yield _sse("done", {"product_id": product["id"]})
+
+
+@router.post("/advice", response_model=AdviceResponse)
+async def get_styling_advice(
+    request: AdviceRequest,
+    # Mỗi cache miss là 1 lần gọi Gemini (tốn tiền): bắt buộc đăng nhập + rate limit theo user
+    current_user: User = Depends(deps.get_rate_limited_user)
+):
+    """
+    RAG Endpoint:
+    1. Lấy thông tin sản phẩm từ DB (Retrieval)
+    2. Gửi context + câu hỏi cho LLM (Generation)
+    """
+    product = await get_product_or_404(request.product_id)
+
+    advice = await stylist_service.get_advice(
+        product_metadata=product,
+        user_question=request.user_question
+    )
+
+    return AdviceResponse(
+        product_id=request.product_id,
+        advice=advice
+    )
+
+
+@router.post("/advice/stream")
+async def stream_styling_advice(
+    request: AdviceRequest,
+    current_user: User = Depends(deps.get_rate_limited_user)
+):
+    """
+    Như /advice nhưng stream qua Server-Sent Events:
+    `token` cho mỗi đoạn text model sinh ra, rồi `done` (hoặc `error`).
+    """
+    # Không giữ connection Postgres nào trong lúc stream (LLM có thể mất vài giây)
+    product = await get_product_or_404(request.product_id)
+
+    return StreamingResponse(
+        _stream_advice_events(product, request.user_question),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
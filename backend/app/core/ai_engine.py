@@ -1,47 +1,127 @@
 from PIL import Image
-from transformers import CLIPProcessor, CLIPModel
+from typing import List, Union
+import threading
+import time
+
 import torch
-import io
+
+from app.core.config import settings
+from app.core.inference_backends import create_backend, load_processor, load_text_tower, load_tokenizer
+from app.core.preprocess import ClipPreprocessor
+
+ImageInput = Union[bytes, memoryview, Image.Image]
+
+# Câu giả cho warm-up text tower (như ảnh xám của warmup()): không gắn với catalog nào
+TEXT_WARMUP_QUERY = "a photo"
+
 
 class AIEngine:
     _instance = None
 
     def __new__(cls):
-        # Singleton Pattern: Chỉ tạo instance nếu chưa có
+        # Singleton Pattern: Chỉ tạo instance nếu chưa có.
+        # Model được nạp lazily (lần dùng đầu) hoặc chủ động qua load()/warmup()
+        # lúc startup (API) / trước khi fork (Celery parent).
         if cls._instance is None:
             cls._instance = super(AIEngine, cls).__new__(cls)
-            cls._instance.initialize()
+            cls._instance.backend = None
+            cls._instance.processor = None
+            cls._instance.preprocessor = None
+            cls._instance.text_model = None
+            cls._instance.tokenizer = None
+            cls._instance.warmed_up = False
+            cls._instance._lock = threading.Lock()
         return cls._instance
 
     def initialize(self):
-        print("🚀 Đang tải CLIP Model... (Việc này sẽ tốn chút thời gian lần đầu)")
-        # Sử dụng model patch32 (nhẹ hơn, nhanh hơn, độ chính xác ổn)
-        model_id = "openai/clip-vit-base-patch32"
-        
-        self.model = CLIPModel.from_pretrained(model_id)
-        self.processor = CLIPProcessor.from_pretrained(model_id)
-        print("✅ CLIP Model đã sẵn sàng!")
+        t0 = time.monotonic()
+        # Backend inference chọn qua settings: eager (fp32) | int8 | onnx
+        self.processor = load_processor()
+        # Tiền xử lý 1 lượt (decode rút gọn + crop + normalize) theo đúng cấu hình processor
+        self.preprocessor = ClipPreprocessor.from_processor(self.processor)
+        self.backend = create_backend(settings.CLIP_INFERENCE_BACKEND)
+        print(f"✅ CLIP Model đã sẵn sàng! (backend={self.backend.name}, {time.monotonic() - t0:.1f}s)")
+
+    def load(self):
+        if self.backend is not None:
+            return
+        with self._lock:
+            if self.backend is None:
+                self.initialize()
+
+    def load_text(self):
+        """Text tower chỉ nạp khi có truy vấn text đầu tiên (worker ảnh không cần tới)."""
+        if self.text_model is not None:
+            return
+        with self._lock:
+            if self.text_model is None:
+                self.tokenizer = load_tokenizer()
+                self.text_model = load_text_tower()
+
+    def warmup(self, batch_sizes=None):
+        """
+        Chạy inference giả trên ảnh tổng hợp để khởi tạo trước kernel/primitive cache,
+        tránh request thật đầu tiên phải trả giá. Gọi trước khi worker/API báo ready.
+        """
+        self.load()
+        batch_sizes = batch_sizes or (1, settings.EMBED_BATCH_MAX_SIZE)
+        t0 = time.monotonic()
+        dummy = Image.new("RGB", (224, 224), (127, 127, 127))
+        for size in batch_sizes:
+            self.create_embeddings([dummy] * size)
+        self.warmed_up = True
+        print(f"🔥 CLIP warm-up xong (batch {list(batch_sizes)}) trong {time.monotonic() - t0:.2f}s")
+
+    def warmup_text(self):
+        """Nạp text tower + chạy 1 truy vấn giả: truy vấn text đầu tiên không phải chờ nạp model."""
+        t0 = time.monotonic()
+        self.create_text_embeddings([TEXT_WARMUP_QUERY])
+        print(f"🔥 CLIP text warm-up xong trong {time.monotonic() - t0:.2f}s")
 
     def create_embedding(self, image_bytes: bytes):
         """
         Input: Ảnh dạng bytes
         Output: Vector 512 chiều (List[float])
         """
-        # 1. Chuyển bytes thành PIL Image
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # 2. Tiền xử lý (Resize, Normalize theo chuẩn OpenAI)
-        inputs = self.processor(images=image, return_tensors="pt")
-        
-        # 3. Chạy Inference (Không tính gradient để tiết kiệm RAM)
-        with torch.no_grad():
-            image_features = self.model.get_image_features(**inputs)
-        
-        # 4. Chuẩn hóa vector (Normalization) để dùng Cosine Similarity
+        return self.create_embeddings([image_bytes])[0]
+
+    def create_embeddings(self, images: List[ImageInput]) -> List[List[float]]:
+        """
+        Input: Danh sách ảnh (bytes hoặc PIL Image)
+        Output: Danh sách vector 512 chiều, đúng thứ tự đầu vào.
+        Chạy 1 forward pass duy nhất cho cả batch (mọi ảnh được resize/crop
+        về 224x224 nên batch luôn đồng kích thước).
+        Ảnh vượt giới hạn kích thước -> ImageTooLarge (ValueError).
+        """
+        if not images:
+            return []
+        self.load()
+
+        # Tiền xử lý (decode rút gọn, Resize + Crop, Normalize theo chuẩn OpenAI)
+        pixel_values = self.preprocessor(images)
+
+        image_features = self.backend(pixel_values)
+
+        # Chuẩn hóa vector (Normalization) để dùng Cosine Similarity
         image_features /= image_features.norm(dim=-1, keepdim=True)
-        
-        # 5. Chuyển Tensor thành List Python thường
-        return image_features.squeeze().tolist()
+        return image_features.tolist()
+
+    def create_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Input: Danh sách câu truy vấn text
+        Output: Danh sách vector 512 chiều (đã chuẩn hóa), cùng không gian với vector ảnh.
+        """
+        if not texts:
+            return []
+        self.load_text()
+
+        # CLIP chỉ nhận tối đa 77 token: câu dài bị cắt bớt
+        inputs = self.tokenizer(texts, padding=True, truncation=True, return_tensors="pt")
+        with torch.no_grad():
+            text_features = self.text_model(**inputs).text_embeds
+
+        text_features /= text_features.norm(dim=-1, keepdim=True)
+        return text_features.tolist()
 
-# Tạo biến toàn cục để các file khác import dùng luôn
-ai_engine = AIEngine()
\ No newline at end of file
+# Tạo biến toàn cục để các file khác import dùng luôn (model chưa nạp cho tới khi cần)
+ai_engine = AIEngine()
@@ -1,5 +1,37 @@
+import os
+import time
 from celery import Celery
+from celery.schedules import crontab
+from celery.signals import (
+    before_task_publish,
+    task_postrun,
+    task_prerun,
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+)
 from app.core.config import settings
+from app.core import metrics
+from app.core.tracing import get_trace_id, trace
+from app.core.worker_profile import apply_profile, inference_profile
+
+# Lane (queue Celery), mỗi lane 1 nhóm worker riêng (docker-compose) để việc nặng / chậm
+# của lane này không chiếm slot của lane khác:
+# - inference: tìm kiếm bằng ảnh (CLIP + Vector DB), người dùng đang chờ
+# - llm: lời khuyên Stylist (Gemini, I/O-bound)
+# - ingestion: việc nền hàng loạt (import catalog, dọn dẹp search_tasks)
+QUEUE_INFERENCE = "inference"
+QUEUE_LLM = "llm"
+QUEUE_INGESTION = "ingestion"
+
+LANE_PREFETCH = {
+    QUEUE_INFERENCE: settings.CELERY_PREFETCH_INFERENCE,
+    QUEUE_LLM: settings.CELERY_PREFETCH_LLM,
+    QUEUE_INGESTION: settings.CELERY_PREFETCH_INGESTION,
+}
+
+# Header thời điểm gửi task (epoch giây): admission control đo tuổi task cũ nhất trong queue
+ENQUEUED_AT_HEADER = "enqueued_at"
 
 celery_app = Celery("worker", broker=settings.REDIS_URL, backend=settings.REDIS_URL)
 
@@ -9,7 +41,157 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    # Task không khai báo route rơi vào lane inference
+    task_default_queue=QUEUE_INFERENCE,
+    task_routes={
+        "app.worker.tasks.process_visual_search": {"queue": QUEUE_INFERENCE},
+        # Stylist (gọi Gemini, I/O-bound) chạy trên queue riêng để không chiếm slot CLIP
+        "app.worker.tasks.attach_stylist_advice": {"queue": QUEUE_LLM},
+        "app.worker.tasks.ingest_catalog": {"queue": QUEUE_INGESTION},
+        "app.worker.tasks.purge_search_tasks": {"queue": QUEUE_INGESTION},
+    },
+    # Số process con mặc định của worker inference (prefork): số core // CLIP_INTRA_OP_THREADS
+    worker_concurrency=inference_profile().processes,
+    # Celery beat (service "beat" trong docker-compose): việc định kỳ
+    beat_schedule={
+        # Retention + partition tháng tới cho bảng search_tasks, lúc ít traffic
+        "purge-search-tasks": {
+            "task": "app.worker.tasks.purge_search_tasks",
+            "schedule": crontab(hour=3, minute=30),
+        },
+    },
 )
 
 # Đăng ký module chứa tasks
-celery_app.conf.imports = ["app.worker.tasks"]
\ No newline at end of file
+celery_app.conf.imports = ["app.worker.tasks"]
+
+@worker_init.connect
+def preload_clip_model(sender=None, **kwargs):
+    """
+    Chạy trong process cha của Celery, SAU khi import tasks và TRƯỚC khi fork pool:
+    nạp CLIP + warm-up 1 lần, các process con dùng chung page (copy-on-write)
+    và nhận luôn trạng thái đã warm-up. Worker chỉ báo ready sau bước này.
+    """
+    global _worker_lanes
+    _worker_lanes = set(sender.app.amqp.queues.consume_from)
+    # Worker chỉ nghe queue "llm" không cần CLIP
+    if not _runs_inference(sender):
+        return
+    profile = inference_profile()
+    if _is_prefork(sender):
+        # Process cha chỉ warm-up, 1 thread: không để lại thread pool OpenMP trước khi fork
+        # (nguồn gốc deadlock prefork + OpenMP); mỗi process con tự đặt thread ở worker_process_init
+        apply_profile(1)
+    else:
+        # threads / solo / gevent: 1 process, inference đi qua 1 thread batcher -> dùng mọi core được cấp
+        apply_profile(profile.processes * profile.threads)
+    print(f"🧮 Inference profile: {profile.label()} (processes x threads) trên CPU {profile.cpus}", flush=True)
+    if not settings.CLIP_WARMUP_ON_STARTUP:
+        return
+    from app.core.ai_engine import ai_engine
+    ai_engine.warmup()
+
+
+@worker_init.connect
+def tune_lane_prefetch(sender=None, **kwargs):
+    """
+    Prefetch theo lane worker đang nghe (nghe nhiều lane thì lấy giá trị nhỏ nhất).
+    Chỉ áp dụng khi không truyền --prefetch-multiplier (giá trị vẫn bằng mặc định của conf).
+    """
+    if sender.prefetch_multiplier != sender.app.conf.worker_prefetch_multiplier:
+        return
+    lanes = [LANE_PREFETCH[queue] for queue in sender.app.amqp.queues.consume_from if queue in LANE_PREFETCH]
+    if lanes:
+        sender.prefetch_multiplier = max(1, min(lanes))
+
+
+# Lane worker hiện tại đang nghe (ghi ở worker_init, process con nhận lại qua fork)
+_worker_lanes = set()
+
+
+def _runs_inference(worker) -> bool:
+    return set(worker.app.amqp.queues.consume_from) != {QUEUE_LLM}
+
+
+def _is_prefork(worker) -> bool:
+    # worker_init chạy trước khi pool_cls được resolve: có thể vẫn là alias ("prefork", "threads"...)
+    pool_cls = worker.pool_cls if isinstance(worker.pool_cls, str) else worker.pool_cls.__module__
+    return "prefork" in pool_cls
+
+
+@worker_process_init.connect
+def pin_inference_process(**kwargs):
+    """
+    Process con của prefork vừa fork: `threads` thread intra-op, ghim vào nhóm core riêng
+    theo số thứ tự process (billiard giữ nguyên số thứ tự khi thay process chết).
+    Chỉ worker nghe lane inference mới ghim core: worker ingestion / llm không được
+    chiếm cpu_slice(0) của process inference đầu tiên.
+    """
+    if not _worker_lanes or _worker_lanes == {QUEUE_LLM}:
+        return
+
+    profile = inference_profile()
+    if QUEUE_INFERENCE in _worker_lanes:
+        from billiard.process import current_process
+
+        index = getattr(current_process(), "index", 0)
+        apply_profile(profile.threads, profile.cpu_slice(index))
+    else:
+        # Ingestion: cùng số thread như 1 process inference, không ghim -> OS chia core còn rảnh
+        apply_profile(profile.threads)
+
+    # 1 task / process: không có gì để gom batch -> chạy CLIP thẳng trong thread của task
+    from app.core.embedding_batcher import embedding_batcher
+    embedding_batcher.inline = True
+
+    from app.core.ai_engine import ai_engine
+    if profile.threads > 1 and ai_engine.backend is not None and ai_engine.backend.name == "onnx":
+        # Thread pool của ONNX Runtime tạo ở process cha không còn sau fork -> tạo lại session
+        from app.core.inference_backends import create_backend
+        ai_engine.backend = create_backend("onnx", num_threads=profile.threads)
+
+
+@worker_init.connect
+def start_worker_metrics(sender=None, **kwargs):
+    """
+    /metrics của worker trên cổng riêng (process cha, trước khi fork).
+    Prefork: đặt PROMETHEUS_MULTIPROC_DIR để gộp số liệu của mọi process con.
+    """
+    if not settings.WORKER_METRICS_PORT:
+        return
+    metrics.reset_multiproc_dir()
+    metrics.start_metrics_server(settings.WORKER_METRICS_PORT)
+    print(f"📈 Worker metrics: http://0.0.0.0:{settings.WORKER_METRICS_PORT}/metrics", flush=True)
+
+@worker_process_shutdown.connect
+def mark_worker_process_dead(pid=None, **kwargs):
+    metrics.mark_process_dead(pid or os.getpid())
+
+# --- Trace id: API request -> header message Celery -> task (-> task con như attach_stylist_advice) ---
+@before_task_publish.connect
+def inject_trace_id(headers=None, **kwargs):
+    trace_id = get_trace_id()
+    if trace_id and headers is not None:
+        headers.setdefault("trace_id", trace_id)
+
+@before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault(ENQUEUED_AT_HEADER, time.time())
+
+# Trace đang mở của từng task (prerun/postrun chạy cùng thread với task)
+_active_traces = {}
+
+@task_prerun.connect
+def start_task_trace(task_id=None, task=None, **kwargs):
+    trace_id = getattr(task.request, "trace_id", None) or (task.request.headers or {}).get("trace_id")
+    context = trace(task.name.rsplit(".", 1)[-1], trace_id=trace_id, celery_task_id=task_id)
+    context.__enter__()
+    _active_traces[task_id] = context
+
+@task_postrun.connect
+def finish_task_trace(task_id=None, task=None, state=None, **kwargs):
+    metrics.WORKER_TASKS.labels(task=task.name.rsplit(".", 1)[-1], state=state or "UNKNOWN").inc()
+    context = _active_traces.pop(task_id, None)
+    if context is not None:
+        context.__exit__(None, None, None)
@@ -15,6 +15,11 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "CHANGE_THIS_TO_A_REALLY_LONG_RANDOM_STRING_IN_ENV" 
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30 # Token sống 30 phút
+    # bcrypt (register/login) chạy trên thread pool riêng, giới hạn số thread -> không chặn event loop
+    PASSWORD_HASH_MAX_WORKERS: int = 2
+    # Cache user theo id cho get_current_user (mỗi request có token), TTL ngắn; 0 = tắt
+    AUTH_PRINCIPAL_CACHE_TTL_SECONDS: float = 30.0
+    AUTH_PRINCIPAL_CACHE_MAX_ENTRIES: int = 10_000
 
     # Storage (S3/MinIO)
     S3_ENDPOINT: str
@@ -22,11 +27,135 @@ class Settings(BaseSettings):
     S3_SECRET_KEY: str
     S3_BUCKET_NAME: str
     S3_REGION: str = "us-east-1"
+    S3_MAX_POOL_CONNECTIONS: int = 32
 
     REDIS_PORT: str = "6379"
     REDIS_PASSWORD: str
 
     GEMINI_API_KEY: str
+    # "gemini" hoặc "fake" (LLM giả, chạy/test offline không cần API key)
+    STYLIST_LLM_BACKEND: str = "gemini"
+    STYLIST_FAKE_LLM_DELAY_MS: float = 30.0
+
+    # Vector DB: "chroma" (service riêng qua HTTP), "pgvector" (cột vector trên bảng products)
+    # hoặc "flat" (ma trận float16 memory-mapped ngay trong process)
+    VECTOR_STORE_BACKEND: str = "chroma"
+    PGVECTOR_EF_SEARCH: int = 40
+    FLAT_INDEX_DIR: str = "data/flat_index"
+
+    # Filter pushdown: lấy dư ứng viên khi có filter để vẫn đủ top-k
+    FILTER_OVERFETCH_FACTOR: int = 4
+    FILTER_MAX_CANDIDATES: int = 1000
+
+    # CLIP: artifact image tower (safetensors, tạo bằng scripts/export_clip_artifact.py).
+    # Không có artifact thì tải full model từ HuggingFace như cũ.
+    CLIP_MODEL_ID: str = "openai/clip-vit-base-patch32"
+    CLIP_ARTIFACT_DIR: str = "ml_models/clip-vit-base-patch32-image"
+    CLIP_WARMUP_ON_STARTUP: bool = True
+    # Nạp + warm-up text tower lúc API khởi động (tắt nếu không dùng tìm kiếm bằng text)
+    TEXT_WARMUP_ON_STARTUP: bool = True
+    # Backend inference image tower: "eager" (PyTorch fp32), "int8" (dynamic quantization)
+    # hoặc "onnx" (ONNX Runtime, file export bằng --onnx / --onnx-int8)
+    CLIP_INFERENCE_BACKEND: str = "eager"
+    CLIP_ONNX_PATH: str = "ml_models/clip-vit-base-patch32-image/image_tower.onnx"
+    # Số thread intra-op mỗi process (torch + onnxruntime)
+    CLIP_INTRA_OP_THREADS: int = 1
+    # Timeout chờ 1 ảnh qua CLIP trong worker (chờ trên Future của batcher: chạy được với mọi pool Celery)
+    CLIP_INFERENCE_TIMEOUT_SECONDS: float = 60.0
+    # Prefork embed thẳng trong thread của task (không có Future để chờ): giới hạn cả task bằng
+    # soft/hard time limit của Celery (process con bị báo lỗi rồi bị kill nếu vẫn treo)
+    SEARCH_TASK_SOFT_TIME_LIMIT_SECONDS: int = 90
+    SEARCH_TASK_TIME_LIMIT_SECONDS: int = 120
+
+    # Worker inference (Celery prefork): số process con x CLIP_INTRA_OP_THREADS thread mỗi process.
+    # 0 = số core khả dụng // CLIP_INTRA_OP_THREADS. --concurrency trên command line vẫn ghi đè.
+    WORKER_INFERENCE_PROCESSES: int = 0
+    # Ghim mỗi process con vào nhóm core riêng (không tranh core / cache giữa các process)
+    WORKER_CPU_AFFINITY: bool = True
+
+    # Tiền xử lý ảnh: chặn decompression bomb theo kích thước trong header (trước khi decode)
+    IMAGE_MAX_PIXELS: int = 50_000_000
+    IMAGE_MAX_SIDE: int = 12_000
+
+    # Micro-batching cho CLIP: gom các request đồng thời thành 1 batch.
+    # Chỉ có tác dụng khi nhiều thread cùng embed: API và worker `--pool threads`.
+    # Worker prefork (mặc định) chạy 1 task / process nên embed thẳng, không qua batcher.
+    EMBED_BATCH_MAX_SIZE: int = 16
+    EMBED_BATCH_MAX_WAIT_MS: float = 5.0
+
+    # Inline fast path: thử tìm kiếm ngay trong request API trong budget này
+    # (0 = tắt), quá budget hoặc đang bận thì quay về task Celery
+    INLINE_SEARCH_BUDGET_MS: float = 500.0
+    INLINE_SEARCH_MAX_CONCURRENCY: int = 2
+
+    # Prefetch của worker theo lane (queue Celery): inference / ingestion chạy CPU lâu -> 1
+    # (không giữ sẵn task trong lúc process khác đang rảnh), llm chỉ chờ I/O -> giữ sẵn nhiều hơn.
+    # --prefetch-multiplier trên command line vẫn ghi đè.
+    CELERY_PREFETCH_INFERENCE: int = 1
+    CELERY_PREFETCH_LLM: int = 4
+    CELERY_PREFETCH_INGESTION: int = 1
+
+    # Admission control (POST /search/visual, luồng đi queue): lane inference quá tải -> 429 + Retry-After
+    # thay vì nhận thêm ảnh + tạo task phải chờ hàng phút. 0 = tắt từng ngưỡng.
+    ADMISSION_MAX_QUEUE_DEPTH: int = 200
+    ADMISSION_MAX_QUEUE_AGE_SECONDS: float = 30.0
+    ADMISSION_RETRY_AFTER_SECONDS: int = 5
+    ADMISSION_RETRY_AFTER_MAX_SECONDS: int = 60
+    # Đọc độ sâu queue từ Redis tối đa 1 lần / khoảng này (mỗi process API)
+    ADMISSION_PROBE_INTERVAL_SECONDS: float = 1.0
+
+    # Rate limit theo user (token bucket trên Redis) cho các endpoint tìm kiếm: 0 = tắt
+    RATE_LIMIT_SEARCH_PER_MINUTE: float = 60.0
+    RATE_LIMIT_SEARCH_BURST: int = 20
+
+    # Tìm kiếm bằng text (CLIP text tower): LRU vector của câu truy vấn trong process
+    TEXT_EMBED_CACHE_MAX_ENTRIES: int = 10_000
+    TEXT_QUERY_MAX_LENGTH: int = 300
+
+    # Batch search: nhiều ảnh trong 1 request (nên <= EMBED_BATCH_MAX_SIZE để embed trong 1 forward pass)
+    BATCH_SEARCH_MAX_IMAGES: int = 8
+
+    # Cache theo hash nội dung ảnh (Redis)
+    EMBEDDING_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 100_000
+    RESULT_CACHE_TTL_SECONDS: int = 300
+    RESULT_CACHE_MAX_ENTRIES: int = 20_000
+
+    # Cache chi tiết sản phẩm theo id (hydrate top-k): LRU trong process + Redis dùng chung
+    PRODUCT_CACHE_TTL_SECONDS: int = 3600
+    PRODUCT_CACHE_LOCAL_MAX_ENTRIES: int = 5000
+    PRODUCT_CACHE_LOCAL_TTL_SECONDS: float = 60.0
+
+    # Bảng search_tasks: giữ bao lâu, xoá theo batch, có lưu trữ (S3, JSONL gzip) trước khi xoá không
+    SEARCH_TASK_RETENTION_DAYS: int = 30
+    SEARCH_TASK_PURGE_BATCH_SIZE: int = 5000
+    SEARCH_TASK_ARCHIVE_ENABLED: bool = False
+    SEARCH_TASK_ARCHIVE_PREFIX: str = "archive/search_tasks"
+    # Số partition tháng tạo trước (bảng partition theo created_at, xem migration)
+    SEARCH_TASK_PARTITIONS_AHEAD: int = 3
+    # Chỉ lưu id + score sản phẩm trong result, chi tiết hydrate lúc đọc (qua product_cache)
+    SEARCH_TASK_COMPACT_RESULTS: bool = False
+    SEARCH_TASK_HISTORY_MAX_LIMIT: int = 100
+
+    # Metrics (Prometheus): API phục vụ /metrics; worker mở HTTP server riêng trên cổng này (0 = tắt)
+    WORKER_METRICS_PORT: int = 9100
+
+    # Hot store Redis cho task đang chạy (poll đọc từ đây, Postgres chỉ ghi khi task kết thúc).
+    # TTL tính lại mỗi lần đổi trạng thái (worker nhận task -> PROCESSING); phải dài hơn thời gian chờ
+    # queue tối đa (admission control từ chối task mới khi task cũ nhất chờ quá ADMISSION_MAX_QUEUE_AGE_SECONDS).
+    # Key vẫn mất (evict) thì worker dựng lại task từ message, không bỏ task.
+    TASK_STATE_TTL_SECONDS: int = 3600
+    TASK_STATE_FINAL_TTL_SECONDS: int = 600
+
+    # Đẩy trạng thái task qua SSE (Redis pub/sub) thay cho polling
+    TASK_EVENTS_KEEPALIVE_SECONDS: float = 15.0
+    TASK_EVENTS_MAX_STREAM_SECONDS: float = 300.0
+
+    # Cache lời khuyên Stylist (LLM): LRU trong process + Redis
+    STYLIST_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    STYLIST_CACHE_LOCAL_MAX_ENTRIES: int = 1024
+    STYLIST_CACHE_LOCAL_TTL_SECONDS: float = 300.0
+    STYLIST_CACHE_LOCK_TIMEOUT_SECONDS: float = 30.0
 
     @property
     def REDIS_URL(self) -> str:
@@ -0,0 +1,146 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Optional
+
+from celery.exceptions import SoftTimeLimitExceeded
+
+from app.core.ai_engine import AIEngine, ImageInput, ai_engine
+from app.core.config import settings
+
+
+class EmbeddingBatcher:
+    """
+    Front-end micro-batching cho AIEngine.
+
+    Các thread gọi `embed()` đẩy ảnh vào hàng đợi và chờ Future của riêng mình.
+    Một thread nền lấy request đầu tiên, tiếp tục gom thêm trong tối đa
+    `max_wait_ms` (hoặc tới khi đủ `max_batch_size`) rồi chạy 1 forward pass
+    cho cả batch và trả từng vector đã chuẩn hóa về đúng caller.
+
+    `inline = True` (process con Celery prefork: mỗi process chỉ chạy 1 task một lúc, không có
+    request đồng thời nào để gom): chạy luôn trong thread gọi, không chờ `max_wait`,
+    không qua thread nền; Future trả về đã có kết quả. Gom batch thật chỉ có ý nghĩa khi nhiều
+    thread cùng gọi: API (inline search, batch search) và worker `--pool threads`.
+    """
+
+    def __init__(
+        self,
+        engine: AIEngine,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+    ):
+        self.engine = engine
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self.inline = False
+
+        self._lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def _ensure_started(self):
+        # Thread không sống sót qua fork (Celery prefork, uvicorn workers):
+        # khởi động lại lazily trong mỗi process con.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="embedding-batcher", daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, image: ImageInput) -> Future:
+        """Đưa 1 ảnh vào hàng đợi, trả về Future chứa vector 512 chiều."""
+        if self.inline:
+            return self.submit_many([image])[0]
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((image, future))
+        return future
+
+    def submit_many(self, images: List[ImageInput]) -> List[Future]:
+        """
+        Đưa nhiều ảnh vào hàng đợi liền nhau: cùng rơi vào 1 batch (1 forward pass)
+        nếu không vượt max_batch_size. Mỗi ảnh có Future riêng (lỗi ảnh nào trả về ảnh đó).
+        """
+        if self.inline:
+            batch = [(image, Future()) for image in images]
+            for _, future in batch:
+                future.set_running_or_notify_cancel()
+            self._run_batch(batch)
+            return [future for _, future in batch]
+        return [self.submit(image) for image in images]
+
+    def embed(self, image: ImageInput, timeout: Optional[float] = None) -> List[float]:
+        """Blocking: chờ batch chứa ảnh này chạy xong và trả vector của nó."""
+        return self.submit(image).result(timeout=timeout)
+
+    def pending(self) -> int:
+        """Số ảnh đang chờ trong hàng đợi (ước lượng, dùng cho admission control)."""
+        if self._queue is None or self._pid != os.getpid():
+            return 0
+        return self._queue.qsize()
+
+    def _collect_batch(self, q: queue.Queue) -> list:
+        batch = [q.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # Hết cửa sổ chờ: chỉ vét những gì đã có sẵn trong hàng đợi
+                    batch.append(q.get_nowait())
+                else:
+                    batch.append(q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        q = self._queue
+        while True:
+            batch = self._collect_batch(q)
+            # Bỏ qua các request mà caller đã huỷ
+            batch = [(img, fut) for img, fut in batch if fut.set_running_or_notify_cancel()]
+            if batch:
+                self._run_batch(batch)
+
+    def _run_batch(self, batch: list):
+        try:
+            vectors = self.engine.create_embeddings([img for img, _ in batch])
+        except SoftTimeLimitExceeded:
+            # Inline (prefork): soft time limit của task -> để task xử lý, không chạy lại từng ảnh
+            raise
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # Một ảnh lỗi không được làm hỏng cả batch: chạy lại từng ảnh
+            # để mỗi caller nhận đúng lỗi (hoặc kết quả) của mình.
+            for img, fut in batch:
+                try:
+                    fut.set_result(self.engine.create_embeddings([img])[0])
+                except SoftTimeLimitExceeded:
+                    raise
+                except Exception as e:
+                    fut.set_exception(e)
+            return
+
+        for (_, fut), vector in zip(batch, vectors):
+            fut.set_result(vector)
+
+
+embedding_batcher = EmbeddingBatcher(
+    ai_engine,
+    max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+    max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS,
+)
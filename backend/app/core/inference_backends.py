@@ -0,0 +1,175 @@
+import inspect
+import os
+from typing import Optional
+
+import torch
+from transformers import (
+    CLIPImageProcessor,
+    CLIPModel,
+    CLIPProcessor,
+    CLIPTextModelWithProjection,
+    CLIPTokenizerFast,
+    CLIPVisionConfig,
+    CLIPVisionModelWithProjection,
+)
+from safetensors.torch import load_file
+
+from app.core.config import settings
+
+# Tên file trong thư mục artifact (do scripts/export_clip_artifact.py tạo ra)
+ARTIFACT_WEIGHTS = "model.safetensors"
+
+BACKENDS = ("eager", "int8", "onnx")
+
+
+def load_image_tower(artifact_dir: str) -> CLIPVisionModelWithProjection:
+    """
+    Dựng image tower (vision encoder + projection) trên meta device rồi gán thẳng
+    các tensor safetensors (mmap) vào model: không khởi tạo weight ngẫu nhiên,
+    không copy weight ra RAM riêng. Các process cùng đọc 1 file dùng chung page cache,
+    process con sau fork dùng chung page (copy-on-write).
+    """
+    config = CLIPVisionConfig.from_pretrained(artifact_dir)
+    with torch.device("meta"):
+        model = CLIPVisionModelWithProjection(config)
+
+    state = load_file(os.path.join(artifact_dir, ARTIFACT_WEIGHTS))
+    model.load_state_dict(state, strict=False, assign=True)
+
+    # Buffer non-persistent (vd: position_ids) không nằm trong state_dict
+    # nên được export kèm trong file và gán tay ở đây.
+    for name, buffer in list(model.named_buffers()):
+        if buffer.is_meta and name in state:
+            module_name, _, buffer_name = name.rpartition(".")
+            model.get_submodule(module_name).register_buffer(buffer_name, state[name], persistent=False)
+
+    missing = [name for name, p in [*model.named_parameters(), *model.named_buffers()] if p.is_meta]
+    if missing:
+        raise RuntimeError(f"Artifact CLIP thiếu tensor: {missing[:5]}")
+    return model.eval()
+
+
+def has_artifact() -> bool:
+    artifact_dir = settings.CLIP_ARTIFACT_DIR
+    return bool(artifact_dir) and os.path.exists(os.path.join(artifact_dir, ARTIFACT_WEIGHTS))
+
+
+def load_torch_model():
+    """Image tower từ artifact (nếu có), ngược lại full CLIP từ HuggingFace như cũ."""
+    if has_artifact():
+        print(f"🚀 Đang nạp CLIP image tower từ artifact {settings.CLIP_ARTIFACT_DIR} (safetensors mmap)...")
+        return load_image_tower(settings.CLIP_ARTIFACT_DIR)
+    print("🚀 Đang tải CLIP Model... (Việc này sẽ tốn chút thời gian lần đầu)")
+    # Sử dụng model patch32 (nhẹ hơn, nhanh hơn, độ chính xác ổn)
+    return CLIPModel.from_pretrained(settings.CLIP_MODEL_ID).eval()
+
+
+def load_processor():
+    if has_artifact():
+        return CLIPImageProcessor.from_pretrained(settings.CLIP_ARTIFACT_DIR)
+    return CLIPProcessor.from_pretrained(settings.CLIP_MODEL_ID)
+
+
+def load_text_tower() -> CLIPTextModelWithProjection:
+    """
+    Text tower (text encoder + projection) của cùng checkpoint CLIP: vector text nằm chung
+    không gian với vector ảnh sản phẩm. Artifact chỉ chứa image tower nên luôn tải từ CLIP_MODEL_ID.
+    """
+    print(f"🚀 Đang tải CLIP text tower từ {settings.CLIP_MODEL_ID}...")
+    return CLIPTextModelWithProjection.from_pretrained(settings.CLIP_MODEL_ID).eval()
+
+
+def load_tokenizer() -> CLIPTokenizerFast:
+    return CLIPTokenizerFast.from_pretrained(settings.CLIP_MODEL_ID)
+
+
+class ImageEmbeds(torch.nn.Module):
+    """pixel_values -> image_embeds (chưa chuẩn hóa), dùng chung cho CLIPModel và image tower."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        if isinstance(self.model, CLIPVisionModelWithProjection):
+            return self.model(pixel_values=pixel_values).image_embeds
+        return self.model.get_image_features(pixel_values=pixel_values)
+
+
+class EagerBackend:
+    """PyTorch eager, fp32 (mặc định, giống hành vi cũ)."""
+
+    name = "eager"
+
+    def __init__(self, model):
+        self.module = ImageEmbeds(model).eval()
+
+    def __call__(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            return self.module(pixel_values)
+
+
+class Int8Backend(EagerBackend):
+    """
+    Dynamic quantization int8 cho mọi nn.Linear (attention + MLP chiếm gần hết FLOPs của ViT).
+    Weight quantize 1 lần lúc load, activation quantize theo từng batch.
+    """
+
+    name = "int8"
+
+    def __init__(self, model):
+        quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        super().__init__(quantized)
+
+
+class OnnxBackend:
+    """ONNX Runtime (CPUExecutionProvider) chạy graph đã export bởi scripts/export_clip_artifact.py --onnx."""
+
+    name = "onnx"
+
+    def __init__(self, onnx_path: str, num_threads: int = 1):
+        import onnxruntime as ort
+
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(
+                f"Không thấy {onnx_path}. Chạy scripts/export_clip_artifact.py --onnx trước."
+            )
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        (image_embeds,) = self.session.run(None, {self.input_name: pixel_values.numpy()})
+        return torch.from_numpy(image_embeds)
+
+
+def create_backend(name: str, model=None, num_threads: Optional[int] = None):
+    """Tạo backend inference theo tên ("eager" | "int8" | "onnx")."""
+    if name == "eager":
+        return EagerBackend(model if model is not None else load_torch_model())
+    if name == "int8":
+        return Int8Backend(model if model is not None else load_torch_model())
+    if name == "onnx":
+        return OnnxBackend(settings.CLIP_ONNX_PATH, num_threads=num_threads or settings.CLIP_INTRA_OP_THREADS)
+    raise ValueError(f"Unknown CLIP_INFERENCE_BACKEND: {name}")
+
+
+def export_onnx(model, path: str, opset: int = 17):
+    """Export image tower sang ONNX với batch động."""
+    kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        # torch mới mặc định exporter dynamo; giữ exporter TorchScript cho giống torch 2.1
+        kwargs["dynamo"] = False
+    torch.onnx.export(
+        ImageEmbeds(model).eval(),
+        (torch.zeros(1, 3, 224, 224),),
+        path,
+        input_names=["pixel_values"],
+        output_names=["image_embeds"],
+        dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+        opset_version=opset,
+        **kwargs
+    )
@@ -0,0 +1,96 @@
+import os
+import shutil
+from typing import Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+# Prefork (nhiều process con) cần multiprocess mode: mỗi process ghi giá trị ra file mmap
+# trong thư mục này, endpoint/HTTP server gộp lại khi được scrape.
+# Biến môi trường phải có TRƯỚC khi import prometheus_client (đặt trong docker-compose).
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUEUE_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+STAGE_SECONDS = Histogram(
+    "search_stage_seconds",
+    "Thời gian từng stage của luồng tìm kiếm (db, s3, clip, vector, llm...)",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "search_queue_wait_seconds",
+    "Thời gian task nằm chờ trong queue: SearchTask.created_at -> worker bắt đầu xử lý",
+    buckets=QUEUE_WAIT_BUCKETS,
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Thời gian xử lý HTTP request của API (tới lúc trả header)",
+    ["method", "route", "status"],
+    buckets=STAGE_BUCKETS,
+)
+SEARCH_REQUESTS = Counter(
+    "search_requests_total",
+    "Số request tìm kiếm bằng ảnh theo đường phục vụ (cache | inline | queue)",
+    ["served_by"],
+)
+SEARCH_TASKS = Counter(
+    "search_tasks_total",
+    "Số task tìm kiếm kết thúc theo trạng thái cuối",
+    ["status"],
+)
+WORKER_TASKS = Counter(
+    "worker_tasks_total",
+    "Số task Celery đã chạy theo tên task và trạng thái Celery",
+    ["task", "state"],
+)
+REJECTED_REQUESTS = Counter(
+    "rejected_requests_total",
+    "Số request bị từ chối 429 theo lý do (queue_depth | queue_age | rate_limit)",
+    ["reason"],
+)
+STYLIST_ADVICE = Counter(
+    "stylist_advice_total",
+    "Số lần xin lời khuyên Stylist theo kết quả",
+    ["status"],
+)
+
+
+def _registry():
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """Nội dung cho endpoint /metrics (định dạng text của Prometheus)."""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def reset_multiproc_dir():
+    """Xoá giá trị cũ của lần chạy trước (gọi ở process cha, trước khi fork)."""
+    if not MULTIPROC_DIR:
+        return
+    shutil.rmtree(MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+
+def start_metrics_server(port: int):
+    """HTTP server riêng cho process không chạy FastAPI (Celery worker)."""
+    start_http_server(port, registry=_registry())
+
+
+def mark_process_dead(pid: int):
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
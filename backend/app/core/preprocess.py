@@ -0,0 +1,129 @@
+import io
+import os
+import threading
+from typing import List, Sequence, Union
+
+import numpy as np
+import torch
+from PIL import Image
+
+from app.core.config import settings
+
+ImageSource = Union[bytes, bytearray, memoryview, str, Image.Image]
+
+# Giá trị chuẩn hóa của CLIP (OpenAI), dùng khi processor không khai báo
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+
+
+class ImageTooLarge(ValueError):
+    """Ảnh vượt giới hạn kích thước (chặn decompression bomb trước khi decode)."""
+
+
+def open_image(source: ImageSource) -> Image.Image:
+    """
+    Mở ảnh nhưng CHƯA decode pixel (PIL chỉ đọc header), kiểm tra kích thước
+    khai báo trong header trước khi cho phép decode toàn bộ.
+    """
+    if isinstance(source, Image.Image):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    elif not isinstance(source, (str, os.PathLike)):
+        raise TypeError(f"Không hỗ trợ kiểu ảnh {type(source)}")
+
+    try:
+        image = Image.open(source)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e))
+    except Exception as e:
+        raise ValueError(f"Image processing failed: {str(e)}")
+
+    width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS or max(width, height) > settings.IMAGE_MAX_SIDE:
+        raise ImageTooLarge(
+            f"Ảnh quá lớn ({width}x{height}), tối đa {settings.IMAGE_MAX_PIXELS:,} pixel / cạnh {settings.IMAGE_MAX_SIDE}px"
+        )
+    return image
+
+
+def draft_decode(image: Image.Image, min_short_side: int) -> Image.Image:
+    """
+    JPEG: decode ở độ phân giải giảm sẵn (DCT scaling 1/2, 1/4, 1/8) sao cho cạnh ngắn
+    vẫn >= min_short_side. Ảnh 12MP chỉ phải decode ~1/64 số pixel. Định dạng khác: giữ nguyên.
+    """
+    if image.format == "JPEG":
+        width, height = image.size
+        scale = min(width, height) / min_short_side
+        if scale >= 2:
+            image.draft("RGB", (int(width / scale) + 1, int(height / scale) + 1))
+    return image
+
+
+def load_for_clip(source: ImageSource, size: int = 224) -> Image.Image:
+    """
+    bytes/path/PIL -> ảnh RGB size x size: resize cạnh ngắn về `size` (bicubic như CLIP)
+    và center-crop trong CÙNG 1 lệnh resize (tham số box = vùng crop trên ảnh gốc).
+    """
+    image = draft_decode(open_image(source), size)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    width, height = image.size
+    side = min(width, height)
+    left = (width - side) / 2
+    top = (height - side) / 2
+    return image.resize(
+        (size, size),
+        Image.Resampling.BICUBIC,
+        box=(left, top, left + side, top + side),
+        reducing_gap=3.0,
+    )
+
+
+class ClipPreprocessor:
+    """
+    Tiền xử lý 1 lượt cho CLIP, thay CLIPProcessor:
+    decode rút gọn (JPEG draft) -> resize + center-crop (1 lệnh) ->
+    chuẩn hóa (x - mean) / std vectorized bằng NumPy, ghi thẳng vào tensor
+    (N, 3, H, W) cấp phát sẵn theo từng thread và tái sử dụng giữa các batch.
+    """
+
+    def __init__(self, size: int = 224, mean: Sequence[float] = CLIP_MEAN, std: Sequence[float] = CLIP_STD):
+        self.size = size
+        # Gộp rescale 1/255 vào mean/std: (x/255 - m) / s == (x - 255m) * (1 / 255s)
+        self.mean = (np.asarray(mean, dtype=np.float32) * 255.0).reshape(3, 1, 1)
+        self.inv_std = (1.0 / (np.asarray(std, dtype=np.float32) * 255.0)).reshape(3, 1, 1)
+        self._local = threading.local()
+
+    @classmethod
+    def from_processor(cls, processor) -> "ClipPreprocessor":
+        """Lấy size/mean/std từ CLIPProcessor hoặc CLIPImageProcessor để khớp đúng model."""
+        image_processor = getattr(processor, "image_processor", processor)
+        crop_size = getattr(image_processor, "crop_size", None) or {"height": 224}
+        size = crop_size["height"] if isinstance(crop_size, dict) else int(crop_size)
+        return cls(
+            size=size,
+            mean=getattr(image_processor, "image_mean", None) or CLIP_MEAN,
+            std=getattr(image_processor, "image_std", None) or CLIP_STD,
+        )
+
+    def _buffer(self, batch_size: int) -> torch.Tensor:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or buffer.shape[0] < batch_size:
+            buffer = torch.empty((batch_size, 3, self.size, self.size), dtype=torch.float32)
+            self._local.buffer = buffer
+        return buffer
+
+    def __call__(self, images: List[ImageSource]) -> torch.Tensor:
+        """
+        Trả tensor pixel_values (N, 3, size, size). Tensor là view trên buffer của thread:
+        chỉ hợp lệ tới lần gọi kế tiếp trên cùng thread (forward pass dùng xong ngay).
+        """
+        pixel_values = self._buffer(len(images))[:len(images)]
+        out = pixel_values.numpy()
+        for i, source in enumerate(images):
+            pixels = np.asarray(load_for_clip(source, self.size))  # (H, W, 3) uint8
+            np.subtract(pixels.transpose(2, 0, 1), self.mean, out=out[i])
+            np.multiply(out[i], self.inv_std, out=out[i])
+        return pixel_values
@@ -1,3 +1,7 @@
+# Phiên bản template prompt: nằm trong key của cache Stylist,
+# sửa bất kỳ prompt nào bên dưới thì PHẢI tăng số này để bỏ lời khuyên cũ.
+PROMPT_VERSION = "v1"
+
 # System Prompt định nghĩa tính cách của AI
 STYLIST_SYSTEM_PROMPT = """
 Bạn là một chuyên gia thời trang (AI Stylist) chuyên nghiệp, thân thiện và có gu thẩm mỹ cao.
@@ -25,4 +29,18 @@ def create_user_prompt(product_name: str, product_category: str, user_question:
     Câu hỏi của khách hàng: "{user_question}"
     
     Hãy đưa ra lời khuyên thời trang cho khách hàng dựa trên thông tin trên.
-    """
\ No newline at end of file
+    """
+
+def create_outfit_prompt(product_name: str, product_desc: str) -> str:
+    """
+    Prompt xin gợi ý phối đồ cho sản phẩm giống nhất sau khi tìm kiếm bằng ảnh.
+    """
+    return f"""
+        Bạn là một Fashion Stylist chuyên nghiệp và thân thiện.
+        Tôi vừa tìm thấy một sản phẩm thời trang này:
+        - Tên: {product_name}
+        - Mô tả: {product_desc}
+        
+        Hãy cho tôi 3 gợi ý phối đồ (Outfit ideas) thật sành điệu với món đồ này để đi chơi hoặc đi làm.
+        Trả lời ngắn gọn, dùng gạch đầu dòng và thêm emoji cho sinh động.
+        """
@@ -0,0 +1,11 @@
+import redis
+import redis.asyncio as aioredis
+from app.core.config import settings
+
+# Client dùng chung cho cả process. redis-py tự quản lý connection pool
+# (và tự tạo lại pool sau khi fork), nên tạo ở module-level là an toàn.
+redis_client = redis.Redis.from_url(settings.REDIS_URL)
+
+# Client async cho FastAPI (pub/sub, stream). Chỉ dùng trong event loop của API,
+# connection được mở lazily ở lần dùng đầu tiên.
+async_redis_client = aioredis.Redis.from_url(settings.REDIS_URL)
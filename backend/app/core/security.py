@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Any, Union
 from jose import jwt
@@ -7,6 +9,14 @@ from app.core.config import settings
 # Dùng thuật toán bcrypt để hash password
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt tốn hàng chục ms CPU mỗi lần: chạy trên pool riêng, ít thread, để
+# login dồn dập (sau push notification) chỉ xếp hàng ở đây, không chặn event loop
+# và không chiếm hết threadpool mặc định (dùng cho search, DB sync...).
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_MAX_WORKERS,
+    thread_name_prefix="password-hash",
+)
+
 def create_access_token(subject: Union[str, Any], expires_delta: timedelta = None) -> str:
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -21,4 +31,12 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
\ No newline at end of file
+    return pwd_context.hash(password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, get_password_hash, password)
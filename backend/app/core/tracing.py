@@ -0,0 +1,80 @@
+import datetime
+import json
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from app.core.metrics import QUEUE_WAIT_SECONDS, STAGE_SECONDS
+
+# Trace id đi theo request API -> header message Celery -> task worker (-> task con)
+TRACE_HEADER = "X-Trace-Id"
+
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+# Tổng thời gian theo stage của trace hiện tại (in ra 1 dòng khi trace kết thúc)
+_spans: ContextVar[Optional[dict]] = ContextVar("trace_spans", default=None)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def get_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+@contextmanager
+def trace(name: str, trace_id: Optional[str] = None, **fields):
+    """
+    Gom mọi span bên trong thành 1 dòng log JSON khi kết thúc:
+    ⏱️ {"trace": name, "trace_id": ..., <fields>, "total_ms": ..., "spans_ms": {stage: ms}}
+    """
+    trace_token = _trace_id.set(trace_id or _trace_id.get() or new_trace_id())
+    spans_token = _spans.set({})
+    t0 = time.perf_counter()
+    try:
+        yield _trace_id.get()
+    finally:
+        spans = _spans.get()
+        record = {
+            "trace": name,
+            "trace_id": _trace_id.get(),
+            **fields,
+            "total_ms": round((time.perf_counter() - t0) * 1000, 2),
+            "spans_ms": {stage: round(seconds * 1000, 2) for stage, seconds in spans.items()},
+        }
+        _spans.reset(spans_token)
+        _trace_id.reset(trace_token)
+        print(f"⏱️ {json.dumps(record, ensure_ascii=False)}", flush=True)
+
+
+def record_span(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+    spans = _spans.get()
+    if spans is not None:
+        spans[stage] = spans.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str):
+    """Đo 1 stage: ghi vào histogram search_stage_seconds và vào trace hiện tại (nếu có)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - t0)
+
+
+def observe_queue_wait(created_at: Optional[datetime.datetime]) -> Optional[float]:
+    """SearchTask.created_at -> lúc worker bắt đầu xử lý (giây)."""
+    if created_at is None:
+        return None
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=datetime.timezone.utc)
+    wait = max(0.0, (datetime.datetime.now(datetime.timezone.utc) - created_at).total_seconds())
+    QUEUE_WAIT_SECONDS.observe(wait)
+    spans = _spans.get()
+    if spans is not None:
+        spans["queue_wait"] = wait
+    return wait
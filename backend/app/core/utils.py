@@ -1,14 +1,17 @@
 from PIL import Image
-import io
+
+from app.core.preprocess import open_image
 
 def process_image(image_bytes: bytes, max_size: int = 800) -> Image.Image:
     """
-    1. Convert bytes -> PIL Image
+    1. Convert bytes -> PIL Image (kiểm tra kích thước trong header trước khi decode)
     2. Resize nếu ảnh quá lớn (giữ nguyên tỷ lệ khung hình) để giảm tải cho RAM và CPU
     3. Convert mode về RGB (tránh lỗi với ảnh PNG transparent)
     """
     try:
-        image = Image.open(io.BytesIO(image_bytes))
+        image = open_image(image_bytes)
+        # JPEG: decode thẳng ở độ phân giải gần max_size (DCT scaling)
+        image.draft("RGB", (max_size, max_size))
         
         # Convert sang RGB để tránh lỗi kênh Alpha của PNG
         if image.mode != "RGB":
@@ -20,5 +23,7 @@ def process_image(image_bytes: bytes, max_size: int = 800) -> Image.Image:
             image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
             
         return image
+    except ValueError:
+        raise
     except Exception as e:
         raise ValueError(f"Image processing failed: {str(e)}")
\ No newline at end of file
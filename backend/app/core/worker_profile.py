@@ -0,0 +1,55 @@
+import os
+from typing import List, NamedTuple, Optional
+
+from app.core.config import settings
+
+
+class InferenceProfile(NamedTuple):
+    """
+    Cách chia CPU cho worker inference: `processes` process con (Celery prefork),
+    mỗi process chạy CLIP với `threads` thread intra-op, ghim vào `threads` core riêng.
+    """
+    processes: int
+    threads: int
+    cpus: List[int]
+
+    def cpu_slice(self, index: int) -> List[int]:
+        """Các core của process con thứ `index` (0-based); nhiều process hơn số core thì quay vòng."""
+        start = (index % self.processes) * self.threads
+        return sorted({self.cpus[(start + i) % len(self.cpus)] for i in range(self.threads)})
+
+    def label(self) -> str:
+        return f"{self.processes}x{self.threads}"
+
+
+def available_cpus() -> List[int]:
+    """Core process này được phép chạy (tôn trọng cpuset của container / taskset)."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:  # macOS / Windows không có sched_getaffinity
+        return list(range(os.cpu_count() or 1))
+
+
+def resolve_profile(processes: int = 0, threads: int = 1, cpus: Optional[List[int]] = None) -> InferenceProfile:
+    """processes = 0 -> chia đều số core khả dụng cho các process `threads` thread."""
+    cpus = cpus or available_cpus()
+    threads = max(1, threads)
+    if processes <= 0:
+        processes = max(1, len(cpus) // threads)
+    return InferenceProfile(processes, threads, cpus)
+
+
+def inference_profile() -> InferenceProfile:
+    return resolve_profile(settings.WORKER_INFERENCE_PROCESSES, settings.CLIP_INTRA_OP_THREADS)
+
+
+def apply_profile(threads: int, cpus: Optional[List[int]] = None):
+    """
+    Gọi trong process sẽ chạy inference: số thread intra-op của PyTorch,
+    ghim CPU nếu có `cpus` và bật WORKER_CPU_AFFINITY.
+    """
+    import torch
+
+    if cpus and settings.WORKER_CPU_AFFINITY and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(threads)
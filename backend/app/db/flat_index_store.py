@@ -0,0 +1,320 @@
+import fcntl
+import json
+import mmap
+import os
+import threading
+import warnings
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import torch
+except ImportError:  # Chạy được cả khi không có torch (np.dot float32 theo khối)
+    torch = None
+
+from app.core.config import settings
+from app.db.models.product import EMBEDDING_DIM
+from app.db.vector_store import BaseVectorStore
+from app.schemas.search import SearchFilters
+
+ID_DTYPE = np.dtype("S36")  # UUID dạng chuỗi
+VECTOR_DTYPE = np.dtype(np.float16)
+TOMBSTONE_DTYPE = np.dtype(np.int64)
+
+# Cột metadata song song với vectors để filter ngay trên mảng điểm.
+# Giá trị rỗng: NaN (price) / -1 (mã category, currency; bảng mã nằm trong labels.json)
+META_COLUMNS = {
+    "price": (np.dtype(np.float32), np.nan),
+    "category": (np.dtype(np.int32), -1),
+    "currency": (np.dtype(np.int32), -1),
+}
+LABEL_COLUMNS = ("category", "currency")
+
+# Lưu float16, tính float32: đổi theo từng khối để không cấp phát cả ma trận float32
+# (GEMM float16 trên CPU của torch 2.1 chậm hoặc không có trên nhiều bản build)
+SCORE_CHUNK_ROWS = 16384
+
+
+class FlatIndexVectorStore(BaseVectorStore):
+    """
+    Exact search ngay trong process, không qua mạng.
+
+    Dữ liệu nằm trong các file append-only trong FLAT_INDEX_DIR:
+    - vectors.f16:    ma trận N x 512 float16 (đã chuẩn hóa L2)
+    - ids.bin:        N product id (S36), song song với vectors
+    - price.bin, category.bin, currency.bin: metadata song song để filter pushdown
+    - tombstones.i64: chỉ số các dòng đã bị thay thế (upsert cùng id) -> bỏ qua khi search
+
+    Reader map file bằng np.memmap (read-only, MAP_SHARED) nên mọi Celery prefork
+    child và uvicorn worker dùng chung page cache của OS, không ai copy ma trận.
+    Writer giữ flock, append vào cuối file (không ghi lại file); reader tự remap
+    khi thấy kích thước file thay đổi.
+    """
+
+    def __init__(self, index_dir: Optional[str] = None):
+        self.index_dir = index_dir or settings.FLAT_INDEX_DIR
+        os.makedirs(self.index_dir, exist_ok=True)
+        self.vectors_path = os.path.join(self.index_dir, "vectors.f16")
+        self.ids_path = os.path.join(self.index_dir, "ids.bin")
+        self.tombstones_path = os.path.join(self.index_dir, "tombstones.i64")
+        self.labels_path = os.path.join(self.index_dir, "labels.json")
+        self.meta_paths = {name: os.path.join(self.index_dir, f"{name}.bin") for name in META_COLUMNS}
+        self.lock_path = os.path.join(self.index_dir, ".lock")
+        self.row_bytes = EMBEDDING_DIM * VECTOR_DTYPE.itemsize
+
+        self._map_lock = threading.Lock()
+        self._mapped_sizes = None
+        self._vectors = None
+        self._ids = None
+        self._meta = None
+        self._labels = None
+        self._tombstones = None
+
+        # Chỉ writer dùng: id -> dòng mới nhất (nạp dần khi append)
+        self._writer_rows: Dict[bytes, int] = {}
+        self._writer_count = 0
+
+    # --- Đọc ---
+    @staticmethod
+    def _file_size(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def _map(self, path: str, dtype, count: int, shape=None):
+        if count == 0:
+            return np.empty(shape or (0,), dtype=dtype)
+        array = np.memmap(path, dtype=dtype, mode="r", shape=shape or (count,))
+        if hasattr(array, "_mmap") and hasattr(mmap, "MADV_WILLNEED"):
+            # Gợi ý kernel đọc trước các trang để query đầu tiên không bị page fault hàng loạt
+            array._mmap.madvise(mmap.MADV_WILLNEED)
+        return array
+
+    def _map_meta(self, name: str, count: int) -> np.ndarray:
+        dtype, empty = META_COLUMNS[name]
+        rows = min(self._file_size(self.meta_paths[name]) // dtype.itemsize, count)
+        column = self._map(self.meta_paths[name], dtype, rows)
+        if rows < count:
+            # Index cũ chưa có cột này (writer sẽ đệm ở lần append tới) -> coi như không có giá trị
+            column = np.concatenate([column, np.full(count - rows, empty, dtype=dtype)])
+        return column
+
+    def _load_labels(self) -> Dict[str, List[str]]:
+        try:
+            with open(self.labels_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {name: [] for name in LABEL_COLUMNS}
+
+    def _snapshot(self):
+        """Trả về (vectors, ids, meta, labels, tombstones) nhất quán; remap nếu file đã lớn thêm."""
+        sizes = (
+            self._file_size(self.vectors_path),
+            self._file_size(self.ids_path),
+            self._file_size(self.tombstones_path),
+            self._file_size(self.labels_path),
+        )
+        with self._map_lock:
+            if sizes != self._mapped_sizes:
+                # Writer ghi vectors + metadata trước rồi mới ghi ids -> lấy min để bỏ dòng đang ghi dở
+                count = min(sizes[0] // self.row_bytes, sizes[1] // ID_DTYPE.itemsize)
+                self._vectors = self._map(self.vectors_path, VECTOR_DTYPE, count, (count, EMBEDDING_DIM))
+                self._ids = self._map(self.ids_path, ID_DTYPE, count)
+                self._meta = {name: self._map_meta(name, count) for name in META_COLUMNS}
+                self._labels = self._load_labels()
+                n_dead = sizes[2] // TOMBSTONE_DTYPE.itemsize
+                dead = self._map(self.tombstones_path, TOMBSTONE_DTYPE, n_dead)
+                self._tombstones = np.asarray(dead[dead < count])
+                self._mapped_sizes = sizes
+            return self._vectors, self._ids, self._meta, self._labels, self._tombstones
+
+    def __len__(self) -> int:
+        vectors, _, _, _, tombstones = self._snapshot()
+        return len(vectors) - len(tombstones)
+
+    def _scores(self, vectors: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """queries (m, d) -> điểm dot (m, n): 1 lần quét ma trận cho cả batch query."""
+        n = len(vectors)
+        scores = np.empty((n, len(queries)), dtype=np.float32)
+        if torch is not None:
+            # Đọc thẳng từ trang mmap, mỗi khối đổi sang float32 rồi mới nhân (GEMM float32 đa luồng)
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")  # memmap read-only -> torch cảnh báo non-writable
+                matrix = torch.from_numpy(vectors)
+            query_t = torch.from_numpy(queries).T
+            out = torch.from_numpy(scores)
+            for start in range(0, n, SCORE_CHUNK_ROWS):
+                end = min(start + SCORE_CHUNK_ROWS, n)
+                torch.mm(matrix[start:end].float(), query_t, out=out[start:end])
+            return scores.T
+
+        for start in range(0, n, SCORE_CHUNK_ROWS):
+            end = min(start + SCORE_CHUNK_ROWS, n)
+            np.dot(vectors[start:end].astype(np.float32), queries.T, out=scores[start:end])
+        return scores.T
+
+    @staticmethod
+    def _filter_mask(meta: Dict[str, np.ndarray], labels: Dict[str, List[str]], filters: SearchFilters):
+        """Mask các dòng thoả filter; None nếu chắc chắn không có dòng nào khớp."""
+        mask = np.ones(len(meta["price"]), dtype=bool)
+        for name in LABEL_COLUMNS:
+            value = getattr(filters, name)
+            if value is None:
+                continue
+            if value not in labels.get(name, []):
+                return None
+            mask &= meta[name] == labels[name].index(value)
+        # So sánh với NaN luôn False -> sản phẩm không có giá bị loại khi lọc theo giá
+        if filters.min_price is not None:
+            mask &= meta["price"] >= filters.min_price
+        if filters.max_price is not None:
+            mask &= meta["price"] <= filters.max_price
+        return mask
+
+    def search(self, query_vector, k=5, filters: Optional[SearchFilters] = None) -> List[Tuple[str, float]]:
+        """Top-k theo cosine distance (1 - dot, vì mọi vector đã chuẩn hóa)."""
+        return self.search_many([query_vector], k=k, filters=filters)[0]
+
+    def search_many(self, query_vectors, k=5, filters: Optional[SearchFilters] = None) -> List[List[Tuple[str, float]]]:
+        """Nhiều query: quét index 1 lần (matrix x matrix), filter/tombstone dùng chung cho mọi query."""
+        vectors, ids, meta, labels, tombstones = self._snapshot()
+        if len(vectors) == 0 or k <= 0 or not len(query_vectors):
+            return [[] for _ in query_vectors]
+
+        queries = np.array(query_vectors, dtype=np.float32).reshape(len(query_vectors), -1)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries /= np.where(norms == 0, 1.0, norms)
+
+        scores = self._scores(vectors, queries)
+        if len(tombstones):
+            scores[:, tombstones] = -np.inf
+        if filters is not None and not filters.is_empty():
+            # Filter áp trực tiếp lên mảng điểm trước khi chọn top-k -> không mất slot kết quả
+            mask = self._filter_mask(meta, labels, filters)
+            if mask is None:
+                return [[] for _ in query_vectors]
+            scores[:, ~mask] = -np.inf
+
+        k = min(k, scores.shape[1])
+        # argpartition O(N) lấy k ứng viên, chỉ sort k phần tử đó
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(scores, top):
+            candidates = candidates[np.argsort(-row[candidates])]
+            results.append([
+                (ids[i].decode("ascii"), float(1.0 - row[i]))
+                for i in candidates
+                if np.isfinite(row[i])
+            ])
+        return results
+
+    # --- Ghi ---
+    @contextmanager
+    def _write_lock(self):
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sync_writer_state(self) -> int:
+        """Gọi khi đang giữ lock: cắt dòng ghi dở (nếu crash) và nạp các id mới của writer khác."""
+        count = min(
+            self._file_size(self.vectors_path) // self.row_bytes,
+            self._file_size(self.ids_path) // ID_DTYPE.itemsize,
+        )
+        for path, itemsize in ((self.vectors_path, self.row_bytes), (self.ids_path, ID_DTYPE.itemsize)):
+            if self._file_size(path) > count * itemsize:
+                os.truncate(path, count * itemsize)
+        for name, (dtype, empty) in META_COLUMNS.items():
+            path = self.meta_paths[name]
+            rows = self._file_size(path) // dtype.itemsize
+            if rows > count:
+                os.truncate(path, count * dtype.itemsize)
+            elif rows < count:
+                # Cột metadata thiếu dòng (index cũ) -> đệm giá trị rỗng để cột luôn thẳng hàng với vectors
+                with open(path, "ab") as f:
+                    f.write(np.full(count - rows, empty, dtype=dtype).tobytes())
+
+        if count < self._writer_count:
+            # File bị thay thế/cắt ngắn từ bên ngoài -> nạp lại từ đầu
+            self._writer_rows, self._writer_count = {}, 0
+        if count > self._writer_count:
+            new_ids = np.fromfile(self.ids_path, dtype=ID_DTYPE, count=count - self._writer_count,
+                                  offset=self._writer_count * ID_DTYPE.itemsize)
+            for offset, pid in enumerate(new_ids):
+                self._writer_rows[bytes(pid)] = self._writer_count + offset
+            self._writer_count = count
+        return count
+
+    def _encode_metadata(self, metadatas: Optional[list], n: int) -> Dict[str, np.ndarray]:
+        """Metadata dict -> các cột numpy; nhãn mới được thêm vào labels.json (gọi khi đang giữ lock)."""
+        labels = self._load_labels()
+        columns = {name: np.full(n, empty, dtype=dtype) for name, (dtype, empty) in META_COLUMNS.items()}
+        changed = False
+        for row, metadata in enumerate(metadatas or []):
+            if not metadata:
+                continue
+            if metadata.get("price") is not None:
+                columns["price"][row] = float(metadata["price"])
+            for name in LABEL_COLUMNS:
+                value = metadata.get(name)
+                if value is None:
+                    continue
+                values = labels.setdefault(name, [])
+                if value not in values:
+                    values.append(value)
+                    changed = True
+                columns[name][row] = values.index(value)
+
+        if changed:
+            # Ghi labels trước khi ghi dòng dùng mã mới -> reader không bao giờ thấy mã lạ
+            tmp_path = f"{self.labels_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(labels, f, ensure_ascii=False)
+            os.replace(tmp_path, self.labels_path)
+        return columns
+
+    def add_products(self, product_ids: list, embeddings: list, metadatas: list = None):
+        """Append vector mới vào cuối file; id đã tồn tại thì dòng cũ bị đánh tombstone."""
+        if not product_ids:
+            return
+
+        encoded = []
+        for pid in product_ids:
+            raw = str(pid).encode("ascii")
+            if len(raw) > ID_DTYPE.itemsize:
+                raise ValueError(f"Product id quá dài cho flat index: {pid}")
+            encoded.append(raw)
+
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(encoded), EMBEDDING_DIM)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = (matrix / np.where(norms == 0, 1.0, norms)).astype(VECTOR_DTYPE)
+
+        with self._write_lock():
+            start = self._sync_writer_state()
+            meta_columns = self._encode_metadata(metadatas, len(encoded))
+
+            dead = []
+            for offset, raw in enumerate(encoded):
+                previous = self._writer_rows.get(raw)
+                if previous is not None:
+                    dead.append(previous)
+                self._writer_rows[raw] = start + offset
+
+            # Thứ tự ghi quan trọng: vectors + metadata -> ids -> tombstones (xem _snapshot)
+            with open(self.vectors_path, "ab") as f:
+                f.write(matrix.tobytes())
+            for name, column in meta_columns.items():
+                with open(self.meta_paths[name], "ab") as f:
+                    f.write(column.tobytes())
+            with open(self.ids_path, "ab") as f:
+                f.write(np.asarray(encoded, dtype=ID_DTYPE).tobytes())
+            if dead:
+                with open(self.tombstones_path, "ab") as f:
+                    f.write(np.asarray(dead, dtype=TOMBSTONE_DTYPE).tobytes())
+            self._writer_count = start + len(encoded)
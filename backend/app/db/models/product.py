@@ -1,9 +1,24 @@
 import uuid
-from sqlalchemy import Column, String, Float, Integer, JSON
+from sqlalchemy import Column, String, Float, Integer, JSON, Index
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import deferred
+from pgvector.sqlalchemy import Vector
 from app.db.base_class import Base
+
+EMBEDDING_DIM = 512
+
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # HNSW index cho cosine distance (dùng khi VECTOR_STORE_BACKEND = "pgvector")
+        Index(
+            "ix_products_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String, index=True, nullable=False)
@@ -15,4 +30,20 @@ class Product(Base):
     
     # Metadata mở rộng (Brand, Material, Color...) dùng JSONB
     # Lưu ý: JSON trong SQLAlchemy với Postgres tự động map sang JSONB
-    meta_info = Column(JSON, default={})
\ No newline at end of file
+    meta_info = Column(JSON, default={})
+
+    # Embedding CLIP (chỉ dùng với backend pgvector, Chroma lưu vector riêng)
+    # deferred: không kéo 512 float về mỗi lần SELECT Product
+    embedding = deferred(Column(Vector(EMBEDDING_DIM), nullable=True))
+
+    def to_dict(self) -> dict:
+        """Dạng JSON gọn để trả về API / lưu vào kết quả task."""
+        return {
+            "id": str(self.id),
+            "name": self.name,
+            "price": self.price,
+            "currency": self.currency,
+            "image_url": self.image_url,
+            "category": self.category,
+            "description": self.description,
+        }
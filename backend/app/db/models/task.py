@@ -1,11 +1,24 @@
+import datetime
 import uuid
-from sqlalchemy import Column, String, JSON, DateTime, ForeignKey
+from sqlalchemy import Column, String, JSON, DateTime, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 from app.db.base_class import Base
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
 class SearchTask(Base):
     __tablename__ = "search_tasks"
+    __table_args__ = (
+        # Lịch sử tìm kiếm của user (GET /search/tasks): keyset pagination theo (created_at, id)
+        Index("ix_search_tasks_user_id_created_at", "user_id", "created_at", "id"),
+    )
 
+    # Bảng được partition theo tháng của created_at (xem migration) nên khoá chính là (id, created_at):
+    # merge / session.get / UPDATE của ORM lọc theo cả created_at -> Postgres chỉ chạm 1 partition
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True) # Nullable cho Guest
     status = Column(String, default="PENDING", index=True) # PENDING, PROCESSING, COMPLETED, FAILED
@@ -14,5 +27,6 @@ class SearchTask(Base):
     result = Column(JSON, nullable=True) # Kết quả trả về từ AI Worker
     error_message = Column(String, nullable=True)
     
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
+    # Khoá partition: gán ngay phía Python để ORM biết giá trị (không cần đọc lại sau INSERT)
+    created_at = Column(DateTime(timezone=True), primary_key=True, nullable=False, default=utcnow, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -0,0 +1,72 @@
+import uuid
+from typing import List, Optional, Tuple
+from sqlalchemy import select, text, update
+from app.core.config import settings
+from app.core.tracing import span
+from app.db.models.product import Product
+from app.db.session import SessionLocal
+from app.db.vector_store import BaseVectorStore, product_filter_clauses
+from app.schemas.search import SearchFilters
+
+# Giới hạn trên của hnsw.ef_search trong pgvector
+MAX_EF_SEARCH = 1000
+
+
+class PgVectorStore(BaseVectorStore):
+    """
+    Lưu embedding ngay trên bảng products (cột vector(512) + HNSW index).
+    search_products() trả về sản phẩm đầy đủ + distance trong 1 câu SQL duy nhất,
+    không cần service Chroma và không mất thứ tự similarity.
+    Filter là mệnh đề WHERE trong cùng câu SQL đó.
+    """
+
+    def _tune(self, db, k: int, filters: Optional[SearchFilters]):
+        # ef_search quyết định độ rộng tìm kiếm HNSW (recall vs tốc độ), chỉ áp dụng trong transaction hiện tại.
+        # HNSW lọc WHERE *sau* khi quét index -> khi có filter phải quét rộng hơn để vẫn đủ k dòng.
+        # Luôn SET LOCAL: không phụ thuộc giá trị đặt ở cấp database / role / session.
+        ef_search = max(settings.PGVECTOR_EF_SEARCH, k)
+        if filters is not None and not filters.is_empty():
+            # Quét rộng thêm đúng tỉ lệ lấy dư như các backend khác (FILTER_OVERFETCH_FACTOR)
+            ef_search *= settings.FILTER_OVERFETCH_FACTOR
+        ef_search = min(ef_search, MAX_EF_SEARCH)
+        db.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+
+    def _query(self, columns, query_vector, k: int, filters: Optional[SearchFilters]):
+        distance = Product.embedding.cosine_distance(query_vector).label("distance")
+        return (
+            select(*columns, distance)
+            .where(Product.embedding.isnot(None), *product_filter_clauses(filters))
+            .order_by(distance)
+            .limit(k)
+        )
+
+    def search(self, query_vector, k=5, filters: Optional[SearchFilters] = None) -> List[Tuple[str, float]]:
+        with SessionLocal() as db:
+            self._tune(db, k, filters)
+            rows = db.execute(self._query([Product.id], query_vector, k, filters)).all()
+        return [(str(pid), float(dist)) for pid, dist in rows]
+
+    def search_products(self, db, query_vector, k=5, filters: Optional[SearchFilters] = None) -> List[dict]:
+        # Query + hydrate trong cùng 1 câu SQL -> chỉ có 1 span
+        with span("vector_query"):
+            self._tune(db, k, filters)
+            rows = db.execute(self._query([Product], query_vector, k, filters)).all()
+        return [{**product.to_dict(), "score": float(dist)} for product, dist in rows]
+
+    def search_products_many(self, db, query_vectors, k=5, filters: Optional[SearchFilters] = None) -> List[List[dict]]:
+        # Mỗi query đã là 1 câu SQL trả về sản phẩm đầy đủ -> chạy lần lượt trên cùng 1 connection
+        return [self.search_products(db, vector, k=k, filters=filters) for vector in query_vectors]
+
+    def add_products(self, product_ids: list, embeddings: list, metadatas: list = None):
+        """Ghi embedding vào các dòng products đã có (bulk UPDATE theo primary key)."""
+        if not product_ids:
+            return
+        with SessionLocal() as db:
+            db.execute(
+                update(Product),
+                [
+                    {"id": uuid.UUID(str(pid)), "embedding": embedding}
+                    for pid, embedding in zip(product_ids, embeddings)
+                ],
+            )
+            db.commit()
@@ -1,8 +1,139 @@
-import chromadb
+from typing import List, Optional, Tuple
 from app.core.config import settings
+from app.core.tracing import span
+from app.db.models.product import Product
+from app.schemas.search import SearchFilters
+from app.services.product_cache import product_cache
 
-class VectorStore:
+
+def product_filter_clauses(filters: Optional[SearchFilters]) -> list:
+    """SearchFilters -> danh sách điều kiện SQL trên bảng products."""
+    if not filters:
+        return []
+    clauses = []
+    if filters.category is not None:
+        clauses.append(Product.category == filters.category)
+    if filters.min_price is not None:
+        clauses.append(Product.price >= filters.min_price)
+    if filters.max_price is not None:
+        clauses.append(Product.price <= filters.max_price)
+    if filters.currency is not None:
+        clauses.append(Product.currency == filters.currency)
+    return clauses
+
+
+class BaseVectorStore:
+    """
+    Interface chung cho các backend lưu vector sản phẩm.
+    - search(): trả về [(product_id, distance)] theo thứ tự gần nhất trước
+    - search_products(): trả về dict sản phẩm đầy đủ (kèm "score") theo đúng thứ tự similarity
+    - search_many() / search_products_many(): như trên cho nhiều query vector trong 1 lần gọi
+    Tất cả nhận `filters` (SearchFilters) và đẩy điều kiện xuống truy vấn vector.
+    """
+
+    def search(self, query_vector, k=5, filters: Optional[SearchFilters] = None) -> List[Tuple[str, float]]:
+        raise NotImplementedError
+
+    def search_many(self, query_vectors, k=5, filters: Optional[SearchFilters] = None) -> List[List[Tuple[str, float]]]:
+        """Mặc định: gọi search() cho từng vector. Backend hỗ trợ multi-query thì override."""
+        return [self.search(vector, k=k, filters=filters) for vector in query_vectors]
+
+    def add_products(self, product_ids: list, embeddings: list, metadatas: list = None):
+        raise NotImplementedError
+
+    def add_product(self, product_id: str, embedding: list, metadata: dict = None):
+        """Thêm vector sản phẩm vào kho"""
+        self.add_products([product_id], [embedding], [metadata] if metadata else None)
+
+    def search_products(self, db, query_vector, k=5, filters: Optional[SearchFilters] = None) -> List[dict]:
+        """
+        Mặc định: lấy ID từ vector DB rồi hydrate qua product_cache (thường không cần tới Postgres).
+        Giữ nguyên thứ tự similarity (cache / Postgres IN (...) không đảm bảo thứ tự).
+
+        Khi có filter: lấy dư ứng viên (k * FILTER_OVERFETCH_FACTOR), hydrate rồi kiểm tra lại điều kiện
+        (chặn metadata cũ trong vector DB), nếu vẫn thiếu thì tăng dần số ứng viên.
+        """
+        if filters is not None and filters.is_empty():
+            filters = None
+        fetch = k if filters is None else k * settings.FILTER_OVERFETCH_FACTOR
+
+        while True:
+            with span("vector_query"):
+                hits = self.search(query_vector, k=fetch, filters=filters)
+            with span("hydrate"):
+                products = self._hydrate(db, hits, filters)
+            exhausted = len(hits) < fetch or fetch >= settings.FILTER_MAX_CANDIDATES
+            if filters is None or len(products) >= k or exhausted:
+                return products[:k]
+            fetch = min(fetch * settings.FILTER_OVERFETCH_FACTOR, settings.FILTER_MAX_CANDIDATES)
+
+    def search_products_many(self, db, query_vectors, k=5, filters: Optional[SearchFilters] = None) -> List[List[dict]]:
+        """
+        Batch search: 1 lần search_many (multi-query) + 1 lần hydrate chung cho mọi query.
+        Query nào bị filter loại quá nhiều thì mới tìm lại riêng (tăng dần ứng viên như search_products).
+        """
+        if filters is not None and filters.is_empty():
+            filters = None
+        fetch = k if filters is None else k * settings.FILTER_OVERFETCH_FACTOR
+
+        with span("vector_query"):
+            hit_lists = self.search_many(query_vectors, k=fetch, filters=filters)
+        with span("hydrate"):
+            product_lists = self._hydrate_many(db, hit_lists, filters)
+
+        results = []
+        for vector, hits, products in zip(query_vectors, hit_lists, product_lists):
+            exhausted = len(hits) < fetch or fetch >= settings.FILTER_MAX_CANDIDATES
+            if filters is None or len(products) >= k or exhausted:
+                results.append(products[:k])
+            else:
+                results.append(self.search_products(db, vector, k=k, filters=filters))
+        return results
+
+    def _hydrate(self, db, hits: List[Tuple[str, float]], filters: Optional[SearchFilters]) -> List[dict]:
+        return self._hydrate_many(db, [hits], filters)[0]
+
+    def _hydrate_many(self, db, hit_lists: List[List[Tuple[str, float]]], filters: Optional[SearchFilters]) -> List[List[dict]]:
+        """
+        Chi tiết sản phẩm lấy qua product_cache (LRU + Redis, thiếu mới SELECT Postgres 1 lần cho cả batch).
+        Filter được kiểm tra lại trên dữ liệu sản phẩm thật (chặn metadata cũ trong vector DB).
+        """
+        ids = {pid for hits in hit_lists for pid, _ in hits}
+        if not ids:
+            return [[] for _ in hit_lists]
+
+        by_id = product_cache.get_many(ids, db)
+        if filters is not None:
+            by_id = {pid: p for pid, p in by_id.items() if filters.matches(p)}
+        return [
+            [{**by_id[pid], "score": distance} for pid, distance in hits if pid in by_id]
+            for hits in hit_lists
+        ]
+
+
+def chroma_where(filters: Optional[SearchFilters]) -> Optional[dict]:
+    """SearchFilters -> mệnh đề `where` của Chroma (metadata: category, price, currency)."""
+    if not filters:
+        return None
+    conditions = []
+    if filters.category is not None:
+        conditions.append({"category": {"$eq": filters.category}})
+    if filters.min_price is not None:
+        conditions.append({"price": {"$gte": filters.min_price}})
+    if filters.max_price is not None:
+        conditions.append({"price": {"$lte": filters.max_price}})
+    if filters.currency is not None:
+        conditions.append({"currency": {"$eq": filters.currency}})
+    if not conditions:
+        return None
+    # Chroma không chấp nhận $and với 1 phần tử
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+class ChromaVectorStore(BaseVectorStore):
     def __init__(self):
+        import chromadb
+
         # Kết nối tới ChromaDB container qua HTTP
         self.client = chromadb.HttpClient(
             host="chromadb", # Tên service trong docker-compose
@@ -16,19 +147,53 @@ class VectorStore:
             metadata={"hnsw:space": "cosine"}
         )
 
-    def search(self, query_vector, k=5):
-        """Tìm kiếm top K sản phẩm giống nhất"""
-        return self.collection.query(
-            query_embeddings=[query_vector],
-            n_results=k
+    def search(self, query_vector, k=5, filters: Optional[SearchFilters] = None):
+        """Tìm kiếm top K sản phẩm giống nhất (filter được Chroma áp dụng ngay trong query)"""
+        return self.search_many([query_vector], k=k, filters=filters)[0]
+
+    def search_many(self, query_vectors, k=5, filters: Optional[SearchFilters] = None):
+        """Nhiều query vector trong 1 request Chroma (thay vì N round trip)."""
+        if not len(query_vectors):
+            return []
+        results = self.collection.query(
+            query_embeddings=list(query_vectors),
+            n_results=k,
+            where=chroma_where(filters),
+            include=["distances"]
         )
+        # Chroma trả về list lồng nhau (1 list cho mỗi query vector)
+        ids = results.get('ids') or [[] for _ in query_vectors]
+        distances = results.get('distances') or [[] for _ in query_vectors]
+        return [list(zip(i, d)) for i, d in zip(ids, distances)]
 
-    def add_product(self, product_id: str, embedding: list):
-        """Thêm vector sản phẩm vào kho"""
-        self.collection.add(
-            ids=[product_id],
-            embeddings=[embedding]
+    def add_products(self, product_ids: list, embeddings: list, metadatas: list = None):
+        """
+        Thêm/cập nhật nhiều vector trong 1 request (dùng cho ingest hàng loạt).
+        Dùng upsert để chạy lại 1 chunk (resume sau crash) không bị lỗi trùng ID.
+        metadatas (category, price, currency) là dữ liệu để filter pushdown.
+        """
+        if not product_ids:
+            return
+        self.collection.upsert(
+            ids=product_ids,
+            embeddings=embeddings,
+            metadatas=metadatas
         )
 
+
+def get_vector_store() -> BaseVectorStore:
+    """Chọn backend theo settings.VECTOR_STORE_BACKEND ("chroma" | "pgvector" | "flat")."""
+    backend = settings.VECTOR_STORE_BACKEND
+    if backend == "chroma":
+        return ChromaVectorStore()
+    if backend == "pgvector":
+        from app.db.pgvector_store import PgVectorStore
+        return PgVectorStore()
+    if backend == "flat":
+        from app.db.flat_index_store import FlatIndexVectorStore
+        return FlatIndexVectorStore()
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {backend}")
+
+
 # Singleton instance
-vector_store = VectorStore()
\ No newline at end of file
+vector_store = get_vector_store()
@@ -1,11 +1,56 @@
-from fastapi import FastAPI
+import time
+
+from fastapi import FastAPI, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from app.core.config import settings
 from app.api.v1.api import api_router
+from app.services.storage import storage
+from app.core.ai_engine import ai_engine
+from app.core.metrics import HTTP_REQUEST_SECONDS, render_latest
+from app.core.tracing import TRACE_HEADER, trace
 
 app = FastAPI(title=settings.PROJECT_NAME)
 
+@app.on_event("startup")
+async def check_storage_bucket():
+    # Kiểm tra/tạo bucket 1 lần khi khởi động thay vì mỗi request
+    await run_in_threadpool(storage.ensure_bucket)
+
+@app.on_event("startup")
+async def warmup_clip_model():
+    # Nạp + warm-up CLIP trước khi nhận request (inline search, text search...)
+    if settings.CLIP_WARMUP_ON_STARTUP:
+        await run_in_threadpool(ai_engine.warmup)
+    # Text tower (tìm kiếm bằng text) chỉ có ở API, bật / tắt riêng
+    if settings.TEXT_WARMUP_ON_STARTUP:
+        await run_in_threadpool(ai_engine.warmup_text)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # Prometheus scrape không cần trace / đo
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    # Trace id từ client (hoặc sinh mới) -> contextvar -> header message Celery -> worker
+    with trace("http", request.headers.get(TRACE_HEADER), method=request.method, path=request.url.path) as trace_id:
+        t0 = time.perf_counter()
+        response = await call_next(request)
+        # Route template (/search/tasks/{task_id}) thay vì path thật -> label không bùng nổ
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.labels(
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=response.status_code,
+        ).observe(time.perf_counter() - t0)
+        response.headers[TRACE_HEADER] = trace_id
+        return response
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    content, content_type = render_latest()
+    return Response(content=content, media_type=content_type)
+
 @app.get("/")
 def root():
     return {"message": "Welcome to Shopping Buddy AI API"}
\ No newline at end of file
@@ -0,0 +1,91 @@
+from pydantic import BaseModel, Field, model_validator
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+# Bộ lọc metadata cho tìm kiếm sản phẩm (được đẩy xuống Vector DB, không lọc sau khi lấy kết quả)
+class SearchFilters(BaseModel):
+    category: Optional[str] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    currency: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_price_range(self):
+        if self.min_price is not None and self.max_price is not None and self.min_price > self.max_price:
+            raise ValueError("min_price must be <= max_price")
+        return self
+
+    def is_empty(self) -> bool:
+        return not self.model_dump(exclude_none=True)
+
+    def matches(self, product: dict) -> bool:
+        """Cùng điều kiện với product_filter_clauses, áp dụng trên dict sản phẩm (lấy từ cache)."""
+        price = product.get("price")
+        if self.category is not None and product.get("category") != self.category:
+            return False
+        if self.min_price is not None and (price is None or price < self.min_price):
+            return False
+        if self.max_price is not None and (price is None or price > self.max_price):
+            return False
+        if self.currency is not None and product.get("currency") != self.currency:
+            return False
+        return True
+
+    def cache_key(self) -> str:
+        """Chuỗi ổn định (theo thứ tự field) để ghép vào key cache kết quả."""
+        parts = [f"{k}={v}" for k, v in sorted(self.model_dump(exclude_none=True).items())]
+        return "&".join(parts) or "-"
+
+
+# Cập nhật ProductResponse để có cấu trúc rõ ràng hơn
+class ProductResponse(BaseModel):
+    id: str
+    name: str
+    category: str
+    price: float
+    image_url: str
+    score: float
+    metadata: Dict[str, Any]
+
+    @classmethod
+    def from_product(cls, product: dict, base_url: str) -> "ProductResponse":
+        # Lấy đường dẫn ảnh, nếu không có thì để rỗng
+        rel_path = product.get('image_url') or ''
+
+        # Xử lý Full URL
+        if rel_path.startswith("http") and not rel_path.startswith("http://localhost") and not rel_path.startswith("http://10.0.2.2"):
+            full_img_url = rel_path
+        else:
+            # Nếu là đường dẫn tương đối (/static/...) thì ghép với base_url
+            full_img_url = f"{base_url}{rel_path}"
+
+        return cls(
+            id=product['id'],
+            name=product.get('name') or 'Unknown',
+            category=product.get('category') or 'Unknown',
+            price=product.get('price') or 0.0,
+            image_url=full_img_url,
+            score=product['score'],
+            metadata=product
+        )
+
+class SearchResponse(BaseModel):
+    results: List[ProductResponse]
+
+# Tìm kiếm bằng câu mô tả (POST body; GET dùng query params)
+class TextSearchRequest(BaseModel):
+    query: str = Field(..., min_length=1, max_length=settings.TEXT_QUERY_MAX_LENGTH)
+    k: int = Field(5, ge=1, le=50)
+    filters: SearchFilters = Field(default_factory=SearchFilters)
+
+# Batch search: kết quả riêng từng ảnh + (tuỳ chọn) xếp hạng gộp của cả batch
+class BatchImageResult(BaseModel):
+    index: int
+    filename: Optional[str] = None
+    results: List[ProductResponse] = []
+    error: Optional[str] = None
+
+class BatchSearchResponse(BaseModel):
+    images: List[BatchImageResult]
+    fused: Optional[List[ProductResponse]] = None
@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+
+
+class AdviceRequest(BaseModel):
+    product_id: str
+    user_question: str
+
+
+class AdviceResponse(BaseModel):
+    product_id: str
+    advice: str
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Any
+from typing import Optional, Any, List
 from uuid import UUID
 from datetime import datetime
 
@@ -9,8 +9,12 @@ class TaskBase(BaseModel):
 # Schema trả về khi tạo Task xong
 class TaskCreateResponse(BaseModel):
     task_id: UUID
+    # Truyền lại vào ?created_at= khi poll / stream: Postgres chỉ quét partition của tháng đó
+    created_at: Optional[datetime] = None
     status: str
     message: str
+    served_by: str = "queue"      # cache | inline | queue
+    result: Optional[Any] = None  # Có sẵn khi served_by là cache/inline
 
 # Schema trả về khi Polling (Check status)
 class TaskStatusResponse(BaseModel):
@@ -21,4 +25,9 @@ class TaskStatusResponse(BaseModel):
     created_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Lịch sử tìm kiếm của user: keyset pagination (created_at, id) giảm dần
+class TaskHistoryResponse(BaseModel):
+    items: List[TaskStatusResponse]
+    next_cursor: Optional[str] = None  # Truyền lại vào ?cursor= để lấy trang sau; None = hết
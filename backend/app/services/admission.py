@@ -0,0 +1,112 @@
+import json
+import math
+import time
+from typing import NamedTuple, Optional
+
+import redis
+
+from app.core.celery_app import ENQUEUED_AT_HEADER, QUEUE_INFERENCE
+from app.core.config import settings
+from app.core.redis_client import async_redis_client
+
+
+class QueueProbe(NamedTuple):
+    depth: int
+    oldest_age: float  # giây, 0 khi queue rỗng
+
+
+class AdmissionDecision(NamedTuple):
+    admitted: bool
+    reason: Optional[str] = None  # "queue_depth" | "queue_age"
+    retry_after: int = 0
+
+
+class AdmissionControl:
+    """
+    Admission control cho 1 lane Celery (broker Redis): trước khi nhận ảnh + tạo task,
+    xem độ sâu queue (LLEN) và tuổi message cũ nhất (đuôi list, header enqueued_at).
+    Quá ngưỡng -> từ chối, kèm Retry-After tỉ lệ với mức quá tải.
+    - Đọc Redis tối đa 1 lần / ADMISSION_PROBE_INTERVAL_SECONDS mỗi process (flash sale: không LLEN mỗi request)
+    - Redis lỗi -> cho qua (fail open), như các cache khác
+    """
+
+    def __init__(
+        self,
+        client,
+        queue: str,
+        max_depth: int,
+        max_age_seconds: float,
+        retry_after_seconds: int,
+        retry_after_max_seconds: int,
+        probe_interval_seconds: float,
+    ):
+        self.client = client
+        self.queue = queue
+        self.max_depth = max_depth
+        self.max_age = max_age_seconds
+        self.retry_after = max(1, retry_after_seconds)
+        self.retry_after_max = max(self.retry_after, retry_after_max_seconds)
+        self.probe_interval = probe_interval_seconds
+        self._probe: Optional[QueueProbe] = None
+        self._probed_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_depth > 0 or self.max_age > 0
+
+    async def probe(self) -> Optional[QueueProbe]:
+        now = time.monotonic()
+        if self._probe is not None and now - self._probed_at < self.probe_interval:
+            return self._probe
+        try:
+            # Kombu LPUSH message mới vào đầu list, worker lấy từ cuối -> cuối list là message cũ nhất
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.llen(self.queue)
+                pipe.lindex(self.queue, -1)
+                depth, oldest = await pipe.execute()
+        except redis.RedisError as e:
+            print(f"⚠️ Admission control: không đọc được queue {self.queue} ({e}) -> cho qua", flush=True)
+            return None
+        self._probe = QueueProbe(depth=depth, oldest_age=self._age(oldest))
+        self._probed_at = now
+        return self._probe
+
+    @staticmethod
+    def _age(message: Optional[bytes]) -> float:
+        if not message:
+            return 0.0
+        try:
+            enqueued_at = json.loads(message)["headers"].get(ENQUEUED_AT_HEADER)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return 0.0
+        return max(0.0, time.time() - float(enqueued_at)) if enqueued_at else 0.0
+
+    async def check(self) -> AdmissionDecision:
+        if not self.enabled:
+            return AdmissionDecision(admitted=True)
+        probe = await self.probe()
+        if probe is None:
+            return AdmissionDecision(admitted=True)
+
+        load = {}
+        if self.max_depth > 0:
+            load["queue_depth"] = probe.depth / self.max_depth
+        if self.max_age > 0:
+            load["queue_age"] = probe.oldest_age / self.max_age
+        reason, ratio = max(load.items(), key=lambda item: item[1])
+        if ratio < 1:
+            return AdmissionDecision(admitted=True)
+        # Quá ngưỡng gấp đôi -> chờ gấp đôi, trần retry_after_max
+        retry_after = min(self.retry_after_max, math.ceil(self.retry_after * ratio))
+        return AdmissionDecision(admitted=False, reason=reason, retry_after=retry_after)
+
+
+admission_control = AdmissionControl(
+    async_redis_client,
+    queue=QUEUE_INFERENCE,
+    max_depth=settings.ADMISSION_MAX_QUEUE_DEPTH,
+    max_age_seconds=settings.ADMISSION_MAX_QUEUE_AGE_SECONDS,
+    retry_after_seconds=settings.ADMISSION_RETRY_AFTER_SECONDS,
+    retry_after_max_seconds=settings.ADMISSION_RETRY_AFTER_MAX_SECONDS,
+    probe_interval_seconds=settings.ADMISSION_PROBE_INTERVAL_SECONDS,
+)
@@ -0,0 +1,39 @@
+import hashlib
+import time
+from typing import Iterator
+
+
+class FakeChunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeLLM:
+    """
+    LLM giả (cùng interface generate_content của google.generativeai) để chạy/test
+    Stylist offline: câu trả lời cố định theo prompt, stream từng từ với độ trễ giả lập.
+    Bật bằng STYLIST_LLM_BACKEND=fake.
+    """
+
+    def __init__(self, chunk_delay_ms: float = 30.0):
+        self.chunk_delay = max(0.0, chunk_delay_ms) / 1000.0
+
+    def _answer(self, prompt: str) -> str:
+        tag = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        return (
+            "✨ Món này rất dễ phối!\n"
+            "- 👖 Đi làm: kết hợp quần âu và giày loafer.\n"
+            "- 👟 Đi chơi: mix với quần jean và sneaker trắng.\n"
+            f"- 🎉 Đi tiệc: thêm áo blazer và phụ kiện bạc. [fake:{tag}]"
+        )
+
+    def _stream(self, text: str) -> Iterator[FakeChunk]:
+        for word in text.split(" "):
+            time.sleep(self.chunk_delay)
+            yield FakeChunk(word + " ")
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        text = self._answer(prompt)
+        if stream:
+            return self._stream(text)
+        return FakeChunk(text)
@@ -1,8 +1,17 @@
+from typing import Iterator
 import google.generativeai as genai
+from fastapi.concurrency import run_in_threadpool
 from app.core.config import settings
+from app.core.prompts import STYLIST_SYSTEM_PROMPT, create_outfit_prompt, create_user_prompt
+from app.services.ai.fake_llm import FakeLLM
+from app.services.ai.stylist_cache import stylist_cache
 
 class GeminiStylist:
     def __init__(self):
+        if settings.STYLIST_LLM_BACKEND == "fake":
+            self.model = FakeLLM(chunk_delay_ms=settings.STYLIST_FAKE_LLM_DELAY_MS)
+            self.is_active = True
+            return
         try:
             genai.configure(api_key=settings.GEMINI_API_KEY)
             self.model = genai.GenerativeModel('models/gemini-2.5-flash')
@@ -11,29 +20,93 @@ class GeminiStylist:
             print(f"⚠️ Không thể khởi tạo Gemini: {e}")
             self.is_active = False
 
-    def get_outfit_advice(self, product_name: str, product_desc: str) -> str:
+    def generate_outfit_advice(self, product_name: str, product_desc: str, product_id: str = None) -> str:
+        """
+        Xin lời khuyên phối đồ từ Gemini (raise nếu lỗi, lỗi không bị cache).
+        Có cache theo sản phẩm (+ phiên bản prompt): sản phẩm "hot" chỉ tốn 1 lần gọi LLM.
+        """
+        if not self.is_active:
+            raise RuntimeError("Gemini chưa được khởi tạo")
+
+        prompt = create_outfit_prompt(product_name, product_desc)
+        # Không có product_id thì key theo tên sản phẩm
+        return stylist_cache.get_or_compute(
+            product_id or f"name:{product_name}",
+            None,
+            lambda: self.model.generate_content(prompt).text,
+        )
+
+    def get_outfit_advice(self, product_name: str, product_desc: str, product_id: str = None) -> str:
         """
         Xin lời khuyên phối đồ từ Gemini.
         """
         if not self.is_active:
             return "Chức năng tư vấn đang bảo trì."
 
-        prompt = f"""
-        Bạn là một Fashion Stylist chuyên nghiệp và thân thiện.
-        Tôi vừa tìm thấy một sản phẩm thời trang này:
-        - Tên: {product_name}
-        - Mô tả: {product_desc}
-        
-        Hãy cho tôi 3 gợi ý phối đồ (Outfit ideas) thật sành điệu với món đồ này để đi chơi hoặc đi làm.
-        Trả lời ngắn gọn, dùng gạch đầu dòng và thêm emoji cho sinh động.
-        """
+        try:
+            return self.generate_outfit_advice(product_name, product_desc, product_id)
+        except Exception as e:
+            print(f"❌ Lỗi khi gọi Gemini: {e}")
+            return "Xin lỗi, stylist đang bận suy nghĩ, bạn thử lại sau nhé!"
 
+    # --- Tư vấn theo câu hỏi của khách (RAG: thông tin sản phẩm + câu hỏi) ---
+    @staticmethod
+    def _advice_prompt(product: dict, user_question: str) -> str:
+        return STYLIST_SYSTEM_PROMPT + create_user_prompt(
+            product_name=product["name"],
+            product_category=product.get("category") or "Thời trang",
+            user_question=user_question,
+        )
+
+    def generate_advice(self, product: dict, user_question: str) -> str:
+        """Trả lời câu hỏi về 1 sản phẩm (có cache theo sản phẩm + câu hỏi đã chuẩn hóa)."""
+        if not self.is_active:
+            raise RuntimeError("Gemini chưa được khởi tạo")
+
+        prompt = self._advice_prompt(product, user_question)
+        return stylist_cache.get_or_compute(
+            product["id"],
+            user_question,
+            lambda: self.model.generate_content(prompt).text,
+        )
+
+    async def get_advice(self, product_metadata: dict, user_question: str) -> str:
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            return await run_in_threadpool(self.generate_advice, product_metadata, user_question)
         except Exception as e:
             print(f"❌ Lỗi khi gọi Gemini: {e}")
             return "Xin lỗi, stylist đang bận suy nghĩ, bạn thử lại sau nhé!"
 
+    def stream_advice(self, product: dict, user_question: str) -> Iterator[str]:
+        """
+        Stream từng đoạn text ngay khi model sinh ra (time-to-first-token thấp).
+        Cache hit thì trả nguyên câu trả lời 1 lần; stream xong trọn vẹn mới ghi cache.
+        """
+        if not self.is_active:
+            raise RuntimeError("Gemini chưa được khởi tạo")
+
+        cached = stylist_cache.get(product["id"], user_question)
+        # Chuỗi rỗng (entry cũ ghi từ stream bị chặn hết) coi như miss
+        if cached:
+            yield cached
+            return
+
+        prompt = self._advice_prompt(product, user_question)
+        parts = []
+        for chunk in self.model.generate_content(prompt, stream=True):
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunk không có text (vd: bị chặn bởi safety filter)
+                continue
+            if text:
+                parts.append(text)
+                yield text
+
+        # Mọi chunk bị chặn / không có text -> không cache câu trả lời rỗng cho cả TTL
+        if parts:
+            stylist_cache.set(product["id"], user_question, "".join(parts))
+
 # Singleton Instance
-stylist_ai = GeminiStylist()
\ No newline at end of file
+stylist_ai = GeminiStylist()
+stylist_service = stylist_ai
@@ -0,0 +1,182 @@
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+import redis
+from sqlalchemy import event, inspect
+
+from app.core.config import settings
+from app.core.lru import LocalLRU
+from app.core.prompts import PROMPT_VERSION
+from app.core.redis_client import redis_client
+from app.db.models.product import Product
+
+# Các cột mà prompt Stylist dùng tới: đổi 1 trong số này thì lời khuyên cũ không còn đúng
+PROMPT_FIELDS = ("name", "description", "category")
+
+
+def normalize_question(question: Optional[str]) -> str:
+    """Gộp các câu hỏi gần giống nhau: NFC, không phân biệt hoa/thường, gộp khoảng trắng, bỏ dấu câu cuối."""
+    if not question:
+        return ""
+    text = unicodedata.normalize("NFC", question).casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(" ?!.…")
+
+
+class StylistCache:
+    """
+    Cache lời khuyên Stylist (LLM) theo (product id, phiên bản prompt, câu hỏi đã chuẩn hóa):
+    - Tầng 1: LRU trong process (không tốn round trip)
+    - Tầng 2: Redis với TTL, dùng chung mọi process/worker
+    - Single-flight: nhiều request cùng miss 1 key chỉ gọi LLM 1 lần
+      (trong process: chờ chung 1 Future; giữa các process: lock Redis SET NX)
+    Lỗi Redis không làm hỏng luồng chính: coi như cache miss.
+    """
+
+    PREFIX = "stylist_cache"
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self.local = LocalLRU(settings.STYLIST_CACHE_LOCAL_MAX_ENTRIES, settings.STYLIST_CACHE_LOCAL_TTL_SECONDS)
+        self._inflight: dict = {}
+        self._inflight_lock = threading.Lock()
+
+    # --- Keys ---
+    def _product_prefix(self, product_id: str) -> str:
+        return f"{self.PREFIX}:{PROMPT_VERSION}:{product_id}:"
+
+    def key(self, product_id: str, question: Optional[str] = None) -> str:
+        digest = hashlib.sha1(normalize_question(question).encode("utf-8")).hexdigest()[:16]
+        return f"{self._product_prefix(product_id)}{digest}"
+
+    def _index_key(self, product_id: str) -> str:
+        # Set các key của 1 sản phẩm (mọi phiên bản prompt) -> xoá được khi sản phẩm đổi
+        return f"{self.PREFIX}:product:{product_id}"
+
+    # --- Đọc / ghi ---
+    def get(self, product_id: str, question: Optional[str] = None) -> Optional[str]:
+        key = self.key(product_id, question)
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        value = self._redis_get(key)
+        if value is not None:
+            self.local.set(key, value)
+        return value
+
+    def set(self, product_id: str, question: Optional[str], advice: str):
+        key = self.key(product_id, question)
+        self.local.set(key, advice)
+        try:
+            pipe = self.client.pipeline()
+            pipe.set(key, advice.encode("utf-8"), ex=settings.STYLIST_CACHE_TTL_SECONDS)
+            pipe.sadd(self._index_key(product_id), key)
+            pipe.expire(self._index_key(product_id), settings.STYLIST_CACHE_TTL_SECONDS)
+            pipe.execute()
+        except redis.RedisError as e:
+            print(f"⚠️ Redis stylist cache lỗi (set): {e}", flush=True)
+
+    def _redis_get(self, key: str) -> Optional[str]:
+        try:
+            raw = self.client.get(key)
+        except redis.RedisError as e:
+            print(f"⚠️ Redis stylist cache lỗi (get): {e}", flush=True)
+            return None
+        return raw.decode("utf-8") if raw is not None else None
+
+    def get_or_compute(self, product_id: str, question: Optional[str], compute: Callable[[], str]) -> str:
+        """
+        Trả lời khuyên đã cache, hoặc gọi `compute()` (LLM) đúng 1 lần cho mỗi key
+        dù có bao nhiêu request miss đồng thời. Lỗi của compute() không được cache.
+        """
+        cached = self.get(product_id, question)
+        if cached is not None:
+            return cached
+
+        key = self.key(product_id, question)
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+
+        if not leader:
+            return future.result(timeout=settings.STYLIST_CACHE_LOCK_TIMEOUT_SECONDS)
+
+        try:
+            advice = self._compute_once_across_processes(product_id, question, key, compute)
+            future.set_result(advice)
+            return advice
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def _compute_once_across_processes(self, product_id, question, key: str, compute: Callable[[], str]) -> str:
+        lock_key = f"{key}:lock"
+        timeout = settings.STYLIST_CACHE_LOCK_TIMEOUT_SECONDS
+        try:
+            acquired = self.client.set(lock_key, b"1", nx=True, ex=int(timeout))
+        except redis.RedisError:
+            acquired = True  # Redis lỗi -> tự gọi LLM
+
+        if not acquired:
+            # Process khác đang gọi LLM cho key này -> chờ kết quả của nó
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.1)
+                value = self._redis_get(key)
+                if value is not None:
+                    self.local.set(key, value)
+                    return value
+                try:
+                    if not self.client.exists(lock_key):
+                        break  # Process kia lỗi/không ghi cache -> tự gọi
+                except redis.RedisError:
+                    break
+
+        try:
+            advice = compute()
+            self.set(product_id, question, advice)
+            return advice
+        finally:
+            if acquired:
+                try:
+                    self.client.delete(lock_key)
+                except redis.RedisError:
+                    pass
+
+    # --- Invalidation ---
+    def invalidate_product(self, product_id: str):
+        """Xoá mọi lời khuyên đã cache của 1 sản phẩm (gọi khi dữ liệu sản phẩm thay đổi)."""
+        product_id = str(product_id)
+        self.local.discard_prefix(self._product_prefix(product_id))
+        try:
+            index_key = self._index_key(product_id)
+            keys = self.client.smembers(index_key)
+            self.client.delete(index_key, *keys)
+        except redis.RedisError as e:
+            print(f"⚠️ Redis stylist cache lỗi (invalidate): {e}", flush=True)
+
+
+stylist_cache = StylistCache(redis_client)
+
+
+@event.listens_for(Product, "after_update")
+def _invalidate_stylist_advice(mapper, connection, target):
+    """Hook: sản phẩm đổi tên/mô tả/danh mục qua ORM -> bỏ lời khuyên cũ."""
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in PROMPT_FIELDS):
+        stylist_cache.invalidate_product(target.id)
+
+
+@event.listens_for(Product, "after_delete")
+def _drop_stylist_advice(mapper, connection, target):
+    stylist_cache.invalidate_product(target.id)
@@ -0,0 +1,82 @@
+from typing import List, Optional, Union
+
+from app.core.embedding_batcher import embedding_batcher
+from app.db.session import SessionLocal
+from app.db.vector_store import vector_store
+from app.schemas.search import SearchFilters
+from app.services.search_cache import search_cache, hash_image
+
+# Hằng số của Reciprocal Rank Fusion (giá trị chuẩn trong tài liệu RRF)
+RRF_K = 60
+
+
+def fuse_rankings(result_lists: List[List[dict]], k: int) -> List[dict]:
+    """
+    Gộp kết quả của nhiều ảnh thành 1 bảng xếp hạng bằng Reciprocal Rank Fusion:
+    điểm = tổng 1 / (RRF_K + hạng) qua các ảnh -> sản phẩm khớp nhiều ảnh (nhiều góc chụp
+    của cùng 1 món đồ) được đẩy lên. "score" giữ distance tốt nhất để cùng nghĩa với kết quả đơn.
+    """
+    fused = {}
+    for image_index, products in enumerate(result_lists):
+        for rank, product in enumerate(products, start=1):
+            entry = fused.get(product["id"])
+            if entry is None:
+                entry = fused[product["id"]] = {**product, "fused_score": 0.0, "matched_images": []}
+            entry["fused_score"] += 1.0 / (RRF_K + rank)
+            entry["matched_images"].append(image_index)
+            entry["score"] = min(entry["score"], product["score"])
+
+    ranked = sorted(fused.values(), key=lambda p: (-p["fused_score"], p["score"]))
+    return ranked[:k]
+
+
+class BatchSearch:
+    """
+    Tìm kiếm nhiều ảnh trong 1 request, thay cho N SearchTask riêng lẻ:
+    - Không qua S3/Celery: ảnh đã có trong request
+    - Embedding đã cache (theo hash ảnh) thì bỏ qua CLIP; phần còn lại vào micro-batcher
+      liền nhau -> 1 forward pass cho cả batch
+    - 1 lần search_products_many (multi-query vector search + 1 lần hydrate Postgres)
+    """
+
+    def __init__(self, batcher, timeout: float = 30.0):
+        self.batcher = batcher
+        self.timeout = timeout
+
+    def embed(self, images: List[bytes]) -> List[Union[List[float], Exception]]:
+        hashes = [hash_image(image) for image in images]
+        vectors: list = [search_cache.get_embedding(h) for h in hashes]
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        futures = self.batcher.submit_many([images[i] for i in missing])
+        for i, future in zip(missing, futures):
+            try:
+                vectors[i] = future.result(timeout=self.timeout)
+                search_cache.set_embedding(hashes[i], vectors[i])
+            except Exception as e:
+                vectors[i] = e
+        return vectors
+
+    def search(self, images: List[bytes], k: int = 5, filters: Optional[SearchFilters] = None) -> List[Union[List[dict], Exception]]:
+        """
+        Blocking (CPU + DB): gọi qua run_in_threadpool từ endpoint async.
+        Trả về, theo đúng thứ tự ảnh, danh sách sản phẩm hoặc Exception của ảnh lỗi.
+        """
+        vectors = self.embed(images)
+        ok = [i for i, vector in enumerate(vectors) if not isinstance(vector, Exception)]
+        if not ok:
+            return vectors
+
+        db = SessionLocal()
+        try:
+            product_lists = vector_store.search_products_many(db, [vectors[i] for i in ok], k=k, filters=filters)
+        finally:
+            db.close()
+
+        results = list(vectors)
+        for i, products in zip(ok, product_lists):
+            results[i] = products
+        return results
+
+
+batch_search = BatchSearch(embedding_batcher)
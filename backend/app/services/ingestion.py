@@ -0,0 +1,344 @@
+import csv
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import requests
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.ai_engine import ai_engine
+from app.core.preprocess import load_for_clip
+from app.db.models.product import Product
+from app.db.session import SessionLocal
+from app.db.vector_store import vector_store
+from app.services.ai.stylist_cache import PROMPT_FIELDS, stylist_cache
+from app.services.product_cache import product_cache
+
+# Namespace cố định để SKU -> UUID luôn ra cùng 1 giá trị (chạy lại/resume không tạo bản ghi trùng)
+PRODUCT_NAMESPACE = uuid.UUID("6f1c1d8e-3b0a-4d52-9a57-0c5a8f4e2b11")
+
+STAGES = ("read", "fetch", "embed", "db", "vector")
+
+# Cột Product được ghi đè khi import lại SKU đã có
+MUTABLE_COLUMNS = ("name", "description", "price", "currency", "image_url", "category", "meta_info")
+
+
+class StageStats:
+    """Đếm số item và thời gian theo từng stage để báo items/sec."""
+
+    def __init__(self):
+        self.items = {stage: 0 for stage in STAGES}
+        self.seconds = {stage: 0.0 for stage in STAGES}
+        self.failed = 0
+        self.started_at = time.monotonic()
+
+    def add(self, stage: str, items: int, seconds: float):
+        self.items[stage] += items
+        self.seconds[stage] += seconds
+
+    def report(self) -> str:
+        parts = []
+        for stage in STAGES:
+            secs = self.seconds[stage]
+            rate = self.items[stage] / secs if secs > 0 else 0.0
+            parts.append(f"{stage}={rate:,.1f}/s")
+        elapsed = time.monotonic() - self.started_at
+        done = self.items["vector"]
+        overall = done / elapsed if elapsed > 0 else 0.0
+        return f"{done:,} items ({overall:,.1f}/s, {self.failed} lỗi) | " + " ".join(parts)
+
+
+class Checkpoint:
+    """
+    Lưu tiến độ (số record đã xử lý xong) ra file JSON.
+    Ghi theo kiểu write-then-rename để file không bao giờ bị hỏng giữa chừng.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.processed = 0
+        self.stored = 0
+        self.failed = 0
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.processed = state.get("processed", 0)
+            self.stored = state.get("stored", 0)
+            self.failed = state.get("failed", 0)
+
+    def save(self, processed: int, stats: StageStats):
+        self.processed = processed
+        # stored/failed cộng dồn qua các lần chạy (resume)
+        state = {
+            "processed": processed,
+            "stored": self.stored + stats.items["vector"],
+            "failed": self.failed + stats.failed,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+
+def iter_manifest(path: str) -> Iterator[Dict]:
+    """Đọc manifest dạng stream (JSONL hoặc CSV), không load cả file vào RAM."""
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                yield row
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def product_id_for(record: Dict) -> uuid.UUID:
+    sku = record.get("sku") or record.get("id")
+    if not sku:
+        raise ValueError("Record thiếu 'sku'/'id'")
+    return uuid.uuid5(PRODUCT_NAMESPACE, str(sku))
+
+
+class ImageFetcher:
+    """Tải ảnh song song: URL http(s) qua Session theo từng thread, còn lại đọc từ thư mục local."""
+
+    def __init__(self, image_dir: Optional[str] = None, offline: bool = False, timeout: float = 10.0):
+        self.image_dir = image_dir
+        self.offline = offline
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def fetch(self, record: Dict) -> Image.Image:
+        source = record.get("image") or record.get("image_path") or record.get("image_url")
+        if not source:
+            raise ValueError("Record thiếu đường dẫn ảnh")
+
+        if source.startswith(("http://", "https://")):
+            if self.offline:
+                raise ValueError(f"Chế độ offline không tải được URL: {source}")
+            response = self._session().get(source, timeout=self.timeout)
+            response.raise_for_status()
+            source = response.content
+        else:
+            source = source if os.path.isabs(source) or not self.image_dir else os.path.join(self.image_dir, source)
+
+        # Decode rút gọn + resize/crop về 224 ngay trong thread tải (PIL nhả GIL khi decode)
+        # để stage embed chỉ còn normalize + inference
+        return load_for_clip(source)
+
+
+class IngestionPipeline:
+    """
+    Ingest catalog lớn theo chunk:
+    đọc manifest (stream) -> tải ảnh song song -> embed theo batch ->
+    bulk insert Product -> batch add vector -> checkpoint.
+    Chunk kế tiếp được tải ảnh trước trong lúc chunk hiện tại đang embed.
+    """
+
+    def __init__(
+        self,
+        manifest_path: str,
+        checkpoint_path: Optional[str] = None,
+        image_dir: Optional[str] = None,
+        offline: bool = False,
+        chunk_size: int = 256,
+        embed_batch_size: int = 32,
+        fetch_workers: int = 16,
+        report_every: int = 10,
+    ):
+        self.manifest_path = manifest_path
+        self.checkpoint = Checkpoint(checkpoint_path or f"{manifest_path}.checkpoint.json")
+        self.errors_path = f"{self.checkpoint.path}.errors.jsonl"
+        self.fetcher = ImageFetcher(image_dir=image_dir, offline=offline)
+        self.chunk_size = chunk_size
+        self.embed_batch_size = embed_batch_size
+        self.fetch_workers = fetch_workers
+        self.report_every = report_every
+        self.stats = StageStats()
+
+    def _iter_chunks(self) -> Iterator[List[Dict]]:
+        skip = self.checkpoint.processed
+        chunk = []
+        t0 = time.monotonic()
+        for index, record in enumerate(iter_manifest(self.manifest_path)):
+            if index < skip:
+                continue
+            chunk.append(record)
+            if len(chunk) >= self.chunk_size:
+                self.stats.add("read", len(chunk), time.monotonic() - t0)
+                yield chunk
+                chunk = []
+                t0 = time.monotonic()
+        if chunk:
+            self.stats.add("read", len(chunk), time.monotonic() - t0)
+            yield chunk
+
+    def _record_error(self, record: Dict, error: Exception):
+        self.stats.failed += 1
+        with open(self.errors_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"record": record, "error": str(error)}, ensure_ascii=False) + "\n")
+
+    def _fetch_one(self, record: Dict) -> Image.Image:
+        # Validate sớm để record hỏng bị ghi vào file lỗi thay vì làm fail cả chunk khi insert
+        product_id_for(record)
+        if not record.get("name"):
+            raise ValueError("Record thiếu 'name'")
+        return self.fetcher.fetch(record)
+
+    def _fetch_chunk(self, executor: ThreadPoolExecutor, chunk: List[Dict]):
+        return time.monotonic(), [executor.submit(self._fetch_one, record) for record in chunk]
+
+    def _collect_fetched(self, chunk: List[Dict], pending) -> List[Tuple[Dict, Image.Image]]:
+        started, futures = pending
+        fetched = []
+        for record, future in zip(chunk, futures):
+            try:
+                fetched.append((record, future.result()))
+            except Exception as e:
+                self._record_error(record, e)
+        self.stats.add("fetch", len(fetched), time.monotonic() - started)
+        return fetched
+
+    def _embed(self, fetched: List[Tuple[Dict, Image.Image]]) -> List[Tuple[Dict, List[float]]]:
+        t0 = time.monotonic()
+        embedded = []
+        for start in range(0, len(fetched), self.embed_batch_size):
+            batch = fetched[start:start + self.embed_batch_size]
+            try:
+                vectors = ai_engine.create_embeddings([image for _, image in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    self._record_error(batch[0][0], e)
+                    continue
+                # 1 ảnh hỏng / quá lớn không được làm dừng cả lần ingest ở checkpoint này:
+                # embed lại từng ảnh, ảnh lỗi ghi vào file lỗi rồi bỏ qua
+                for record, image in batch:
+                    try:
+                        embedded.append((record, ai_engine.create_embeddings([image])[0]))
+                    except Exception as e:
+                        self._record_error(record, e)
+                continue
+            embedded.extend((record, vector) for (record, _), vector in zip(batch, vectors))
+        self.stats.add("embed", len(embedded), time.monotonic() - t0)
+        return embedded
+
+    def _store(self, embedded: List[Tuple[Dict, List[float]]]):
+        if not embedded:
+            return
+
+        # 1 SKU xuất hiện nhiều lần trong chunk -> giữ dòng cuối (Postgres ON CONFLICT và upsert
+        # của Chroma đều lỗi khi 1 id lặp lại trong cùng lệnh -> chunk hỏng, resume crash mãi 1 chỗ)
+        by_id = {}
+        for record, vector in embedded:
+            product_id = product_id_for(record)
+            price = float(record["price"]) if record.get("price") not in (None, "") else None
+            currency = record.get("currency") or "VND"
+            category = record.get("category") or None
+
+            meta_info = record.get("meta_info") or {}
+            if isinstance(meta_info, str):  # Cột JSON trong file CSV
+                meta_info = json.loads(meta_info)
+            meta_info["sku"] = str(record.get("sku") or record.get("id"))
+
+            row = {
+                "id": product_id,
+                "name": record["name"],
+                "description": record.get("description") or record.get("desc"),
+                "price": price,
+                "currency": currency,
+                "image_url": record.get("image_url") or record.get("image"),
+                "category": category,
+                "meta_info": meta_info,
+            }
+            # Chroma không nhận giá trị None trong metadata
+            metadata = {"category": category, "price": price, "currency": currency}
+            by_id.pop(str(product_id), None)
+            by_id[str(product_id)] = (row, vector, {k: v for k, v in metadata.items() if v is not None})
+
+        ids = list(by_id)
+        rows = [row for row, _, _ in by_id.values()]
+        vectors = [vector for _, vector, _ in by_id.values()]
+        metadatas = [metadata for _, _, metadata in by_id.values()]
+
+        # 1. Bulk upsert Postgres: chạy lại chunk vẫn an toàn, import lại catalog thì cập nhật
+        # giá / tên / ảnh... cho khớp với vector + metadata được upsert ở bước 2
+        t0 = time.monotonic()
+        db = SessionLocal()
+        try:
+            # Sản phẩm đã có mà đổi tên / mô tả / danh mục -> lời khuyên Stylist cũ không còn đúng
+            previous = db.execute(
+                select(Product.id, *[getattr(Product, field) for field in PROMPT_FIELDS])
+                .where(Product.id.in_([row["id"] for row in rows]))
+            ).all()
+            prompt_changed = [
+                str(product_id) for product_id, *old in previous
+                if tuple(old) != tuple(by_id[str(product_id)][0][field] for field in PROMPT_FIELDS)
+            ]
+            stmt = insert(Product).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["id"],
+                set_={column: stmt.excluded[column] for column in MUTABLE_COLUMNS},
+            )
+            db.execute(stmt)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        # Core insert không đi qua hook ORM của product_cache / stylist_cache -> tự xoá bản cũ
+        product_cache.invalidate(*ids)
+        for product_id in prompt_changed:
+            stylist_cache.invalidate_product(product_id)
+        self.stats.add("db", len(rows), time.monotonic() - t0)
+
+        # 2. Batch upsert vào Vector DB
+        t0 = time.monotonic()
+        vector_store.add_products(ids, vectors, metadatas)
+        self.stats.add("vector", len(ids), time.monotonic() - t0)
+
+    def run(self) -> StageStats:
+        if self.checkpoint.processed:
+            print(f"⏩ Resume từ record #{self.checkpoint.processed}", flush=True)
+
+        processed = self.checkpoint.processed
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as executor:
+            chunks = self._iter_chunks()
+            chunk = next(chunks, None)
+            pending = self._fetch_chunk(executor, chunk) if chunk else None
+            chunk_no = 0
+
+            while chunk:
+                # Prefetch ảnh của chunk tiếp theo trong lúc chunk hiện tại embed + ghi DB
+                next_chunk = next(chunks, None)
+                next_pending = self._fetch_chunk(executor, next_chunk) if next_chunk else None
+
+                fetched = self._collect_fetched(chunk, pending)
+                self._store(self._embed(fetched))
+
+                processed += len(chunk)
+                self.checkpoint.save(processed, self.stats)
+
+                chunk_no += 1
+                if chunk_no % self.report_every == 0:
+                    print(f"📦 {self.stats.report()}", flush=True)
+
+                chunk, pending = next_chunk, next_pending
+
+        print(f"🎉 Ingest xong: {self.stats.report()}", flush=True)
+        return self.stats
@@ -0,0 +1,101 @@
+import asyncio
+import time
+from typing import List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.embedding_batcher import embedding_batcher
+from app.db.session import SessionLocal
+from app.db.vector_store import vector_store
+from app.schemas.search import SearchFilters
+from app.services.search_cache import search_cache
+
+
+class InlineSearch:
+    """
+    Fast path: tìm kiếm ngay trong request API bằng bytes ảnh đang có sẵn,
+    bỏ qua S3 upload + Celery + worker tải lại ảnh.
+
+    Chỉ chạy khi còn "slot" (tối đa INLINE_SEARCH_MAX_CONCURRENCY request cùng lúc
+    và hàng đợi của batcher chưa đầy). Trả None khi bận hoặc hết budget thời gian,
+    caller quay về luồng task bất đồng bộ như cũ.
+    Hết budget thì request thôi chờ nhưng thread vẫn chạy nốt: slot chỉ được trả khi
+    việc đó xong thật, để lúc quá tải API không nhận thêm inference ngoài hàng đợi.
+    """
+
+    def __init__(self, budget_ms: float, max_concurrency: int):
+        self.budget = max(0.0, budget_ms) / 1000.0
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    def saturated(self) -> bool:
+        return (
+            self._semaphore.locked()
+            or embedding_batcher.pending() >= embedding_batcher.max_batch_size
+        )
+
+    async def try_search(
+        self,
+        image_bytes: bytes,
+        image_hash: str,
+        filters: Optional[SearchFilters] = None,
+        k: int = 5,
+    ) -> Optional[List[dict]]:
+        """Trả danh sách sản phẩm nếu xong trong budget, ngược lại None."""
+        if not self.enabled or self.saturated():
+            return None
+
+        deadline = time.monotonic() + self.budget
+        await self._semaphore.acquire()
+        # Việc đang chạy trong thread (CLIP / vector query) mà request có thể bỏ chờ khi hết budget
+        running = None
+        try:
+            query_vector = await run_in_threadpool(search_cache.get_embedding, image_hash)
+            if query_vector is None:
+                future = embedding_batcher.submit(image_bytes)
+                # Dù inline có kịp hay không, vector vẫn được cache lại
+                # -> worker ở luồng fallback sẽ không phải chạy CLIP lần nữa.
+                future.add_done_callback(
+                    lambda f: f.exception() is None and search_cache.set_embedding(image_hash, f.result())
+                )
+                running = asyncio.wrap_future(future)
+                query_vector = await asyncio.wait_for(asyncio.shield(running), timeout=deadline - time.monotonic())
+
+            running = asyncio.ensure_future(run_in_threadpool(self._search_products, query_vector, k, filters))
+            return await asyncio.wait_for(asyncio.shield(running), timeout=deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            print(f"⏱️ Inline search quá {self.budget * 1000:.0f}ms -> chuyển sang task", flush=True)
+            return None
+        except Exception as e:
+            print(f"⚠️ Inline search lỗi ({e}) -> chuyển sang task", flush=True)
+            return None
+        finally:
+            if running is not None and not running.done():
+                running.add_done_callback(self._release_after)
+            else:
+                self._semaphore.release()
+
+    def _release_after(self, running: asyncio.Future):
+        # Đọc exception để asyncio không log "exception was never retrieved"
+        if not running.cancelled():
+            running.exception()
+        self._semaphore.release()
+
+    @staticmethod
+    def _search_products(query_vector, k: int, filters: Optional[SearchFilters]) -> List[dict]:
+        db = SessionLocal()
+        try:
+            return vector_store.search_products(db, query_vector, k=k, filters=filters)
+        finally:
+            db.close()
+
+
+inline_search = InlineSearch(
+    budget_ms=settings.INLINE_SEARCH_BUDGET_MS,
+    max_concurrency=settings.INLINE_SEARCH_MAX_CONCURRENCY,
+)
@@ -0,0 +1,78 @@
+from typing import Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from app.core.config import settings
+from app.core.lru import LocalLRU
+from app.db.models.user import User
+
+# Cột được cache (không có hashed_password: get_current_user không cần tới)
+PRINCIPAL_FIELDS = ("id", "email", "full_name", "is_active", "created_at")
+
+
+class PrincipalCache:
+    """
+    Cache user đã xác thực theo user id, trong process, TTL ngắn:
+    mọi request có token (kể cả poll trạng thái task) không phải SELECT users nữa.
+    Giữ bản chụp các cột (không phải object ORM gắn với session cũ), mỗi lần get tạo User transient mới.
+    Sửa/xoá/khoá user qua ORM -> xoá khỏi cache của process hiện tại ngay (hook ở cuối file);
+    process khác (worker uvicorn khác) thấy thay đổi chậm nhất sau AUTH_PRINCIPAL_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.enabled = ttl > 0
+        self.local = LocalLRU(max_entries, ttl)
+
+    def get(self, user_id) -> Optional[User]:
+        if not self.enabled:
+            return None
+        fields = self.local.get(str(user_id))
+        return User(**fields) if fields is not None else None
+
+    def set(self, user: User):
+        if self.enabled:
+            self.local.set(str(user.id), {field: getattr(user, field) for field in PRINCIPAL_FIELDS})
+
+    def invalidate(self, *user_ids):
+        for user_id in user_ids:
+            self.local.discard(str(user_id))
+
+
+principal_cache = PrincipalCache(settings.AUTH_PRINCIPAL_CACHE_MAX_ENTRIES, settings.AUTH_PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+# --- Hook ORM: user bị khoá / sửa / xoá -> bỏ khỏi cache ---
+# Như product_cache: xoá lúc flush và xoá lại sau commit (request xen giữa có thể nạp lại bản cũ).
+_DIRTY_KEY = "principal_cache_dirty"
+
+
+def _mark_dirty(target):
+    principal_cache.invalidate(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_DIRTY_KEY, set()).add(target.id)
+
+
+@event.listens_for(User, "after_update")
+def _invalidate_updated_user(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in PRINCIPAL_FIELDS):
+        _mark_dirty(target)
+
+
+@event.listens_for(User, "after_delete")
+def _invalidate_deleted_user(mapper, connection, target):
+    _mark_dirty(target)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_users(session):
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if dirty:
+        principal_cache.invalidate(*dirty)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_users(session):
+    session.info.pop(_DIRTY_KEY, None)
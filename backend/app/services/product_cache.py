@@ -0,0 +1,185 @@
+import json
+import threading
+import uuid
+from typing import Dict, Iterable, Optional
+
+import redis
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.core.config import settings
+from app.core.lru import LocalLRU
+from app.core.redis_client import redis_client
+from app.db.models.product import Product
+from app.db.session import SessionLocal
+
+
+class ProductCache:
+    """
+    Cache read-through chi tiết sản phẩm (Product.to_dict()) theo product id, dùng khi hydrate top-k:
+    - Tầng 1: LRU trong process (giới hạn số entry, TTL ngắn)
+    - Tầng 2: Redis với TTL, dùng chung mọi process/worker; miss cả top-k chỉ tốn 1 MGET
+    - Còn thiếu: 1 câu SELECT ... WHERE id IN (...) rồi ghi ngược lên 2 tầng
+    Sản phẩm bán chạy chiếm phần lớn kết quả top-k nên phần lớn lượt tìm kiếm không chạm Postgres.
+    Sửa/xoá sản phẩm qua ORM -> invalidate (hook ở cuối file).
+    Lỗi Redis không làm hỏng luồng chính: coi như cache miss.
+    """
+
+    PREFIX = "product_cache"
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self.local = LocalLRU(settings.PRODUCT_CACHE_LOCAL_MAX_ENTRIES, settings.PRODUCT_CACHE_LOCAL_TTL_SECONDS)
+        self._lock = threading.Lock()
+        self._counts = {"local_hit": 0, "redis_hit": 0, "db_hit": 0, "missing": 0}
+
+    def _key(self, product_id: str) -> str:
+        return f"{self.PREFIX}:{product_id}"
+
+    def _count(self, field: str, n: int):
+        if n:
+            with self._lock:
+                self._counts[field] += n
+
+    # --- Đọc ---
+    def get_many(self, product_ids: Iterable[str], db=None) -> Dict[str, dict]:
+        """
+        id -> dict sản phẩm cho các id còn tồn tại (id không có trong Postgres bị bỏ qua).
+        Kết quả là dict, người gọi tự giữ thứ tự theo danh sách id của mình.
+        Dict trả về có thể dùng chung với cache: không sửa trực tiếp.
+        `db`: session sync đang mở (nếu có), không thì tự mở SessionLocal khi cần vào Postgres.
+        """
+        ids = list(dict.fromkeys(str(pid) for pid in product_ids))
+        found: Dict[str, dict] = {}
+        missing = []
+        for pid in ids:
+            product = self.local.get(self._key(pid))
+            if product is not None:
+                found[pid] = product
+            else:
+                missing.append(pid)
+        self._count("local_hit", len(found))
+        if not missing:
+            return found
+
+        from_redis = self._redis_get_many(missing)
+        for pid, product in from_redis.items():
+            self.local.set(self._key(pid), product)
+        found.update(from_redis)
+        self._count("redis_hit", len(from_redis))
+        missing = [pid for pid in missing if pid not in from_redis]
+        if not missing:
+            return found
+
+        from_db = self._load(missing, db)
+        self._count("db_hit", len(from_db))
+        self._count("missing", len(missing) - len(from_db))
+        self.set_many(from_db)
+        found.update(from_db)
+        return found
+
+    def get(self, product_id: str, db=None) -> Optional[dict]:
+        return self.get_many([product_id], db).get(str(product_id))
+
+    def _redis_get_many(self, product_ids: list) -> Dict[str, dict]:
+        try:
+            raws = self.client.mget([self._key(pid) for pid in product_ids])
+        except redis.RedisError as e:
+            print(f"⚠️ Redis product cache lỗi (get): {e}", flush=True)
+            return {}
+        return {pid: json.loads(raw) for pid, raw in zip(product_ids, raws) if raw is not None}
+
+    def _load(self, product_ids: list, db=None) -> Dict[str, dict]:
+        ids = []
+        for pid in product_ids:
+            try:
+                ids.append(uuid.UUID(pid))
+            except ValueError:
+                continue  # id không hợp lệ -> coi như không tồn tại
+        if not ids:
+            return {}
+        if db is None:
+            with SessionLocal() as session:
+                products = session.query(Product).filter(Product.id.in_(ids)).all()
+        else:
+            products = db.query(Product).filter(Product.id.in_(ids)).all()
+        return {str(p.id): p.to_dict() for p in products}
+
+    # --- Ghi ---
+    def set_many(self, products: Dict[str, dict]):
+        if not products:
+            return
+        for pid, product in products.items():
+            self.local.set(self._key(pid), product)
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for pid, product in products.items():
+                pipe.set(
+                    self._key(pid),
+                    json.dumps(product, ensure_ascii=False).encode("utf-8"),
+                    ex=settings.PRODUCT_CACHE_TTL_SECONDS,
+                )
+            pipe.execute()
+        except redis.RedisError as e:
+            print(f"⚠️ Redis product cache lỗi (set): {e}", flush=True)
+
+    # --- Invalidation ---
+    def invalidate(self, *product_ids):
+        """
+        Xoá sản phẩm khỏi cache (Redis + LRU của process hiện tại).
+        Process khác có thể giữ bản cũ trong LRU của nó tối đa PRODUCT_CACHE_LOCAL_TTL_SECONDS.
+        """
+        keys = [self._key(str(pid)) for pid in product_ids]
+        if not keys:
+            return
+        for key in keys:
+            self.local.discard(key)
+        try:
+            self.client.delete(*keys)
+        except redis.RedisError as e:
+            print(f"⚠️ Redis product cache lỗi (invalidate): {e}", flush=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        counts["cache_hit_rate"] = round((counts["local_hit"] + counts["redis_hit"]) / total, 4) if total else 0.0
+        return counts
+
+
+product_cache = ProductCache(redis_client)
+
+
+# --- Hook ORM: sản phẩm sửa/xoá -> bỏ khỏi cache ---
+# Xoá ngay lúc flush, và xoá lại sau commit: request đọc Postgres xen giữa flush và commit
+# (vẫn thấy bản cũ) có thể đã ghi bản cũ lên cache.
+_DIRTY_KEY = "product_cache_dirty"
+
+
+def _mark_dirty(target):
+    product_cache.invalidate(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_DIRTY_KEY, set()).add(target.id)
+
+
+@event.listens_for(Product, "after_update")
+def _invalidate_updated_product(mapper, connection, target):
+    _mark_dirty(target)
+
+
+@event.listens_for(Product, "after_delete")
+def _invalidate_deleted_product(mapper, connection, target):
+    _mark_dirty(target)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_products(session):
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if dirty:
+        product_cache.invalidate(*dirty)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_products(session):
+    session.info.pop(_DIRTY_KEY, None)
@@ -0,0 +1,86 @@
+import math
+from typing import NamedTuple
+
+import redis
+
+from app.core.config import settings
+from app.core.redis_client import async_redis_client
+
+# Token bucket trong 1 lệnh Lua (atomic giữa mọi process API). Đồng hồ lấy từ Redis (TIME)
+# để các instance API lệch giờ nhau vẫn tính đúng. Trả {được phép (0/1), số giây phải chờ}.
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+-- Hết TTL = bucket đã đầy lại -> xoá key cũng không đổi kết quả
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(wait)}
+"""
+
+
+class RateLimitDecision(NamedTuple):
+    allowed: bool
+    retry_after: int = 0
+
+
+class TokenBucketLimiter:
+    """
+    Rate limit theo user: mỗi user 1 bucket `rate_limit:{scope}:{user_id}` trên Redis,
+    tối đa `burst` token, nạp lại `per_minute` token / phút, mỗi request tốn `cost` token.
+    Redis lỗi -> cho qua (fail open): rate limit không được làm sập tìm kiếm.
+    """
+
+    PREFIX = "rate_limit"
+
+    def __init__(self, client, scope: str, per_minute: float, burst: int):
+        self.client = client
+        self.scope = scope
+        self.rate = per_minute / 60.0
+        self.burst = max(1, burst)
+        self._script = client.register_script(TOKEN_BUCKET_LUA)
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def key(self, identity) -> str:
+        return f"{self.PREFIX}:{self.scope}:{identity}"
+
+    async def acquire(self, identity, cost: int = 1) -> RateLimitDecision:
+        if not self.enabled:
+            return RateLimitDecision(allowed=True)
+        # Request tốn nhiều hơn cả bucket (batch lớn) vẫn phải qua được khi bucket đầy
+        cost = min(max(1, cost), self.burst)
+        try:
+            allowed, wait = await self._script(keys=[self.key(identity)], args=[self.rate, self.burst, cost])
+        except redis.RedisError as e:
+            print(f"⚠️ Rate limit lỗi Redis ({e}) -> cho qua", flush=True)
+            return RateLimitDecision(allowed=True)
+        if allowed:
+            return RateLimitDecision(allowed=True)
+        return RateLimitDecision(allowed=False, retry_after=max(1, math.ceil(float(wait))))
+
+
+search_rate_limiter = TokenBucketLimiter(
+    async_redis_client,
+    scope="search",
+    per_minute=settings.RATE_LIMIT_SEARCH_PER_MINUTE,
+    burst=settings.RATE_LIMIT_SEARCH_BURST,
+)
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import time
+from typing import Any, List, Optional
+
+import numpy as np
+import redis
+
+from app.core.config import settings
+from app.core.redis_client import redis_client
+from app.schemas.search import SearchFilters
+from app.services.task_results import hydrate_result, strip_products
+
+
+def hash_image(image_bytes: bytes) -> str:
+    """Hash nội dung ảnh (SHA-256) -> dùng làm key cache và tên file S3."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+class SearchCache:
+    """
+    Cache theo nội dung ảnh (content-addressed) trên Redis:
+    - embedding: hash ảnh -> vector CLIP (float32 bytes), TTL dài
+    - results:   hash ảnh + k + filter -> kết quả top-k (JSON), TTL ngắn.
+                 Chỉ lưu id + score: chi tiết sản phẩm ghép lại qua product_cache lúc đọc,
+                 nên sản phẩm sửa giá / bị xoá (hook invalidate của product_cache) có hiệu lực ngay
+
+    Mỗi namespace có 1 sorted set làm index (score = lần truy cập cuối).
+    Khi số entry vượt giới hạn thì xoá các entry ít được dùng nhất (LRU),
+    còn TTL của từng key lo phần hết hạn theo thời gian.
+    Lỗi Redis không bao giờ làm hỏng luồng tìm kiếm: coi như cache miss.
+    """
+
+    PREFIX = "search_cache"
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self.stats_key = f"{self.PREFIX}:stats"
+
+    # --- Helpers ---
+    def _key(self, namespace: str, suffix: str) -> str:
+        return f"{self.PREFIX}:{namespace}:{suffix}"
+
+    def _index_key(self, namespace: str) -> str:
+        return f"{self.PREFIX}:{namespace}:index"
+
+    def _count(self, namespace: str, hit: bool):
+        field = f"{namespace}_{'hit' if hit else 'miss'}"
+        try:
+            self.client.hincrby(self.stats_key, field, 1)
+        except redis.RedisError:
+            pass
+
+    def _get(self, namespace: str, suffix: str) -> Optional[bytes]:
+        key = self._key(namespace, suffix)
+        try:
+            value = self.client.get(key)
+            if value is not None:
+                # Cập nhật thời điểm truy cập để LRU giữ lại key "nóng"
+                self.client.zadd(self._index_key(namespace), {key: time.time()})
+        except redis.RedisError as e:
+            print(f"⚠️ Redis cache lỗi (get): {e}", flush=True)
+            value = None
+        self._count(namespace, value is not None)
+        return value
+
+    def _set(self, namespace: str, suffix: str, value: bytes, ttl: int, max_entries: int):
+        key = self._key(namespace, suffix)
+        index_key = self._index_key(namespace)
+        now = time.time()
+        try:
+            pipe = self.client.pipeline()
+            pipe.set(key, value, ex=ttl)
+            pipe.zadd(index_key, {key: now})
+            # Dọn index của các key đã hết TTL
+            pipe.zremrangebyscore(index_key, "-inf", now - ttl)
+            pipe.zcard(index_key)
+            size = pipe.execute()[-1]
+
+            excess = size - max_entries
+            if excess > 0:
+                evicted = [k for k, _ in self.client.zpopmin(index_key, excess)]
+                if evicted:
+                    self.client.delete(*evicted)
+                    self.client.hincrby(self.stats_key, f"{namespace}_evicted", len(evicted))
+        except redis.RedisError as e:
+            print(f"⚠️ Redis cache lỗi (set): {e}", flush=True)
+
+    # --- Embedding cache ---
+    def get_embedding(self, image_hash: str) -> Optional[List[float]]:
+        raw = self._get("emb", image_hash)
+        if raw is None:
+            return None
+        return np.frombuffer(raw, dtype=np.float32).tolist()
+
+    def set_embedding(self, image_hash: str, vector: List[float]):
+        self._set(
+            "emb", image_hash,
+            np.asarray(vector, dtype=np.float32).tobytes(),
+            ttl=settings.EMBEDDING_CACHE_TTL_SECONDS,
+            max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+        )
+
+    def has_embedding(self, image_hash: str) -> bool:
+        try:
+            return bool(self.client.exists(self._key("emb", image_hash)))
+        except redis.RedisError:
+            return False
+
+    # --- Result cache ---
+    @staticmethod
+    def result_key(image_hash: str, k: int, filters: Optional[SearchFilters] = None) -> str:
+        filters_key = filters.cache_key() if filters is not None else "-"
+        return f"{image_hash}:{k}:{filters_key}"
+
+    def get_results(self, image_hash: str, k: int = 5, filters: Optional[SearchFilters] = None) -> Optional[Any]:
+        raw = self._get("res", self.result_key(image_hash, k, filters))
+        if raw is None:
+            return None
+        return hydrate_result(json.loads(raw))
+
+    def set_results(self, image_hash: str, results: Any, k: int = 5, filters: Optional[SearchFilters] = None):
+        self._set(
+            "res", self.result_key(image_hash, k, filters),
+            json.dumps(strip_products(results), ensure_ascii=False).encode("utf-8"),
+            ttl=settings.RESULT_CACHE_TTL_SECONDS,
+            max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+        )
+
+    # --- Thống kê ---
+    def stats(self) -> dict:
+        try:
+            raw = self.client.hgetall(self.stats_key)
+            sizes = {
+                "emb_entries": self.client.zcard(self._index_key("emb")),
+                "res_entries": self.client.zcard(self._index_key("res")),
+            }
+        except redis.RedisError:
+            return {}
+        counters = {k.decode(): int(v) for k, v in raw.items()}
+        for namespace in ("emb", "res"):
+            hits = counters.get(f"{namespace}_hit", 0)
+            total = hits + counters.get(f"{namespace}_miss", 0)
+            counters[f"{namespace}_hit_rate"] = round(hits / total, 4) if total else 0.0
+        counters.update(sizes)
+        return counters
+
+
+search_cache = SearchCache(redis_client)
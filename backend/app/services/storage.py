@@ -1,60 +1,220 @@
+import base64
+import hashlib
+import os
+import threading
+import uuid
+from typing import NamedTuple, Optional
+
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from fastapi import UploadFile, HTTPException
-import uuid
-import io
+from fastapi.concurrency import run_in_threadpool
+
 from app.core.config import settings
 
-class S3Client:
-    def __init__(self):
-        self.s3_client = boto3.client(
-            's3',
-            endpoint_url=settings.S3_ENDPOINT,
-            aws_access_key_id=settings.S3_ACCESS_KEY,
-            aws_secret_access_key=settings.S3_SECRET_KEY,
-            region_name=settings.S3_REGION
-        )
-        self.bucket_name = settings.S3_BUCKET_NAME
-        self._ensure_bucket_exists()
-
-    def _ensure_bucket_exists(self):
-        """Tạo bucket nếu chưa tồn tại (Dành cho môi trường Dev/MinIO)"""
-        try:
-            self.s3_client.head_bucket(Bucket=self.bucket_name)
-        except ClientError:
+# Đọc UploadFile / body S3 theo từng khối
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+
+class StoredObject(NamedTuple):
+    key: str
+    size: int
+    sha256: str  # hex
+
+
+class StorageService:
+    """
+    Lớp lưu trữ object (S3/MinIO) dùng chung cho cả process:
+    - 1 boto3 client (thread-safe, connection pool `max_pool_connections`),
+      tạo lazily và tạo lại sau fork (Celery prefork) để không dùng chung socket.
+    - Kiểm tra/tạo bucket 1 lần duy nhất (lúc startup), không phải mỗi request.
+    - Các hàm async chạy boto3 trong threadpool -> không chặn event loop của API.
+    - Upload 1 lần PUT với size + SHA-256 tính ngay khi đọc dữ liệu (S3 tự verify checksum).
+    - Download đọc thẳng vào buffer tái sử dụng theo từng thread.
+
+    Mọi tham số kết nối có thể truyền vào (mặc định lấy từ settings) để
+    trỏ sang MinIO local hoặc moto khi test.
+    """
+
+    def __init__(
+        self,
+        endpoint_url: Optional[str] = None,
+        access_key: Optional[str] = None,
+        secret_key: Optional[str] = None,
+        bucket_name: Optional[str] = None,
+        region_name: Optional[str] = None,
+        max_pool_connections: Optional[int] = None,
+    ):
+        self.endpoint_url = endpoint_url or settings.S3_ENDPOINT
+        self.access_key = access_key or settings.S3_ACCESS_KEY
+        self.secret_key = secret_key or settings.S3_SECRET_KEY
+        self.bucket_name = bucket_name or settings.S3_BUCKET_NAME
+        self.region_name = region_name or settings.S3_REGION
+        self.max_pool_connections = max_pool_connections or settings.S3_MAX_POOL_CONNECTIONS
+
+        self._lock = threading.Lock()
+        self._bucket_lock = threading.Lock()
+        self._client = None
+        self._pid: Optional[int] = None
+        self._bucket_ready = False
+        self._local = threading.local()
+
+    # --- Client & bucket ---
+    @property
+    def client(self):
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    self._client = boto3.client(
+                        's3',
+                        endpoint_url=self.endpoint_url,
+                        aws_access_key_id=self.access_key,
+                        aws_secret_access_key=self.secret_key,
+                        region_name=self.region_name,
+                        config=Config(max_pool_connections=self.max_pool_connections),
+                    )
+                    self._pid = os.getpid()
+        return self._client
+
+    def ensure_bucket(self):
+        """Tạo bucket nếu chưa tồn tại (Dành cho môi trường Dev/MinIO). Chỉ chạy 1 lần mỗi process."""
+        if self._bucket_ready:
+            return
+        with self._bucket_lock:
+            if self._bucket_ready:
+                return
             try:
-                self.s3_client.create_bucket(Bucket=self.bucket_name)
-            except ClientError as e:
-                print(f"Could not create bucket: {e}")
+                self.client.head_bucket(Bucket=self.bucket_name)
+            except ClientError:
+                try:
+                    self.client.create_bucket(Bucket=self.bucket_name)
+                except ClientError as e:
+                    print(f"Could not create bucket: {e}")
+                    return
+            self._bucket_ready = True
+
+    # --- Upload ---
+    def put_bytes(
+        self,
+        data: bytes,
+        file_key: str,
+        content_type: Optional[str] = None,
+        sha256_hex: Optional[str] = None,
+    ) -> StoredObject:
+        """
+        Upload nội dung đã có trong RAM bằng 1 lệnh PUT (không qua multipart của upload_fileobj).
+        Nếu caller đã có SHA-256 (vd: hash ảnh dùng làm key) thì không cần hash lại.
+        """
+        self.ensure_bucket()
+        digest = bytes.fromhex(sha256_hex) if sha256_hex else hashlib.sha256(data).digest()
+        extra_args = {"ContentType": content_type} if content_type else {}
+        try:
+            self.client.put_object(
+                Bucket=self.bucket_name,
+                Key=file_key,
+                Body=data,
+                ContentLength=len(data),
+                ChecksumSHA256=base64.b64encode(digest).decode(),
+                **extra_args
+            )
+        except ClientError as e:
+            raise HTTPException(status_code=500, detail=f"S3 Upload Failed: {str(e)}")
+        return StoredObject(file_key, len(data), digest.hex())
+
+    async def upload_bytes(
+        self,
+        data: bytes,
+        file_key: str,
+        content_type: Optional[str] = None,
+        sha256_hex: Optional[str] = None,
+    ) -> str:
+        """
+        Upload nội dung đã đọc sẵn vào RAM với key do caller quyết định
+        (vd: key theo hash nội dung ảnh).
+        """
+        stored = await run_in_threadpool(self.put_bytes, data, file_key, content_type, sha256_hex)
+        return stored.key
 
     async def upload_file(self, file: UploadFile) -> str:
         """
         Upload file lên S3 và trả về File Key (Path).
+        Đọc stream đúng 1 lần, vừa đọc vừa tính size + SHA-256.
         """
         # 1. Tạo tên file unique để tránh trùng lặp
         file_extension = file.filename.split(".")[-1]
         file_key = f"{uuid.uuid4()}.{file_extension}"
-        
+
+        # 2. Đọc 1 lượt: gom body + hash
+        hasher = hashlib.sha256()
+        body = bytearray()
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            hasher.update(chunk)
+            body += chunk
+
+        # 3. Upload (boto3 chạy trong threadpool)
+        await run_in_threadpool(self.put_bytes, bytes(body), file_key, file.content_type, hasher.hexdigest())
+        return file_key
+
+    # --- Download ---
+    def download_into(self, file_key: str, buffer: bytearray) -> memoryview:
+        """
+        Tải object vào `buffer` (tự nới rộng khi cần) và trả memoryview đúng độ dài object.
+        Không cấp phát bytes mới cho mỗi lần tải.
+        """
+        self.ensure_bucket()
         try:
-            # 2. Upload
-            # Lưu ý: upload_fileobj là hàm sync, nhưng boto3 xử lý I/O khá tốt.
-            # Trong production scale lớn, có thể dùng aioboto3, nhưng boto3 là đủ cho giai đoạn này.
-            self.s3_client.upload_fileobj(
-                file.file,
-                self.bucket_name,
-                file_key,
-                ExtraArgs={"ContentType": file.content_type}
-            )
-            return file_key
+            response = self.client.get_object(Bucket=self.bucket_name, Key=file_key)
         except ClientError as e:
-            raise HTTPException(status_code=500, detail=f"S3 Upload Failed: {str(e)}")
+            print(f"Error downloading from S3: {e}")
+            raise e
+
+        size = response['ContentLength']
+        if len(buffer) < size:
+            buffer.extend(bytes(size - len(buffer)))
+        view = memoryview(buffer)[:size]
+
+        offset = 0
+        body = response['Body']
+        try:
+            for chunk in body.iter_chunks(DOWNLOAD_CHUNK_SIZE):
+                view[offset:offset + len(chunk)] = chunk
+                offset += len(chunk)
+        finally:
+            body.close()
+        if offset != size:
+            raise IOError(f"S3 object {file_key} bị cắt ngang ({offset}/{size} bytes)")
+        return view
+
+    def download_to_buffer(self, file_key: str) -> memoryview:
+        """
+        Tải vào buffer riêng của thread hiện tại (tái sử dụng giữa các task).
+        memoryview chỉ hợp lệ tới lần tải kế tiếp trên cùng thread.
+        """
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = self._local.buffer = bytearray()
+        previous = getattr(self._local, "view", None)
+        if previous is not None:
+            # Trả lại export cũ để bytearray nới rộng được; ai còn giữ view cũ sẽ lỗi rõ ràng
+            # thay vì âm thầm đọc phải dữ liệu của lần tải mới.
+            previous.release()
+        self._local.view = self.download_into(file_key, buffer)
+        return self._local.view
+
+    def download_file_as_bytes(self, file_key: str) -> bytes:
+        """
+        Tải file từ S3 và trả về dạng bytes (để nạp vào AI Model)
+        """
+        return bytes(self.download_to_buffer(file_key))
 
     def get_presigned_url(self, file_key: str, expiration=3600) -> str:
         """
         Tạo URL tạm thời để xem ảnh (Bảo mật: URL này chỉ sống 1 tiếng)
         """
         try:
-            response = self.s3_client.generate_presigned_url(
+            response = self.client.generate_presigned_url(
                 'get_object',
                 Params={'Bucket': self.bucket_name, 'Key': file_key},
                 ExpiresIn=expiration
@@ -62,13 +222,7 @@ class S3Client:
             return response
         except ClientError:
             return ""
-    def download_file_as_bytes(self, file_key: str) -> bytes:
-        """
-        Tải file từ S3 và trả về dạng bytes (để nạp vào AI Model)
-        """
-        try:
-            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=file_key)
-            return response['Body'].read()
-        except ClientError as e:
-            print(f"Error downloading from S3: {e}")
-            raise e
\ No newline at end of file
+
+
+# Singleton instance
+storage = StorageService()
@@ -0,0 +1,101 @@
+import json
+import time
+from typing import Any, AsyncIterator, Optional
+
+import redis
+
+from app.core.config import settings
+from app.core.redis_client import async_redis_client, redis_client
+
+
+def is_final(event: dict) -> bool:
+    """
+    Stream kết thúc khi task FAILED, hoặc COMPLETED và không còn chờ lời khuyên Stylist
+    (advice_status PENDING -> stream tiếp tới khi advice về).
+    """
+    if event["status"] == "FAILED":
+        return True
+    if event["status"] != "COMPLETED":
+        return False
+    result = event.get("result")
+    return not (isinstance(result, dict) and result.get("advice_status") == "PENDING")
+
+
+def task_channel(task_id: str) -> str:
+    return f"task_events:{task_id}"
+
+
+def build_event(task_id: str, status: str, result: Any = None, error: Optional[str] = None) -> dict:
+    return {"task_id": str(task_id), "status": status, "result": result, "error": error}
+
+
+def publish_task_event(task_id: str, status: str, result: Any = None, error: Optional[str] = None):
+    """
+    Worker (sync) gọi mỗi khi task đổi trạng thái.
+    Postgres vẫn là nguồn sự thật: lỗi Redis chỉ làm client stream phải chờ/poll lại,
+    không bao giờ làm fail task.
+    """
+    payload = json.dumps(build_event(task_id, status, result, error), ensure_ascii=False, default=str)
+    try:
+        redis_client.publish(task_channel(task_id), payload)
+    except redis.RedisError as e:
+        print(f"⚠️ Không publish được trạng thái task {task_id}: {e}", flush=True)
+
+
+def format_sse(event: dict) -> str:
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    return f"event: status\ndata: {data}\n\n"
+
+
+class TaskEventSubscription:
+    """
+    Subscribe kênh của 1 task trên Redis pub/sub (async).
+    Phải subscribe TRƯỚC khi đọc trạng thái hiện tại trong DB, nếu không
+    worker có thể publish COMPLETED đúng vào khoảng giữa và client bị treo.
+    """
+
+    def __init__(self, task_id: str):
+        self.channel = task_channel(task_id)
+        self.pubsub = async_redis_client.pubsub()
+
+    async def subscribe(self):
+        await self.pubsub.subscribe(self.channel)
+
+    async def close(self):
+        try:
+            await self.pubsub.unsubscribe(self.channel)
+        finally:
+            await self.pubsub.aclose()
+
+    async def stream(self, initial: dict) -> AsyncIterator[str]:
+        """
+        Phát trạng thái hiện tại, sau đó mỗi lần worker publish là 1 event SSE.
+        Gửi comment keepalive khi im lặng lâu (để proxy không cắt kết nối)
+        và kết thúc khi task xong (xem is_final) hoặc quá thời gian tối đa.
+        """
+        try:
+            yield format_sse(initial)
+            if is_final(initial):
+                return
+
+            deadline = time.monotonic() + settings.TASK_EVENTS_MAX_STREAM_SECONDS
+            last_sent = time.monotonic()
+            while time.monotonic() < deadline:
+                message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    if time.monotonic() - last_sent >= settings.TASK_EVENTS_KEEPALIVE_SECONDS:
+                        yield ": keepalive\n\n"
+                        last_sent = time.monotonic()
+                    continue
+
+                event = json.loads(message["data"])
+                yield format_sse(event)
+                last_sent = time.monotonic()
+                if is_final(event):
+                    return
+
+            # Hết thời gian: client tự mở lại stream hoặc quay về polling
+            yield "event: timeout\ndata: {}\n\n"
+        finally:
+            # Chạy cả khi client ngắt kết nối giữa chừng (generator bị huỷ)
+            await self.close()
@@ -0,0 +1,51 @@
+from typing import Any
+
+from app.core.config import settings
+from app.services.product_cache import product_cache
+
+
+def compact_result(result: Any) -> Any:
+    """
+    Dạng lưu vào SearchTask.result: khi bật SEARCH_TASK_COMPACT_RESULTS chỉ giữ id + score
+    của từng sản phẩm (chi tiết lấy lại lúc đọc), lời khuyên Stylist và các field khác giữ nguyên.
+    """
+    if not settings.SEARCH_TASK_COMPACT_RESULTS:
+        return result
+    return strip_products(result)
+
+
+def strip_products(result: Any) -> Any:
+    """Chỉ giữ id + score của từng sản phẩm, không phụ thuộc setting (cache kết quả luôn lưu dạng này)."""
+    if not isinstance(result, dict) or not result.get("products"):
+        return result
+    return {
+        **result,
+        "products": [{"id": p["id"], "score": p.get("score")} for p in result["products"]],
+    }
+
+
+def is_compact(result: Any) -> bool:
+    return (
+        isinstance(result, dict)
+        and bool(result.get("products"))
+        and any("name" not in p for p in result["products"])
+    )
+
+
+def hydrate_result(result: Any) -> Any:
+    """
+    Ngược lại của compact_result: ghép chi tiết sản phẩm (product_cache) vào theo đúng thứ tự đã lưu.
+    Kết quả đầy đủ (task cũ, hoặc khi tắt compact) trả về nguyên vẹn; sản phẩm đã bị xoá thì bỏ qua.
+    Blocking (Redis / Postgres khi miss): gọi qua run_in_threadpool từ endpoint async.
+    """
+    if not is_compact(result):
+        return result
+    products = result["products"]
+    by_id = product_cache.get_many(p["id"] for p in products if "name" not in p)
+    hydrated = []
+    for p in products:
+        if "name" in p:
+            hydrated.append(p)
+        elif p["id"] in by_id:
+            hydrated.append({**by_id[p["id"]], "score": p.get("score")})
+    return {**result, "products": hydrated}
@@ -0,0 +1,216 @@
+import datetime
+import gzip
+import json
+import re
+from typing import List, Optional
+
+from sqlalchemy import DateTime, MetaData, Table, func, literal, select, table, text, tuple_
+from sqlalchemy.schema import DropTable
+
+from app.core.config import settings
+from app.db.models.task import SearchTask
+from app.db.session import SessionLocal
+from app.services.storage import storage
+
+# Partition tháng của search_tasks (tạo bởi migration partition_search_tasks và bởi job này)
+PARTITION_PATTERN = re.compile(r"^search_tasks_p(\d{4})_(\d{2})$")
+
+
+def month_start(value: datetime.datetime) -> datetime.datetime:
+    value = value.astimezone(datetime.timezone.utc) if value.tzinfo else value.replace(tzinfo=datetime.timezone.utc)
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime.datetime, n: int) -> datetime.datetime:
+    index = month.year * 12 + month.month - 1 + n
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime.datetime) -> str:
+    return f"search_tasks_p{month:%Y_%m}"
+
+
+class TaskRetention:
+    """
+    Dọn bảng search_tasks (chạy định kỳ qua Celery beat, hoặc scripts/purge_search_tasks.py):
+    1. Tạo trước partition cho các tháng tới (Postgres, bảng đã partition)
+    2. Partition nằm trọn trước mốc retention -> (lưu trữ) rồi DROP cả partition:
+       không DELETE từng dòng, không để lại bloat cho VACUUM
+    3. Phần còn lại cũ hơn mốc (partition dở tháng, partition default, DB chưa partition):
+       DELETE theo batch nhỏ, commit từng batch để không giữ lock / transaction dài
+    Lưu trữ (SEARCH_TASK_ARCHIVE_ENABLED): mỗi batch thành 1 file JSONL gzip trên S3,
+    ghi S3 lỗi thì dừng, không xoá dòng nào chưa được lưu.
+    """
+
+    def __init__(self, retention_days: int, batch_size: int, archive: bool):
+        self.retention_days = retention_days
+        self.batch_size = max(1, batch_size)
+        self.archive = archive
+
+    def run(self, now: Optional[datetime.datetime] = None) -> dict:
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        cutoff = now - datetime.timedelta(days=self.retention_days)
+        stats = {"cutoff": cutoff.isoformat(), "partitions_created": 0, "partitions_dropped": 0, "rows_deleted": 0, "rows_archived": 0}
+
+        with SessionLocal() as db:
+            if self._is_partitioned(db):
+                stats["partitions_created"] = self.ensure_partitions(db, now)
+                self.drop_expired_partitions(db, cutoff, stats)
+            self.purge_batches(db, cutoff, stats)
+
+        print(f"🧹 Dọn search_tasks: {stats}", flush=True)
+        return stats
+
+    # --- Partition (chỉ Postgres) ---
+    @staticmethod
+    def _is_partitioned(db) -> bool:
+        if db.get_bind().dialect.name != "postgresql":
+            return False
+        return bool(db.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = 'search_tasks')"
+        )).scalar())
+
+    @staticmethod
+    def _partitions(db) -> List[str]:
+        rows = db.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = 'search_tasks'"
+        )).scalars().all()
+        return sorted(rows)
+
+    @staticmethod
+    def _quote(db, name: str) -> str:
+        return db.get_bind().dialect.identifier_preparer.quote(name)
+
+    @staticmethod
+    def _literal(db, value: datetime.datetime) -> str:
+        # DDL (CREATE TABLE ... FOR VALUES) không nhận bind parameter: render literal qua dialect
+        return str(literal(value, DateTime(timezone=True)).compile(
+            dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True}
+        ))
+
+    def ensure_partitions(self, db, now: datetime.datetime) -> int:
+        existing = set(self._partitions(db))
+        created = 0
+        month = month_start(now)
+        for i in range(settings.SEARCH_TASK_PARTITIONS_AHEAD + 1):
+            start = add_months(month, i)
+            name = partition_name(start)
+            if name in existing:
+                continue
+            try:
+                db.execute(text(
+                    f"CREATE TABLE {self._quote(db, name)} PARTITION OF search_tasks "
+                    f"FOR VALUES FROM ({self._literal(db, start)}) TO ({self._literal(db, add_months(start, 1))})"
+                ))
+                db.commit()
+                created += 1
+            except Exception as e:
+                # Vd: partition default đã có dòng thuộc tháng này -> để nguyên, không chặn phần dọn dẹp
+                db.rollback()
+                print(f"⚠️ Không tạo được partition {name}: {e}", flush=True)
+        return created
+
+    def drop_expired_partitions(self, db, cutoff: datetime.datetime, stats: dict):
+        for name in self._partitions(db):
+            match = PARTITION_PATTERN.match(name)
+            if not match:
+                continue  # partition default
+            start = datetime.datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=datetime.timezone.utc)
+            if add_months(start, 1) > cutoff:
+                continue
+            if self.archive:
+                self._archive_partition(db, name, stats)
+            stats["rows_deleted"] += db.execute(select(func.count()).select_from(table(name))).scalar()
+            db.execute(DropTable(Table(name, MetaData())))
+            db.commit()
+            stats["partitions_dropped"] += 1
+            print(f"🗑️ Đã drop partition {name}", flush=True)
+
+    @staticmethod
+    def _partition_table(name: str) -> Table:
+        # Cùng cột với search_tasks nhưng trỏ thẳng vào partition: chỉ quét đúng partition đó
+        # (lọc tableoid trên bảng cha không được planner cắt partition)
+        return SearchTask.__table__.to_metadata(MetaData(), name=name)
+
+    def _archive_partition(self, db, name: str, stats: dict):
+        # Keyset theo (created_at, id) trong partition: mỗi batch 1 file
+        partition = self._partition_table(name)
+        last = None
+        while True:
+            query = select(partition)
+            if last is not None:
+                query = query.where(tuple_(partition.c.created_at, partition.c.id) > tuple_(*last))
+            rows = db.execute(
+                query.order_by(partition.c.created_at, partition.c.id).limit(self.batch_size)
+            ).all()
+            if not rows:
+                return
+            self._archive(rows)
+            stats["rows_archived"] += len(rows)
+            last = (rows[-1].created_at, rows[-1].id)
+
+    # --- Xoá theo batch (mọi backend) ---
+    def purge_batches(self, db, cutoff: datetime.datetime, stats: dict):
+        while True:
+            if self.archive:
+                rows = (
+                    db.query(SearchTask)
+                    .filter(SearchTask.created_at < cutoff)
+                    .order_by(SearchTask.created_at, SearchTask.id)
+                    .limit(self.batch_size)
+                    .all()
+                )
+                ids = [row.id for row in rows]
+                if rows:
+                    self._archive(rows)
+                    stats["rows_archived"] += len(rows)
+            else:
+                ids = [
+                    row.id for row in
+                    db.query(SearchTask.id)
+                    .filter(SearchTask.created_at < cutoff)
+                    .order_by(SearchTask.created_at)
+                    .limit(self.batch_size)
+                ]
+            if not ids:
+                return
+            # Điều kiện created_at giúp Postgres chỉ quét các partition cũ
+            db.query(SearchTask).filter(
+                SearchTask.id.in_(ids), SearchTask.created_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+            db.expunge_all()
+            stats["rows_deleted"] += len(ids)
+            if len(ids) < self.batch_size:
+                return
+
+    # --- Lưu trữ ---
+    @staticmethod
+    def _serialize(task) -> dict:
+        return {
+            "id": str(task.id),
+            "user_id": str(task.user_id) if task.user_id else None,
+            "status": task.status,
+            "input_image_url": task.input_image_url,
+            "result": task.result,
+            "error_message": task.error_message,
+            "created_at": task.created_at.isoformat() if task.created_at else None,
+            "updated_at": task.updated_at.isoformat() if task.updated_at else None,
+        }
+
+    def _archive(self, rows: list):
+        lines = "\n".join(json.dumps(self._serialize(row), ensure_ascii=False) for row in rows)
+        data = gzip.compress(lines.encode("utf-8"))
+        first = rows[0]
+        key = f"{settings.SEARCH_TASK_ARCHIVE_PREFIX}/{first.created_at:%Y/%m/%d}/{first.created_at:%H%M%S}-{first.id}.jsonl.gz"
+        storage.put_bytes(data, key, content_type="application/gzip")
+
+
+task_retention = TaskRetention(
+    retention_days=settings.SEARCH_TASK_RETENTION_DAYS,
+    batch_size=settings.SEARCH_TASK_PURGE_BATCH_SIZE,
+    archive=settings.SEARCH_TASK_ARCHIVE_ENABLED,
+)
@@ -0,0 +1,104 @@
+import datetime
+import json
+from typing import Any, Optional
+
+import redis
+
+from app.core.config import settings
+from app.core.redis_client import async_redis_client, redis_client
+from app.db.models.task import SearchTask
+
+FIELDS = ("user_id", "status", "input_image_url", "result", "error", "created_at")
+
+
+class TaskStateStore:
+    """
+    Trạng thái task đang chạy trên Redis (hash `task_state:{id}`, có TTL):
+    status, user_id, ảnh đầu vào, kết quả (dạng đầy đủ), lỗi, created_at.
+    - API tạo task đi queue: chỉ ghi Redis; worker đổi trạng thái giữa chừng: chỉ ghi Redis
+    - Postgres là bản ghi bền vững, được ghi khi task kết thúc (worker) -> polling không chạm primary DB
+    - Sau khi kết thúc vẫn giữ bản cuối TASK_STATE_FINAL_TTL_SECONDS cho các lượt poll cuối
+    Lỗi Redis: save trả False (caller quay về ghi Postgres), load trả None (caller đọc Postgres).
+    """
+
+    PREFIX = "task_state"
+
+    def __init__(self, client: redis.Redis, async_client):
+        self.client = client
+        self.async_client = async_client
+
+    def key(self, task_id) -> str:
+        return f"{self.PREFIX}:{task_id}"
+
+    # --- Mã hoá ---
+    @staticmethod
+    def _encode(task: SearchTask, result: Any) -> dict:
+        values = {
+            "user_id": str(task.user_id) if task.user_id else None,
+            "status": task.status,
+            "input_image_url": task.input_image_url,
+            "result": result,
+            "error": task.error_message,
+            "created_at": task.created_at.isoformat() if task.created_at else None,
+        }
+        return {field: json.dumps(value, ensure_ascii=False, default=str) for field, value in values.items()}
+
+    @staticmethod
+    def _decode(raw: dict) -> Optional[dict]:
+        if not raw:
+            return None
+        state = {field: None for field in FIELDS}
+        for field, value in raw.items():
+            field = field.decode() if isinstance(field, bytes) else field
+            state[field] = json.loads(value)
+        if state["created_at"]:
+            state["created_at"] = datetime.datetime.fromisoformat(state["created_at"])
+        return state
+
+    @staticmethod
+    def _ttl(final: bool) -> int:
+        return settings.TASK_STATE_FINAL_TTL_SECONDS if final else settings.TASK_STATE_TTL_SECONDS
+
+    # --- Sync (worker) ---
+    def save(self, task: SearchTask, result: Any = None, final: bool = False) -> bool:
+        """`result`: kết quả dạng đầy đủ (đã hydrate) để API trả thẳng cho client."""
+        key = self.key(task.id)
+        try:
+            pipe = self.client.pipeline()
+            pipe.hset(key, mapping=self._encode(task, result))
+            pipe.expire(key, self._ttl(final))
+            pipe.execute()
+            return True
+        except redis.RedisError as e:
+            print(f"⚠️ Redis task state lỗi (save {task.id}): {e}", flush=True)
+            return False
+
+    def load(self, task_id) -> Optional[dict]:
+        try:
+            return self._decode(self.client.hgetall(self.key(task_id)))
+        except redis.RedisError as e:
+            print(f"⚠️ Redis task state lỗi (load {task_id}): {e}", flush=True)
+            return None
+
+    # --- Async (API) ---
+    async def asave(self, task: SearchTask, result: Any = None, final: bool = False) -> bool:
+        key = self.key(task.id)
+        try:
+            async with self.async_client.pipeline() as pipe:
+                pipe.hset(key, mapping=self._encode(task, result))
+                pipe.expire(key, self._ttl(final))
+                await pipe.execute()
+            return True
+        except redis.RedisError as e:
+            print(f"⚠️ Redis task state lỗi (save {task.id}): {e}", flush=True)
+            return False
+
+    async def aload(self, task_id) -> Optional[dict]:
+        try:
+            return self._decode(await self.async_client.hgetall(self.key(task_id)))
+        except redis.RedisError as e:
+            print(f"⚠️ Redis task state lỗi (load {task_id}): {e}", flush=True)
+            return None
+
+
+task_state = TaskStateStore(redis_client, async_redis_client)
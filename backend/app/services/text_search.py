@@ -0,0 +1,77 @@
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional
+
+from app.core.ai_engine import ai_engine
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.db.vector_store import vector_store
+from app.schemas.search import SearchFilters
+
+
+def normalize_query(query: str) -> str:
+    """Gộp các truy vấn chỉ khác hoa/thường, khoảng trắng hoặc dạng Unicode vào cùng 1 key."""
+    text = unicodedata.normalize("NFC", query).casefold()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class TextSearch:
+    """
+    Tìm sản phẩm bằng câu mô tả (CLIP text tower, cùng không gian vector với ảnh sản phẩm).
+    Truy vấn text phân bố đuôi dài ("áo sơ mi trắng", "váy đỏ"...) nên có LRU giới hạn
+    số entry cho vector truy vấn: câu phổ biến không phải chạy lại text encoder.
+    Không có S3, không decode ảnh -> rẻ hơn nhiều so với tìm bằng ảnh.
+    """
+
+    def __init__(self, engine, max_entries: int):
+        self.engine = engine
+        self.max_entries = max(1, max_entries)
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def embed(self, query: str) -> List[float]:
+        key = normalize_query(query)
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self._hits += 1
+                return vector
+            self._misses += 1
+
+        vector = self.engine.create_text_embeddings([key])[0]
+
+        with self._lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+                self._evictions += 1
+        return vector
+
+    def search(self, query: str, k: int = 5, filters: Optional[SearchFilters] = None) -> List[dict]:
+        """Blocking (CPU + DB): gọi qua run_in_threadpool từ endpoint async."""
+        embedding = self.embed(query)
+        db = SessionLocal()
+        try:
+            return vector_store.search_products(db, embedding, k=k, filters=filters)
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "size": len(self._cache),
+                "max_entries": self.max_entries,
+            }
+
+
+text_search = TextSearch(ai_engine, max_entries=settings.TEXT_EMBED_CACHE_MAX_ENTRIES)
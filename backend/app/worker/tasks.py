@@ -1,153 +1,308 @@
 from app.core.celery_app import celery_app
+from app.core.config import settings
 from app.db.session import SessionLocal 
 # Import app.db.base để đảm bảo tất cả Models (User, Product, Task) được đăng ký vào Metadata
 import app.db.base 
 from app.db.models.task import SearchTask
-from app.db.models.product import Product
-from app.services.storage import S3Client
-from app.core.ai_engine import ai_engine
+from app.services.storage import storage
+from app.core.embedding_batcher import embedding_batcher
 from app.db.vector_store import vector_store
-# Import thư viện xử lý timeout
-import signal
-from contextlib import contextmanager
-import torch # Thêm thư viện torch
+from app.services.search_cache import search_cache, hash_image
+from app.schemas.search import SearchFilters
+from app.services.task_events import publish_task_event
+from app.services.task_results import compact_result, hydrate_result
+from app.services.task_retention import task_retention
+from app.services.task_state import task_state
+from app.core.metrics import SEARCH_TASKS, STYLIST_ADVICE
+from app.core.tracing import observe_queue_wait, span
+import datetime
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Optional
+from sqlalchemy import insert, inspect
+from sqlalchemy.exc import IntegrityError
 # Import Stylist AI mới
 from app.services.ai.stylist import stylist_ai
 
-# --- FIX DEADLOCK: Cấu hình PyTorch chạy đơn luồng ---
-# Celery dùng 'prefork' pool, xung đột với OpenMP của PyTorch gây treo (deadlock).
-# Ép về 1 thread sẽ giải quyết vấn đề này.
-torch.set_num_threads(1)
+# Số thread PyTorch + ghim CPU do worker profile đặt (app/core/worker_profile.py):
+# process cha của prefork chạy 1 thread (tránh deadlock OpenMP sau fork),
+# mỗi process con CLIP_INTRA_OP_THREADS thread trên nhóm core riêng.
 
-# Context manager để giới hạn thời gian chạy của 1 đoạn code
-class TimeoutException(Exception): pass
+def publish_status(task: SearchTask, final: bool = False, result=None):
+    """
+    Ghi trạng thái vào hot store Redis (API poll đọc từ đây) và đẩy cho các client
+    đang nghe qua SSE. Kết quả luôn ở dạng đầy đủ.
+    """
+    result = result if result is not None else hydrate_result(task.result)
+    task_state.save(task, result, final=final)
+    publish_task_event(str(task.id), task.status, result, task.error_message)
 
-@contextmanager
-def time_limit(seconds):
-    def signal_handler(signum, frame):
-        raise TimeoutException("Timed out!")
-    signal.signal(signal.SIGALRM, signal_handler)
-    signal.alarm(seconds)
+def load_task(
+    db,
+    task_id: str,
+    user_id: Optional[str] = None,
+    input_image_url: Optional[str] = None,
+    created_at: Optional[str] = None,
+) -> Optional[SearchTask]:
+    """
+    Task đang chờ xử lý: API chỉ ghi Redis lúc tạo -> dựng lại object (chưa có dòng Postgres).
+    Không có trong Redis (Redis lỗi lúc tạo -> API đã ghi Postgres) thì đọc dòng Postgres.
+    Không có ở cả hai (key hết TTL / bị Redis evict trong lúc chờ queue): dựng lại từ tham số
+    của message (API gửi kèm) thay vì bỏ task -> kết quả vẫn được ghi bền vững khi xong.
+    """
+    state = task_state.load(task_id)
+    if state is not None:
+        return SearchTask(
+            id=uuid.UUID(task_id),
+            user_id=uuid.UUID(state["user_id"]) if state["user_id"] else None,
+            status=state["status"],
+            input_image_url=state["input_image_url"],
+            created_at=state["created_at"],
+        )
+
+    query = db.query(SearchTask).filter(SearchTask.id == task_id)
+    if created_at:
+        # Có khoá partition -> Postgres chỉ quét partition của tháng đó
+        query = query.filter(SearchTask.created_at == datetime.datetime.fromisoformat(created_at))
+    task = query.first()
+    if task is not None or not created_at:
+        return task
+
+    print(f"⚠️ Task {task_id} không còn trong Redis -> dựng lại từ message", flush=True)
+    return SearchTask(
+        id=uuid.UUID(task_id),
+        user_id=uuid.UUID(user_id) if user_id else None,
+        status="PENDING",
+        input_image_url=input_image_url,
+        created_at=datetime.datetime.fromisoformat(created_at),
+    )
+
+def update_status(task: SearchTask):
+    """Chuyển trạng thái giữa chừng (PROCESSING...): chỉ Redis + SSE, không ghi Postgres."""
+    publish_status(task)
+
+def finish_task(db, task: SearchTask):
+    """
+    Trạng thái cuối (COMPLETED | FAILED): ghi Postgres đúng 1 lần (bản ghi bền vững),
+    rồi Redis + SSE, đếm trạng thái cuối.
+    """
+    with span("db_commit"):
+        if inspect(task).transient:
+            # Task chỉ có trong Redis: INSERT thẳng (không SELECT trước), `task` vẫn transient
+            # giữ nguyên giá trị -> publish không phải đọc lại
+            values = {column.key: getattr(task, column.key) for column in SearchTask.__table__.columns}
+            try:
+                db.execute(insert(SearchTask).values({k: v for k, v in values.items() if v is not None}))
+                db.commit()
+            except IntegrityError:
+                # Đã có dòng (task bị giao lại sau khi đã ghi): UPDATE, merge tìm theo (id, created_at)
+                db.rollback()
+                db.merge(task)
+                db.commit()
+        else:
+            # Dòng Postgres có sẵn (Redis lỗi lúc API tạo task): UPDATE
+            db.commit()
+    publish_status(task, final=True)
+    SEARCH_TASKS.labels(status=task.status).inc()
+
+def ask_stylist(best_match: dict):
+    """Trả về (lời khuyên, advice_status)."""
     try:
-        yield
-    finally:
-        signal.alarm(0)
+        with span("llm"):
+            advice = stylist_ai.generate_outfit_advice(
+                product_name=best_match['name'],
+                product_desc=best_match['description'] or "Sản phẩm thời trang",
+                product_id=best_match['id']
+            )
+        STYLIST_ADVICE.labels(status="COMPLETED").inc()
+        return advice, "COMPLETED"
+    except Exception as e:
+        print(f"⚠️ Lỗi Stylist: {e}", flush=True)
+        STYLIST_ADVICE.labels(status="FAILED").inc()
+        return "Stylist đang bận, bạn tự phối nhé!", "FAILED"
+
+def build_search_result(products: list) -> dict:
+    """
+    Kết quả tìm kiếm được commit ngay khi có sản phẩm; lời khuyên Stylist
+    (Gemini, chậm và không bắt buộc) được task attach_stylist_advice bổ sung sau.
+    advice_status: PENDING -> COMPLETED | FAILED
+    """
+    return {"products": products, "stylist_advice": None, "advice_status": "PENDING"}
+
+def advice_pending(result) -> bool:
+    """Kết quả có sản phẩm nhưng chưa có lời khuyên Stylist (vừa tìm xong / lấy từ cache)."""
+    return isinstance(result, dict) and result.get("advice_status") == "PENDING"
 
 @celery_app.task
 def test_celery_task(word: str):
     return f"Hello {word}"
 
-@celery_app.task
-def process_visual_search(task_id: str):
-    print(f"🔥 [DEBUG] Bắt đầu xử lý Task ID: {task_id}", flush=True)
+@celery_app.task(
+    soft_time_limit=settings.SEARCH_TASK_SOFT_TIME_LIMIT_SECONDS,
+    time_limit=settings.SEARCH_TASK_TIME_LIMIT_SECONDS,
+)
+def process_visual_search(
+    task_id: str,
+    image_hash: str = None,
+    filters: dict = None,
+    user_id: str = None,
+    input_image_url: str = None,
+    created_at: str = None,
+):
+    search_filters = SearchFilters(**filters) if filters else None
     
     # 1. Kết nối DB (Sync)
-    db = SessionLocal()
+    # expire_on_commit=False: task đã có dòng Postgres vẫn publish được sau commit mà không SELECT lại
+    db = SessionLocal(expire_on_commit=False)
+    # Đã ghi trạng thái cuối COMPLETED: lỗi sau đó (gửi task Stylist...) không được ghi đè thành FAILED
+    finished = False
     try:
-        task = db.query(SearchTask).filter(SearchTask.id == task_id).first()
+        with span("task_load"):
+            task = load_task(db, task_id, user_id, input_image_url, created_at)
         
         if not task:
-            print("❌ [DEBUG] Không tìm thấy Task trong DB", flush=True)
+            print(f"❌ Không tìm thấy task {task_id}", flush=True)
             return "Task not found"
+        # Thời gian chờ trong queue: từ lúc API tạo task tới lúc worker nhận
+        observe_queue_wait(task.created_at)
 
-        # 2. Update status -> PROCESSING
+        # 2. Update status -> PROCESSING (ghi lại hash Redis -> TTL tính lại từ lúc worker nhận task)
         task.status = "PROCESSING"
-        db.commit()
-        print("✅ [DEBUG] Đã update status -> PROCESSING", flush=True)
+        update_status(task)
 
-        # 3. Download Ảnh từ S3
-        s3 = S3Client()
-        print(f"📥 [DEBUG] Đang tải ảnh từ S3: {task.input_image_url} ...", flush=True)
-        
-        # Thêm try-catch cho việc download
-        try:
-            image_bytes = s3.download_file_as_bytes(task.input_image_url)
-            print(f"✅ [DEBUG] Tải ảnh thành công. Kích thước: {len(image_bytes)} bytes", flush=True)
-        except Exception as e:
-            print(f"❌ [DEBUG] Lỗi tải ảnh: {e}", flush=True)
-            raise e
-
-        # 4. AI Inference (Tạo Vector)
-        print("🧠 [DEBUG] Bắt đầu chạy AI Inference (CLIP)...", flush=True)
-        
-        # Dùng time_limit để tránh việc AI treo mãi mãi (Timeout 60s)
-        try:
-            with time_limit(60):
-                query_vector = ai_engine.create_embedding(image_bytes)
-            print("✅ [DEBUG] AI Inference hoàn tất. Vector size: 512", flush=True)
-        except TimeoutException:
-            print("❌ [DEBUG] AI Inference bị treo quá 60s -> KILL", flush=True)
-            raise Exception("AI Model timeout")
-
-        # 5. Tìm kiếm Vector (ChromaDB)
-        print("🔍 [DEBUG] Đang tìm kiếm trong ChromaDB...", flush=True)
-        results = vector_store.search(query_vector, k=5)
+        # Ảnh giống hệt vừa được tìm xong trong lúc task chờ queue -> dùng lại kết quả
+        if image_hash:
+            with span("cache_lookup"):
+                cached_result = search_cache.get_results(image_hash, 5, search_filters)
+            if cached_result is not None:
+                task.result = compact_result(cached_result)
+                task.status = "COMPLETED"
+                finish_task(db, task)
+                finished = True
+                # Cache ghi lúc tìm xong, trước khi Stylist trả lời -> task này tự hỏi Stylist
+                if advice_pending(cached_result):
+                    attach_stylist_advice.delay(task_id, image_hash, filters, created_at=task.created_at.isoformat())
+                return "Served from cache"
+
+        with span("cache_lookup"):
+            query_vector = search_cache.get_embedding(image_hash) if image_hash else None
+        # Cache hit embedding -> bỏ qua tải S3 + CLIP
+        if query_vector is None:
+            # 3. Download Ảnh từ S3, đọc vào buffer tái sử dụng của process (không cấp phát bytes mới mỗi task)
+            with span("s3_download"):
+                image_bytes = storage.download_to_buffer(task.input_image_url)
+
+            # 4. AI Inference (Tạo Vector)
+            # Pool threads: timeout chờ trên Future của batcher (không dùng SIGALRM: chỉ chạy ở main thread).
+            # Prefork: batcher chạy inline (Future đã xong), giới hạn bằng time limit của task
+            timeout = settings.CLIP_INFERENCE_TIMEOUT_SECONDS
+            future = embedding_batcher.submit(image_bytes)
+            try:
+                with span("clip_embed"):
+                    query_vector = future.result(timeout=timeout)
+            except FutureTimeoutError:
+                # Chưa vào batch thì huỷ luôn, đang chạy thì batcher bỏ kết quả
+                future.cancel()
+                raise Exception("AI Model timeout")
+
+            search_cache.set_embedding(image_hash or hash_image(image_bytes), query_vector)
+
+        # 5 + 6. Tìm kiếm Vector và lấy thông tin chi tiết sản phẩm
+        # (pgvector: 1 câu SQL; Chroma: query ID rồi hydrate từ Postgres), giữ đúng thứ tự similarity
+        # Span vector_query / hydrate được đo bên trong vector_store
+        result_data = vector_store.search_products(db, query_vector, k=5, filters=search_filters)
         
         # Kiểm tra kết quả
-        if not results['ids'] or len(results['ids'][0]) == 0:
-            print("⚠️ [DEBUG] Không tìm thấy sản phẩm nào giống.", flush=True)
+        if not result_data:
             task.result = []
             task.status = "COMPLETED"
-            db.commit()
+            finish_task(db, task)
+            finished = True
+            if image_hash:
+                search_cache.set_results(image_hash, [], 5, search_filters)
             return "No results found"
 
-        top_ids = results['ids'][0] # Chroma trả về list lồng nhau
-        print(f"✅ [DEBUG] Tìm thấy {len(top_ids)} sản phẩm tương đồng: {top_ids}", flush=True)
-
-        # 6. Lấy thông tin chi tiết từ Postgres
-        products = db.query(Product).filter(Product.id.in_(top_ids)).all()
-        print(f"✅ [DEBUG] Lấy được {len(products)} sản phẩm từ Postgres", flush=True)
-        
-        # --- LOGIC MỚI: GỌI STYLIST ---
-        advice = ""
-        if products:
-            # Lấy sản phẩm giống nhất (Top 1) để hỏi Stylist
-            best_match = products[0]
-            print(f"🤖 [DEBUG] Đang hỏi ý kiến Stylist về: {best_match.name}...", flush=True)
-            try:
-                advice = stylist_ai.get_outfit_advice(
-                    product_name=best_match.name,
-                    product_desc=best_match.description or "Sản phẩm thời trang"
-                )
-                print("✅ [DEBUG] Stylist đã trả lời!", flush=True)
-            except Exception as e:
-                print(f"⚠️ [DEBUG] Lỗi Stylist: {e}", flush=True)
-                advice = "Stylist đang bận, bạn tự phối nhé!"
-
-        # Convert SQLAlchemy Objects -> JSON List
-        result_data = []
-        for p in products:
-            result_data.append({
-                "id": str(p.id),
-                "name": p.name,
-                "price": p.price,
-                "image_url": p.image_url,
-                "category": p.category,
-                "description": p.description
-            })
-
-        # 7. Lưu kết quả và Hoàn thành
-        task.result = {
-            "products": result_data,
-            "stylist_advice": advice # Thêm lời khuyên vào kết quả
-        }
+        # 7. Lưu kết quả và Hoàn thành ngay, không chờ Stylist
+        search_result = build_search_result(result_data)
+        task.result = compact_result(search_result)
         task.status = "COMPLETED"
-        db.commit()
-        print("🎉 [DEBUG] Task hoàn thành xuất sắc!", flush=True)
-        return f"Found {len(products)} products"
+        finish_task(db, task)
+        finished = True
+        # Cache kết quả ngay khi tìm xong (không phụ thuộc Gemini): ảnh giống hệt gửi lại
+        # không phải chạy CLIP + Vector DB, kể cả khi Stylist lỗi / chậm
+        if image_hash:
+            search_cache.set_results(image_hash, search_result, 5, search_filters)
+
+        # --- STYLIST: chạy ở task riêng trên queue "llm" ---
+        # Lấy sản phẩm giống nhất (Top 1) để hỏi Stylist; có lời khuyên thì ghi đè entry cache.
+        attach_stylist_advice.delay(task_id, image_hash, filters, created_at=task.created_at.isoformat())
+        return f"Found {len(result_data)} products"
 
     except Exception as e:
-        print(f"💥 [DEBUG] Lỗi nghiêm trọng: {e}", flush=True)
+        print(f"💥 Task {task_id} lỗi: {e}", flush=True)
         db.rollback() 
+        if finished:
+            # Kết quả đã ghi bền vững: hash Redis dựng lại không có result -> không merge FAILED đè lên
+            return "Completed with errors"
         try:
-            task = db.query(SearchTask).filter(SearchTask.id == task_id).first()
+            task = load_task(db, task_id, user_id, input_image_url, created_at)
             if task:
                 task.status = "FAILED"
                 task.error_message = str(e)
-                db.commit()
-                print("✅ [DEBUG] Đã cập nhật status -> FAILED", flush=True)
+                finish_task(db, task)
         except Exception as sub_e:
-            print(f"❌ [DEBUG] Không thể cập nhật status FAILED: {sub_e}", flush=True)
+            print(f"❌ Không thể cập nhật status FAILED cho task {task_id}: {sub_e}", flush=True)
             
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+@celery_app.task
+def attach_stylist_advice(task_id: str, image_hash: str = None, filters: dict = None, created_at: str = None):
+    """
+    Bổ sung lời khuyên Stylist cho task đã COMPLETED (chạy trên queue "llm",
+    không chiếm slot của worker CLIP). Có lời khuyên thì cập nhật entry cache kết quả.
+    """
+    search_filters = SearchFilters(**filters) if filters else None
+    # Không expire sau commit: publish trạng thái mới không phải SELECT lại task
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        query = db.query(SearchTask).filter(SearchTask.id == task_id)
+        if created_at:
+            # Khoá partition -> chỉ quét partition của tháng tạo task
+            query = query.filter(SearchTask.created_at == datetime.datetime.fromisoformat(created_at))
+        task = query.first()
+        if not task or not isinstance(task.result, dict) or not task.result.get("products"):
+            return "Nothing to advise"
+
+        full_result = hydrate_result(task.result)
+        if not full_result.get("products"):
+            return "Nothing to advise"
+        advice, advice_status = ask_stylist(full_result["products"][0])
+        # Gán dict mới để SQLAlchemy nhận ra cột JSON đã thay đổi
+        full_result = {**full_result, "stylist_advice": advice, "advice_status": advice_status}
+        task.result = compact_result(full_result)
+        with span("db_commit"):
+            db.commit()
+        publish_status(task, final=True, result=full_result)
+        if image_hash and advice_status == "COMPLETED":
+            # Lời khuyên lỗi thì giữ entry PENDING: lần hit sau hỏi lại Stylist
+            search_cache.set_results(image_hash, full_result, 5, search_filters)
+        return f"Advice {advice_status.lower()}"
+    finally:
+        db.close()
+
+@celery_app.task
+def ingest_catalog(manifest_path: str, **options):
+    """
+    Import catalog trên lane "ingestion" (worker riêng, không chiếm slot tìm kiếm).
+    `manifest_path` / `image_dir` phải đọc được từ worker; options như IngestionPipeline.
+    """
+    from app.services.ingestion import IngestionPipeline
+
+    stats = IngestionPipeline(manifest_path, **options).run()
+    return stats.report()
+
+@celery_app.task
+def purge_search_tasks():
+    """Retention bảng search_tasks (Celery beat, mỗi đêm): xem TaskRetention."""
+    return task_retention.run()
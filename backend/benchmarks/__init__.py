@@ -0,0 +1,11 @@
+"""
+Benchmark end-to-end chạy offline, lặp lại được (seed cố định).
+
+    python -m benchmarks run --output bench.json
+    python -m benchmarks compare baseline.json bench.json
+
+Mọi dịch vụ ngoài được thay bằng stand-in cục bộ (xem benchmarks/standins.py):
+SQLite, fakeredis, flat index, S3 giả trên filesystem, LLM giả và CLIP cấu hình nhỏ
+với weight ngẫu nhiên. Kết quả (throughput, p50/p95/p99 theo từng stage và kịch bản
+tải đồng thời vào FastAPI app) được ghi ra JSON để so sánh giữa các lần chạy.
+"""
@@ -0,0 +1,152 @@
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+# Thêm đường dẫn để import được app
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmarks.standins import install, make_images, seed_catalog  # noqa: E402
+
+COMPARE_FIELDS = ("p50_ms", "p95_ms", "p99_ms", "throughput_per_s")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def run(args) -> dict:
+    env = install(args.workdir, seed=args.seed, worker_threads=args.worker_threads)
+
+    import torch
+    from app.core.config import settings
+
+    torch.set_num_threads(settings.CLIP_INTRA_OP_THREADS)
+    print(f"📦 Seed catalog: {args.products} sản phẩm ...", file=sys.stderr)
+    seed_catalog(env, args.products)
+    images = make_images(args.images, size=(args.image_width, args.image_height), seed=args.seed)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "cpu_count": os.cpu_count(),
+            "intra_op_threads": settings.CLIP_INTRA_OP_THREADS,
+            "clip_backend": settings.CLIP_INFERENCE_BACKEND,
+            "vector_store": settings.VECTOR_STORE_BACKEND,
+            "params": {k: v for k, v in vars(args).items() if k not in ("func", "output", "workdir")},
+        }
+    }
+
+    if not args.skip_stages:
+        from benchmarks.stages import run_stages
+
+        print("⏱️  Stage benchmarks ...", file=sys.stderr)
+        report["stages"] = run_stages(env, images, args.iterations, args.batch_size)
+
+    if not args.skip_load:
+        from benchmarks.load import run_load
+
+        print(f"🚦 Load: {args.requests} request, concurrency {args.concurrency} ...", file=sys.stderr)
+        report["load"] = run_load(env, images, args.requests, args.concurrency)
+
+    if not args.skip_profiles:
+        from app.core.worker_profile import available_cpus
+        from benchmarks.profiles import parse_splits, run_profiles
+
+        splits = parse_splits(args.profiles, available_cpus())
+        print(f"🧮 Worker profiles (processes x threads): {splits} ...", file=sys.stderr)
+        report["profiles"] = run_profiles(
+            args.workdir, args.seed, images, splits, args.batch_size, args.profile_seconds
+        )
+    return report
+
+
+def _flatten(report: dict) -> dict:
+    rows = {}
+    for section in ("stages", "load", "profiles"):
+        for name, stats in report.get(section, {}).items():
+            rows[f"{section}.{name}"] = stats
+    return rows
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = _flatten(json.load(f))
+    with open(args.candidate) as f:
+        candidate = _flatten(json.load(f))
+
+    print(f"{'metric':45} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for name in sorted(baseline.keys() & candidate.keys()):
+        for field in COMPARE_FIELDS:
+            old, new = baseline[name].get(field), candidate[name].get(field)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            print(f"{name + '.' + field:45} {old:12.3f} {new:12.3f} {change:+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline (stand-in cục bộ), xuất JSON để so sánh giữa các lần chạy.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="Chạy benchmark theo stage + kịch bản tải")
+    p_run.add_argument("--output", "-o", default="-", help="File JSON kết quả ('-' = stdout)")
+    p_run.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "shopping-buddy-bench"))
+    p_run.add_argument("--seed", type=int, default=0)
+    p_run.add_argument("--products", type=int, default=20_000, help="Số sản phẩm trong catalog giả")
+    p_run.add_argument("--images", type=int, default=32, help="Số ảnh JPEG tổng hợp")
+    p_run.add_argument("--image-width", type=int, default=1280)
+    p_run.add_argument("--image-height", type=int, default=960)
+    p_run.add_argument("--iterations", type=int, default=100, help="Số lần đo mỗi stage")
+    p_run.add_argument("--batch-size", type=int, default=16)
+    p_run.add_argument("--requests", type=int, default=200, help="Số request mỗi kịch bản tải")
+    p_run.add_argument("--concurrency", type=int, default=16)
+    p_run.add_argument("--worker-threads", type=int, default=2, help="Số thread của worker giả (thay Celery)")
+    p_run.add_argument("--skip-stages", action="store_true")
+    p_run.add_argument("--skip-load", action="store_true")
+    p_run.add_argument(
+        "--profiles", default="auto",
+        help="Cách chia CPU worker inference cần đo, vd '1x4,2x2,4x1' (processes x threads); 'auto' = mọi cách chia đủ số core",
+    )
+    p_run.add_argument("--profile-seconds", type=float, default=5.0, help="Thời gian đo mỗi cách chia")
+    p_run.add_argument("--skip-profiles", action="store_true")
+    p_run.set_defaults(func=None)
+
+    p_cmp = sub.add_parser("compare", help="So sánh 2 file JSON kết quả")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("candidate")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare(args)
+        return
+
+    # Log debug của app (print) không lẫn vào output; tiến trình in ra stderr
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        report = run(args)
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output == "-":
+        print(payload)
+    else:
+        with open(args.output, "w") as f:
+            f.write(payload)
+        print(f"✅ Đã ghi kết quả vào {args.output}", file=sys.stderr)
+    # Thread nền (embedding batcher, worker giả) là daemon / pool: thoát ngay không chờ
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Kịch bản tải đồng thời vào FastAPI app (in-process qua httpx ASGITransport, không qua mạng):
+- visual: upload ảnh, một phần là ảnh lặp lại (cache hit), còn lại inline hoặc queue
+- text:   truy vấn text theo phân bố đuôi dài (Zipf)
+- batch:  nhiều ảnh trong 1 request
+Task đi queue được worker giả (thread pool) xử lý; thời gian enqueue -> xong được đo riêng.
+"""
+import asyncio
+import time
+from collections import Counter
+from typing import Callable, List
+
+import numpy as np
+
+from benchmarks.stats import summarize
+from benchmarks.standins import BenchEnv
+
+
+async def _drive(client, make_request: Callable[[int], tuple], total: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    served_by: Counter = Counter()
+    next_index = iter(range(total))
+
+    async def user():
+        for i in next_index:
+            method, url, kwargs = make_request(i)
+            t0 = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - t0)
+            statuses[response.status_code] += 1
+            if response.status_code == 200 and method == "POST" and url.endswith("/visual"):
+                served_by[response.json().get("served_by", "?")] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    result = summarize(latencies, wall)
+    result["concurrency"] = concurrency
+    result["status_codes"] = {str(code): count for code, count in sorted(statuses.items())}
+    if served_by:
+        result["served_by"] = dict(served_by)
+    return result
+
+
+async def _run_load(env: BenchEnv, images, requests: int, concurrency: int, duplicate_ratio: float) -> dict:
+    import httpx
+    from app.api import deps
+    from app.db.models.user import User
+    from app.main import app
+
+    user = User(id=env.user_id, email="bench@example.com", hashed_password="x", full_name="Bench")
+    app.dependency_overrides[deps.get_current_user] = lambda: user
+    await app.router.startup()
+
+    prefix = "/api/v1/search"
+    rng = np.random.default_rng(env.seed)
+    repeat = rng.random(requests) < duplicate_ratio
+    unique_counter = iter(range(10**9))
+
+    def visual_request(i):
+        if repeat[i]:
+            data = images[int(rng.integers(0, min(8, len(images))))]
+        else:
+            # JPEG bỏ qua byte thừa sau EOI: cùng nội dung ảnh nhưng hash mới -> cache miss
+            data = images[i % len(images)] + next(unique_counter).to_bytes(8, "little")
+        return "POST", f"{prefix}/visual", {"files": {"file": ("photo.jpg", data, "image/jpeg")}}
+
+    vocabulary = ["ao so mi", "vay hoa", "quan jean", "giay the thao", "tui xach", "ao khoac", "dam du tiec", "non"]
+    colors = ["trang", "den", "do", "xanh", "be", "hong", "nau", "xam"]
+    zipf = rng.zipf(1.3, size=requests)
+
+    def text_request(i):
+        rank = int(zipf[i]) - 1
+        query = f"{vocabulary[rank % len(vocabulary)]} {colors[(rank // len(vocabulary)) % len(colors)]} {rank // 64}"
+        return "GET", f"{prefix}/text", {"params": {"q": query}}
+
+    def batch_request(i):
+        files = [("files", (f"{j}.jpg", images[(i + j) % len(images)], "image/jpeg")) for j in range(4)]
+        return "POST", f"{prefix}/visual/batch", {"files": files, "data": {"fuse": "true"}}
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        env.worker_pool.reset()
+        results["visual"] = await _drive(client, visual_request, requests, concurrency)
+        # Task đi queue: thời gian từ lúc enqueue tới lúc worker giả chạy xong, theo từng loại task
+        await asyncio.get_running_loop().run_in_executor(None, env.worker_pool.drain)
+        for name, latencies in env.worker_pool.latencies.items():
+            stats = summarize(latencies, 1.0)
+            stats.pop("throughput_per_s", None)
+            results["visual"][f"queue_{name}"] = stats
+
+        results["text"] = await _drive(client, text_request, requests, concurrency)
+        results["batch"] = await _drive(client, batch_request, max(1, requests // 4), concurrency)
+        env.worker_pool.reset()
+
+    await app.router.shutdown()
+    app.dependency_overrides.clear()
+    return results
+
+
+def run_load(env: BenchEnv, images, requests: int, concurrency: int, duplicate_ratio: float = 0.3) -> dict:
+    return asyncio.run(_run_load(env, images, requests, concurrency, duplicate_ratio))
@@ -0,0 +1,86 @@
+"""
+Throughput CLIP (ảnh/giây) theo cách chia CPU của worker inference: P process x T thread.
+Mỗi process con là 1 interpreter mới (spawn, như 1 process con của worker sạch OpenMP),
+ghim core theo InferenceProfile.cpu_slice, chạy forward pass batch đầy liên tục trong
+cùng 1 khoảng thời gian với các process khác (barrier) -> cộng dồn ra throughput của cả máy.
+"""
+import contextlib
+import multiprocessing
+import os
+import time
+from typing import List
+
+from benchmarks.stats import summarize
+
+
+def parse_splits(value: str, cpus: List[int]) -> List[tuple]:
+    """"1x4,2x2,4x1" -> [(1, 4), (2, 2), (4, 1)]; "auto" -> mọi P x T = số core khả dụng."""
+    if value == "auto":
+        n = len(cpus)
+        return [(n // t, t) for t in range(1, n + 1) if n % t == 0]
+    splits = []
+    for item in value.split(","):
+        processes, threads = item.lower().split("x")
+        splits.append((int(processes), int(threads)))
+    return splits
+
+
+def _child(index, processes, threads, workdir, seed, images, batch_size, seconds, barrier, results):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        from benchmarks.standins import install
+
+        install(os.path.join(workdir, f"profile-{index}"), seed=seed, worker_threads=1)
+
+        from app.core.ai_engine import ai_engine
+        from app.core.preprocess import draft_decode, open_image
+        from app.core.worker_profile import apply_profile, resolve_profile
+
+        profile = resolve_profile(processes, threads)
+        apply_profile(profile.threads, profile.cpu_slice(index))
+
+        size = ai_engine.preprocessor.size
+        decoded = [draft_decode(open_image(images[i % len(images)]), size).convert("RGB") for i in range(batch_size)]
+        batch = ai_engine.preprocessor(decoded).clone()
+        for _ in range(2):
+            ai_engine.backend(batch)
+
+        barrier.wait()
+        latencies = []
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            t0 = time.perf_counter()
+            ai_engine.backend(batch)
+            latencies.append(time.perf_counter() - t0)
+        results.put((latencies, time.perf_counter() - started))
+
+
+def run_profiles(workdir: str, seed: int, images, splits: List[tuple], batch_size: int, seconds: float) -> dict:
+    from app.core.worker_profile import available_cpus
+
+    context = multiprocessing.get_context("spawn")
+    cpus = available_cpus()
+    results = {}
+    for processes, threads in splits:
+        barrier = context.Barrier(processes)
+        queue = context.Queue()
+        children = [
+            context.Process(
+                target=_child,
+                args=(i, processes, threads, workdir, seed, images[:batch_size], batch_size, seconds, barrier, queue),
+            )
+            for i in range(processes)
+        ]
+        for child in children:
+            child.start()
+        # Đọc hết queue trước khi join (process con chỉ thoát khi dữ liệu đã được lấy ra);
+        # process con chết giữa chừng -> queue.Empty thay vì treo
+        outputs = [queue.get(timeout=seconds + 300) for _ in children]
+        for child in children:
+            child.join()
+
+        latencies = [latency for child_latencies, _ in outputs for latency in child_latencies]
+        wall = max(elapsed for _, elapsed in outputs)
+        stats = summarize(latencies, wall, items_per_call=batch_size)
+        stats.update({"processes": processes, "threads": threads, "cpus": len(cpus)})
+        results[f"{processes}x{threads}"] = stats
+    return results
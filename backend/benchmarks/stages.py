@@ -0,0 +1,114 @@
+"""
+Benchmark từng stage của luồng tìm kiếm bằng ảnh (và text), đo riêng lẻ, tuần tự:
+decode -> preprocess -> embed -> vector query -> hydrate -> ghi DB, cộng 1 lần chạy
+trọn `process_visual_search` như worker (S3 giả + cache + DB).
+"""
+import uuid
+
+import numpy as np
+
+from benchmarks.stats import measure
+from benchmarks.standins import BenchEnv
+
+
+def run_stages(env: BenchEnv, images, iterations: int, batch_size: int) -> dict:
+    from app.core.ai_engine import ai_engine
+    from app.core.preprocess import draft_decode, open_image
+    from app.db.models.task import SearchTask, utcnow
+    from app.db.session import SessionLocal
+    from app.db.vector_store import vector_store
+    from app.schemas.search import SearchFilters
+    from app.services.search_cache import hash_image
+    from app.services.storage import storage
+    from app.services.task_state import task_state
+    from app.services.text_search import text_search
+    from app.worker.tasks import build_search_result, finish_task, process_visual_search
+
+    size = ai_engine.preprocessor.size
+    results = {}
+
+    def new_task(input_image_url: str):
+        # Như API tạo task: id + created_at sinh sẵn, chưa có dòng Postgres
+        return SearchTask(
+            id=uuid.uuid4(),
+            user_id=env.user_id,
+            status="PENDING",
+            input_image_url=input_image_url,
+            created_at=utcnow(),
+        )
+    pick = lambda i: images[i % len(images)]  # noqa: E731
+
+    # 1. Decode (header + JPEG draft decode + RGB)
+    def decode(i):
+        image = draft_decode(open_image(pick(i)), size)
+        return image.convert("RGB") if image.mode != "RGB" else image.copy()
+
+    results["decode"] = measure(decode, iterations)
+    decoded = [decode(i) for i in range(len(images))]
+
+    # 2. Preprocess (resize + crop + normalize vào tensor)
+    results["preprocess"] = measure(lambda i: ai_engine.preprocessor([decoded[i % len(decoded)]]), iterations)
+
+    # 3. Embed (forward pass image tower), batch 1 và batch đầy
+    single = ai_engine.preprocessor([decoded[0]]).clone()
+    batch = ai_engine.preprocessor([decoded[i % len(decoded)] for i in range(batch_size)]).clone()
+    results["embed_batch1"] = measure(lambda i: ai_engine.backend(single), iterations)
+    results[f"embed_batch{batch_size}"] = measure(
+        lambda i: ai_engine.backend(batch), max(3, iterations // batch_size), items_per_call=batch_size
+    )
+
+    # 4. Vector query (top-5), có và không có filter
+    rng = np.random.default_rng(env.seed)
+    queries = rng.standard_normal((64, 512)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    queries = queries.tolist()
+    filters = SearchFilters(category="vay", max_price=1_000_000)
+    results["vector_query"] = measure(lambda i: vector_store.search(queries[i % 64], k=5), iterations)
+    results["vector_query_filtered"] = measure(
+        lambda i: vector_store.search(queries[i % 64], k=5, filters=filters), iterations
+    )
+
+    # 5. Hydrate (id -> sản phẩm đầy đủ từ DB)
+    hits = [vector_store.search(q, k=5) for q in queries]
+    db = SessionLocal()
+    try:
+        results["hydrate"] = measure(lambda i: vector_store._hydrate(db, hits[i % 64], None), iterations)
+
+        # 6. Ghi trạng thái task như API + worker: PENDING chỉ vào Redis (task_state),
+        # kết quả cuối INSERT Postgres đúng 1 lần (finish_task)
+        products = vector_store._hydrate(db, hits[0], None)
+
+        def write_task(i):
+            task = new_task("bench.jpg")
+            task_state.save(task)
+            task.status = "COMPLETED"
+            task.result = build_search_result(products)
+            finish_task(db, task)
+
+        results["db_write"] = measure(write_task, iterations)
+    finally:
+        db.close()
+
+    # 7. Text: encode truy vấn (lần đầu) và cache hit
+    results["text_embed_cold"] = measure(lambda i: text_search.embed(f"vay hoa di bien {i} {uuid.uuid4().hex}"), iterations)
+    results["text_embed_cached"] = measure(lambda i: text_search.embed("vay hoa di bien"), iterations)
+
+    # 8. Worker end-to-end: S3 giả -> CLIP -> vector DB -> hydrate -> commit (cache miss mỗi lần)
+    def worker_task(i):
+        data = pick(i) + uuid.uuid4().bytes  # JPEG bỏ qua byte thừa sau EOI -> hash mới, cache miss
+        image_hash = hash_image(data)
+        storage.put_bytes(data, f"{image_hash}.jpg", "image/jpeg", sha256_hex=image_hash)
+        task = new_task(f"{image_hash}.jpg")
+        task_state.save(task)
+        process_visual_search(
+            str(task.id),
+            image_hash,
+            None,
+            user_id=str(task.user_id),
+            input_image_url=task.input_image_url,
+            created_at=task.created_at.isoformat(),
+        )
+
+    results["worker_process_visual_search"] = measure(worker_task, iterations)
+    env.worker_pool.reset()  # chờ các attach_stylist_advice mà worker_task đẩy đi chạy xong, xoá số đo
+    return results
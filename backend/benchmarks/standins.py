@@ -0,0 +1,344 @@
+"""
+Stand-in cục bộ cho mọi dịch vụ ngoài, để benchmark chạy offline và lặp lại được:
+
+- Postgres  -> SQLite (file trong thư mục làm việc; async qua aiosqlite)
+- Redis     -> fakeredis (sync + async dùng chung 1 server giả)
+- Vector DB -> flat index (VECTOR_STORE_BACKEND=flat) trong thư mục làm việc
+- S3/MinIO  -> client giả ghi file lên filesystem (StorageService thật chạy bên trên)
+- Gemini    -> FakeLLM (STYLIST_LLM_BACKEND=fake)
+- CLIP      -> cấu hình nhỏ, weight ngẫu nhiên (seed cố định); tokenizer băm từ
+- Celery    -> thread pool trong process thay cho `.delay()`
+
+install() phải được gọi TRƯỚC khi import các module app khác (ngoài config):
+các module app bind client/session ở thời điểm import.
+"""
+import io
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Biến môi trường bắt buộc của Settings (giá trị giả, không kết nối đi đâu cả)
+DEFAULT_ENV = {
+    "POSTGRES_USER": "bench",
+    "POSTGRES_PASSWORD": "bench",
+    "POSTGRES_DB": "bench",
+    "S3_ENDPOINT": "http://s3.invalid",
+    "S3_ACCESS_KEY": "bench",
+    "S3_SECRET_KEY": "bench",
+    "S3_BUCKET_NAME": "bench",
+    "REDIS_PASSWORD": "bench",
+    "GEMINI_API_KEY": "bench",
+    "STYLIST_LLM_BACKEND": "fake",
+    "VECTOR_STORE_BACKEND": "flat",
+    "CLIP_WARMUP_ON_STARTUP": "false",
+    "TEXT_WARMUP_ON_STARTUP": "false",
+    # Kịch bản tải chạy bằng 1 user: đo luồng tìm kiếm, không đo rate limit
+    "RATE_LIMIT_SEARCH_PER_MINUTE": "0",
+    "HF_HUB_OFFLINE": "1",
+}
+
+CATEGORIES = ["ao", "quan", "vay", "giay", "tui", "phu-kien"]
+
+
+# --- S3 trên filesystem ---
+class _FileBody:
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+
+    def iter_chunks(self, chunk_size: int):
+        while chunk := self._file.read(chunk_size):
+            yield chunk
+
+    def read(self) -> bytes:
+        return self._file.read()
+
+    def close(self):
+        self._file.close()
+
+
+class FilesystemS3Client:
+    """Đủ API boto3 mà StorageService dùng: put/get object, head/create bucket, presign."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, bucket, key)
+
+    def head_bucket(self, Bucket):
+        os.makedirs(os.path.join(self.root, Bucket), exist_ok=True)
+
+    create_bucket = head_bucket
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(Body)
+        os.replace(tmp, path)
+        return {}
+
+    def get_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        return {"ContentLength": os.path.getsize(path), "Body": _FileBody(path)}
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn=3600):
+        return f"file://{self._path(Params['Bucket'], Params['Key'])}"
+
+
+# --- CLIP nhỏ, weight ngẫu nhiên ---
+class HashTokenizer:
+    """Thay CLIPTokenizer (cần file vocab tải từ HuggingFace): băm từng từ vào vocab nhỏ."""
+
+    def __init__(self, vocab_size: int, max_length: int = 77):
+        self.vocab_size = vocab_size
+        self.max_length = max_length
+
+    def __call__(self, texts, padding=True, truncation=True, return_tensors="pt"):
+        import torch
+
+        rows = [[1 + zlib.crc32(word.encode()) % (self.vocab_size - 1) for word in text.split()][: self.max_length] or [1] for text in texts]
+        width = max(len(row) for row in rows)
+        ids = torch.zeros((len(rows), width), dtype=torch.long)
+        mask = torch.zeros((len(rows), width), dtype=torch.long)
+        for i, row in enumerate(rows):
+            ids[i, : len(row)] = torch.tensor(row)
+            mask[i, : len(row)] = 1
+        return {"input_ids": ids, "attention_mask": mask}
+
+
+def build_tiny_clip(seed: int, hidden_size: int = 64, layers: int = 2):
+    """CLIP cùng input 224x224 và vector 512 chiều như model thật, nhưng encoder rất nhỏ."""
+    import torch
+    from transformers import CLIPConfig, CLIPModel
+
+    torch.manual_seed(seed)
+    config = CLIPConfig(
+        text_config=dict(
+            hidden_size=hidden_size, intermediate_size=hidden_size * 4, num_hidden_layers=layers,
+            num_attention_heads=4, vocab_size=4096,
+        ),
+        vision_config=dict(
+            hidden_size=hidden_size, intermediate_size=hidden_size * 4, num_hidden_layers=layers,
+            num_attention_heads=4, image_size=224, patch_size=32,
+        ),
+        projection_dim=512,
+    )
+    return CLIPModel(config).eval()
+
+
+# --- Celery giả ---
+class LocalWorkerPool:
+    """Thay `.delay()` của task Celery bằng thread pool trong process; đo thời gian chờ + chạy."""
+
+    def __init__(self, threads: int):
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="bench-worker")
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def bind(self, task):
+        name = task.name.rsplit(".", 1)[-1]
+
+        def delay(*args, **kwargs):
+            enqueued = time.perf_counter()
+
+            def run():
+                try:
+                    return task(*args, **kwargs)
+                finally:
+                    with self._lock:
+                        self.latencies[name].append(time.perf_counter() - enqueued)
+
+            future = self.executor.submit(run)
+            with self._lock:
+                self._pending.append(future)
+            return future
+
+        task.delay = delay
+
+    def drain(self):
+        while True:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+            for future in pending:
+                future.exception()
+
+    def reset(self):
+        self.drain()
+        with self._lock:
+            self.latencies = defaultdict(list)
+
+
+@dataclass
+class BenchEnv:
+    workdir: str
+    seed: int
+    worker_pool: LocalWorkerPool
+    product_ids: List[str] = field(default_factory=list)
+    user_id: uuid.UUID = None
+
+
+def install(workdir: str, seed: int = 0, worker_threads: int = 2, fresh: bool = True) -> BenchEnv:
+    if fresh and os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    os.makedirs(workdir, exist_ok=True)
+    for key, value in DEFAULT_ENV.items():
+        os.environ.setdefault(key, value)
+    os.environ["FLAT_INDEX_DIR"] = os.path.join(workdir, "flat_index")
+
+    random.seed(seed)
+    np.random.seed(seed)
+
+    # 1. Redis
+    import fakeredis
+    import fakeredis.aioredis
+    import app.core.redis_client as redis_module
+
+    server = fakeredis.FakeServer()
+    redis_module.redis_client = fakeredis.FakeRedis(server=server)
+    redis_module.async_redis_client = fakeredis.aioredis.FakeRedis(server=server)
+
+    # 2. Database: SQLite file (sync cho worker, aiosqlite cho API)
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.ext.asyncio import create_async_engine
+    import app.db.session as session_module
+
+    db_path = os.path.join(workdir, "bench.sqlite3")
+    sync_engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False, "timeout": 30})
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}", connect_args={"timeout": 30})
+
+    @event.listens_for(sync_engine, "connect")
+    def _wal(dbapi_connection, _):
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+    session_module.sync_engine = sync_engine
+    session_module.engine = async_engine
+    session_module.SessionLocal.configure(bind=sync_engine)
+    session_module.AsyncSessionLocal.configure(bind=async_engine)
+
+    from sqlalchemy.dialects.postgresql import UUID
+    from sqlalchemy.ext.compiler import compiles
+
+    @compiles(UUID, "sqlite")
+    def _uuid_as_char(type_, compiler, **kw):
+        return "CHAR(32)"
+
+    # Code app truyền id dạng str (driver Postgres tự ép kiểu), SQLite thì không
+    uuid_bind_processor = UUID.bind_processor
+
+    def _bind_processor(self, dialect):
+        process = uuid_bind_processor(self, dialect)
+        if dialect.name != "sqlite" or process is None:
+            return process
+        return lambda value: process(uuid.UUID(value) if isinstance(value, str) else value)
+
+    UUID.bind_processor = _bind_processor
+
+    import app.db.base  # noqa: F401  (đăng ký mọi model vào metadata)
+    from app.db.base_class import Base
+
+    Base.metadata.create_all(sync_engine)
+
+    # 3. S3
+    from app.services.storage import storage
+
+    storage._client = FilesystemS3Client(os.path.join(workdir, "s3"))
+    storage._pid = os.getpid()
+
+    # 4. CLIP nhỏ
+    from transformers import CLIPImageProcessor, CLIPTextModelWithProjection
+    from app.core.ai_engine import ai_engine
+    from app.core.inference_backends import create_backend
+    from app.core.preprocess import ClipPreprocessor
+
+    model = build_tiny_clip(seed)
+    ai_engine.processor = CLIPImageProcessor()
+    ai_engine.preprocessor = ClipPreprocessor.from_processor(ai_engine.processor)
+    ai_engine.backend = create_backend("eager", model)
+    text_model = CLIPTextModelWithProjection(model.config.text_config)
+    text_model.load_state_dict(model.state_dict(), strict=False)
+    ai_engine.text_model = text_model.eval()
+    ai_engine.tokenizer = HashTokenizer(model.config.text_config.vocab_size)
+
+    # 5. Celery -> thread pool trong process
+    import app.worker.tasks as tasks
+
+    pool = LocalWorkerPool(worker_threads)
+    pool.bind(tasks.process_visual_search)
+    pool.bind(tasks.attach_stylist_advice)
+
+    return BenchEnv(workdir=workdir, seed=seed, worker_pool=pool)
+
+
+def seed_catalog(env: BenchEnv, n_products: int, batch_size: int = 2000):
+    """N sản phẩm ngẫu nhiên (seed cố định) vào SQLite + flat index."""
+    from app.db.models.product import Product
+    from app.db.models.user import User
+    from app.db.session import SessionLocal
+    from app.db.vector_store import vector_store
+
+    rng = np.random.default_rng(env.seed)
+    ids = [uuid.UUID(int=int(rng.integers(0, 2**62)) << 64 | i) for i in range(n_products)]
+    with SessionLocal() as db:
+        env.user_id = uuid.UUID(int=env.seed + 1)
+        db.add(User(id=env.user_id, email="bench@example.com", hashed_password="x", full_name="Bench"))
+        for start in range(0, n_products, batch_size):
+            chunk = ids[start:start + batch_size]
+            rows = []
+            metadatas = []
+            for i, pid in enumerate(chunk, start=start):
+                category = CATEGORIES[i % len(CATEGORIES)]
+                price = float(rng.integers(50, 2000) * 1000)
+                rows.append(Product(
+                    id=pid, name=f"San pham {i}", description=f"Mo ta san pham {i}",
+                    price=price, currency="VND", image_url=f"/static/images/{i}.jpg", category=category,
+                ))
+                metadatas.append({"category": category, "price": price, "currency": "VND"})
+            db.add_all(rows)
+            vectors = rng.standard_normal((len(chunk), 512)).astype(np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            vector_store.add_products([str(pid) for pid in chunk], vectors.tolist(), metadatas)
+        db.commit()
+    env.product_ids = [str(pid) for pid in ids]
+
+
+def make_images(count: int, size=(1280, 960), seed: int = 0, quality: int = 88) -> List[bytes]:
+    """Ảnh JPEG tổng hợp giống ảnh chụp (gradient + nhiễu), khác nhau theo seed."""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    width, height = size
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    images = []
+    for _ in range(count):
+        fx, fy, phase = rng.uniform(1, 8, size=3)
+        base = np.stack([
+            np.sin(x / width * fx + phase),
+            np.cos(y / height * fy + phase),
+            np.sin((x + y) / (width + height) * (fx + fy)),
+        ], axis=-1)
+        noise = rng.normal(0, 0.15, size=base.shape)
+        pixels = np.clip((base + noise + 1) * 127.5, 0, 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, "JPEG", quality=quality)
+        images.append(buffer.getvalue())
+    return images
@@ -0,0 +1,44 @@
+import time
+from contextlib import contextmanager
+from typing import Callable, List
+
+import numpy as np
+
+
+def summarize(latencies: List[float], wall_seconds: float, items_per_call: int = 1) -> dict:
+    """Latency (giây) -> thống kê ms + throughput (item/giây theo wall-clock)."""
+    if not latencies:
+        return {"count": 0}
+    ms = np.asarray(latencies, dtype=np.float64) * 1000
+    return {
+        "count": len(latencies),
+        "items_per_call": items_per_call,
+        "throughput_per_s": round(len(latencies) * items_per_call / wall_seconds, 2) if wall_seconds > 0 else None,
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def measure(fn: Callable[[int], object], iterations: int, warmup: int = 3, items_per_call: int = 1) -> dict:
+    """Gọi fn(i) tuần tự `iterations` lần (sau `warmup` lần bỏ qua), đo từng lần."""
+    for i in range(warmup):
+        fn(i)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, time.perf_counter() - started, items_per_call)
+
+
+@contextmanager
+def stopwatch(latencies: List[float]):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        latencies.append(time.perf_counter() - t0)
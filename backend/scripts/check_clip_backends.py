@@ -0,0 +1,102 @@
+import argparse
+import glob
+import sys
+import os
+import time
+
+import torch
+from PIL import Image
+
+# Thêm đường dẫn để import được app
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.config import settings
+from app.core.inference_backends import BACKENDS, create_backend, load_processor, load_torch_model
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+def load_images(image_dir: str, limit: int):
+    paths = sorted(
+        path for path in glob.glob(os.path.join(image_dir, "**", "*"), recursive=True)
+        if path.lower().endswith(IMAGE_EXTENSIONS)
+    )[:limit]
+    if len(paths) < 2:
+        raise SystemExit(f"❌ Cần ít nhất 2 ảnh trong {image_dir}")
+    return paths, [Image.open(path).convert("RGB") for path in paths]
+
+
+def embed_all(backend, pixel_values: torch.Tensor, batch_size: int):
+    """Embed cả tập ảnh, trả (vector đã chuẩn hóa, ms/ảnh)."""
+    backend(pixel_values[:1])  # warm-up
+    chunks = []
+    t0 = time.perf_counter()
+    for start in range(0, len(pixel_values), batch_size):
+        chunks.append(backend(pixel_values[start:start + batch_size]))
+    elapsed = time.perf_counter() - t0
+    features = torch.cat(chunks)
+    features = features / features.norm(dim=-1, keepdim=True)
+    return features, elapsed * 1000 / len(pixel_values)
+
+
+def top_k(features: torch.Tensor, k: int) -> torch.Tensor:
+    """Mỗi ảnh làm query, tìm k ảnh gần nhất trong chính tập ảnh (bỏ chính nó)."""
+    scores = features @ features.T
+    scores.fill_diagonal_(float("-inf"))
+    return scores.topk(k, dim=1).indices
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="So sánh backend CLIP (int8, onnx) với fp32 eager: top-k overlap, cosine, tốc độ."
+    )
+    parser.add_argument("--image-dir", required=True, help="Thư mục ảnh cố định dùng làm tập kiểm tra")
+    parser.add_argument("--backends", nargs="+", default=["int8", "onnx"], choices=[b for b in BACKENDS if b != "eager"])
+    parser.add_argument("--limit", type=int, default=500, help="Số ảnh tối đa")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=settings.EMBED_BATCH_MAX_SIZE)
+    parser.add_argument("--min-overlap", type=float, default=0.9, help="Ngưỡng top-k overlap trung bình tối thiểu")
+    args = parser.parse_args()
+
+    torch.set_num_threads(settings.CLIP_INTRA_OP_THREADS)
+    paths, images = load_images(args.image_dir, args.limit)
+    k = min(args.k, len(images) - 1)
+
+    processor = load_processor()
+    pixel_values = processor(images=images, return_tensors="pt")["pixel_values"]
+
+    model = load_torch_model()
+    reference, reference_ms = embed_all(create_backend("eager", model), pixel_values, args.batch_size)
+    reference_top = top_k(reference, k)
+    print(f"📏 {len(paths)} ảnh, top-{k}, threads={settings.CLIP_INTRA_OP_THREADS}")
+    print(f"   eager fp32: {reference_ms:.1f} ms/ảnh")
+
+    failed = False
+    for name in args.backends:
+        try:
+            backend = create_backend(name, model)
+        except (FileNotFoundError, ImportError) as e:
+            print(f"⚠️ Bỏ qua {name}: {e}")
+            continue
+
+        features, ms = embed_all(backend, pixel_values, args.batch_size)
+        candidate_top = top_k(features, k)
+        overlap = sum(
+            len(set(a.tolist()) & set(b.tolist())) for a, b in zip(reference_top, candidate_top)
+        ) / (k * len(paths))
+        cosine = (features * reference).sum(dim=-1)
+
+        status = "✅" if overlap >= args.min_overlap else "❌"
+        failed |= overlap < args.min_overlap
+        print(
+            f"{status} {name}: top-{k} overlap={overlap:.3f}, cosine với fp32 "
+            f"min={cosine.min().item():.4f} mean={cosine.mean().item():.4f}, "
+            f"{ms:.1f} ms/ảnh ({reference_ms / ms:.2f}x)"
+        )
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
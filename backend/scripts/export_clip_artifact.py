@@ -0,0 +1,69 @@
+import argparse
+import sys
+import os
+
+import torch
+from safetensors.torch import save_file
+from transformers import CLIPImageProcessor, CLIPVisionModelWithProjection
+
+# Thêm đường dẫn để import được app
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.config import settings
+from app.core.inference_backends import ARTIFACT_WEIGHTS, export_onnx, load_image_tower
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export CLIP image tower (vision encoder + projection) ra safetensors để worker/API nạp nhanh bằng mmap."
+    )
+    parser.add_argument("--model-id", default=settings.CLIP_MODEL_ID)
+    parser.add_argument("--output", default=settings.CLIP_ARTIFACT_DIR)
+    parser.add_argument("--onnx", action="store_true", help="Export thêm image_tower.onnx cho backend onnx")
+    parser.add_argument("--onnx-int8", action="store_true", help="Export thêm image_tower.int8.onnx (ONNX Runtime dynamic quantization)")
+    args = parser.parse_args()
+
+    print(f"📥 Đang tải {args.model_id} ...")
+    # Chỉ lấy vision_model + visual_projection từ checkpoint CLIP đầy đủ (bỏ text tower)
+    model = CLIPVisionModelWithProjection.from_pretrained(args.model_id).eval()
+    processor = CLIPImageProcessor.from_pretrained(args.model_id)
+
+    # state_dict không chứa buffer non-persistent (position_ids) -> export kèm để
+    # load_image_tower dựng model trên meta device mà không phải khởi tạo gì thêm.
+    tensors = {name: tensor for name, tensor in model.named_buffers()}
+    tensors.update(model.state_dict())
+    tensors = {name: tensor.detach().contiguous() for name, tensor in tensors.items()}
+
+    os.makedirs(args.output, exist_ok=True)
+    save_file(tensors, os.path.join(args.output, ARTIFACT_WEIGHTS))
+    model.config.save_pretrained(args.output)
+    processor.save_pretrained(args.output)
+
+    # Kiểm tra artifact cho ra đúng vector như model gốc
+    pixel_values = torch.randn(2, 3, 224, 224)
+    with torch.no_grad():
+        expected = model(pixel_values=pixel_values).image_embeds
+        actual = load_image_tower(args.output)(pixel_values=pixel_values).image_embeds
+    max_diff = (expected - actual).abs().max().item()
+    if max_diff > 1e-5:
+        raise SystemExit(f"❌ Artifact lệch so với model gốc (max diff {max_diff:.2e})")
+
+    print(f"✅ Đã export artifact vào {args.output} (max diff {max_diff:.1e})")
+
+    if args.onnx or args.onnx_int8:
+        onnx_path = os.path.join(args.output, "image_tower.onnx")
+        export_onnx(model, onnx_path)
+        print(f"✅ Đã export ONNX: {onnx_path}")
+
+        if args.onnx_int8:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            int8_path = os.path.join(args.output, "image_tower.int8.onnx")
+            quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+            print(f"✅ Đã export ONNX int8: {int8_path}")
+
+        print("👉 Kiểm tra độ chính xác: python scripts/check_clip_backends.py --image-dir <thư mục ảnh>")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import sys
+import os
+
+# Thêm đường dẫn để import được app
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.ingestion import IngestionPipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Ingest catalog lớn từ manifest JSONL/CSV (stream, resume được sau crash)."
+    )
+    parser.add_argument("manifest", help="File manifest .jsonl hoặc .csv (mỗi dòng: sku, name, price, category, image, ...)")
+    parser.add_argument("--image-dir", help="Thư mục chứa ảnh local (cột 'image' là đường dẫn tương đối)")
+    parser.add_argument("--offline", action="store_true", help="Không tải ảnh qua mạng, chỉ đọc từ --image-dir")
+    parser.add_argument("--checkpoint", help="File checkpoint (mặc định: <manifest>.checkpoint.json)")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Số record mỗi lần ghi DB + Vector DB")
+    parser.add_argument("--embed-batch-size", type=int, default=32, help="Số ảnh mỗi forward pass CLIP")
+    parser.add_argument("--fetch-workers", type=int, default=16, help="Số thread tải ảnh song song")
+    parser.add_argument("--report-every", type=int, default=10, help="In thống kê sau mỗi N chunk")
+    parser.add_argument(
+        "--enqueue", action="store_true",
+        help="Gửi sang worker lane 'ingestion' thay vì chạy tại chỗ (đường dẫn phải đọc được từ worker)",
+    )
+    args = parser.parse_args()
+
+    options = dict(
+        checkpoint_path=args.checkpoint,
+        image_dir=args.image_dir,
+        offline=args.offline,
+        chunk_size=args.chunk_size,
+        embed_batch_size=args.embed_batch_size,
+        fetch_workers=args.fetch_workers,
+        report_every=args.report_every,
+    )
+    if args.enqueue:
+        from app.worker.tasks import ingest_catalog
+
+        result = ingest_catalog.delay(args.manifest, **options)
+        print(f"📨 Đã gửi task import catalog {result.id} vào queue 'ingestion'")
+        return
+
+    pipeline = IngestionPipeline(manifest_path=args.manifest, **options)
+    pipeline.run()
+
+
+if __name__ == "__main__":
+    main()
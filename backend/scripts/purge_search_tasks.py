@@ -0,0 +1,26 @@
+import argparse
+import sys
+import os
+
+# Thêm đường dẫn để import được app
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.config import settings
+from app.services.task_retention import TaskRetention
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Dọn bảng search_tasks ngay (như job Celery beat): tạo partition tháng tới, drop partition hết hạn, xoá theo batch."
+    )
+    parser.add_argument("--retention-days", type=int, default=settings.SEARCH_TASK_RETENTION_DAYS)
+    parser.add_argument("--batch-size", type=int, default=settings.SEARCH_TASK_PURGE_BATCH_SIZE)
+    parser.add_argument("--archive", action="store_true", default=settings.SEARCH_TASK_ARCHIVE_ENABLED,
+                        help="Lưu task ra S3 (JSONL gzip) trước khi xoá")
+    args = parser.parse_args()
+
+    TaskRetention(args.retention_days, args.batch_size, args.archive).run()
+
+
+if __name__ == "__main__":
+    main()
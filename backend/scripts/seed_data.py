@@ -93,7 +93,12 @@ async def seed():
             
             # 5. Lưu vào ChromaDB
             # ID trong Chroma phải khớp ID Postgres (convert sang string)
-            vector_store.add_product(str(product_id), vector)
+            # Metadata (category, price, currency) để filter pushdown khi tìm kiếm
+            vector_store.add_product(
+                str(product_id),
+                vector,
+                {"category": item["category"], "price": float(item["price"]), "currency": "VND"}
+            )
             
             print(f"✅ Đã thêm: {item['name']} (ID: {product_id})")
 
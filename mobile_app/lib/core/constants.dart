@@ -7,6 +7,7 @@ class ApiConstants {
   static const String baseUrl = "http://10.0.2.2:8000"; 
   // static const String baseUrl = "http://192.168.1.15:8000"; 
 
+  static const String loginEndpoint = "$baseUrl/api/v1/auth/login";
   static const String searchEndpoint = "$baseUrl/api/v1/search/visual";
   static const String adviceEndpoint = "$baseUrl/api/v1/stylist/advice";
 }
\ No newline at end of file
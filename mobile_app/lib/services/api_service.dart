@@ -5,6 +5,31 @@ import '../core/constants.dart';
 class ApiService {
   final Dio _dio = Dio();
 
+  // Access token (JWT) dùng chung cho mọi ApiService, có sau khi login()
+  static String? accessToken;
+
+  ApiService() {
+    // Gắn "Authorization: Bearer <token>" vào mọi request (search + stylist đều yêu cầu đăng nhập)
+    _dio.interceptors.add(InterceptorsWrapper(
+      onRequest: (options, handler) {
+        if (accessToken != null) {
+          options.headers['Authorization'] = 'Bearer $accessToken';
+        }
+        handler.next(options);
+      },
+    ));
+  }
+
+  // 0. Đăng nhập (OAuth2 password form) -> lưu access token
+  Future<void> login(String email, String password) async {
+    Response response = await _dio.post(
+      ApiConstants.loginEndpoint,
+      data: {"username": email, "password": password},
+      options: Options(contentType: Headers.formUrlEncodedContentType),
+    );
+    accessToken = response.data['access_token'];
+  }
+
   // 1. Gửi ảnh tìm kiếm (Visual Search)
   Future<List<dynamic>> searchByImage(File imageFile) async {
     try {
@@ -59,6 +84,11 @@ class ApiService {
       
     } catch (e) {
       print("Stylist Error: $e");
+      // 429: vượt giới hạn số request -> chờ theo Retry-After
+      if (e is DioException && e.response?.statusCode == 429) {
+        final retryAfter = e.response?.headers.value('retry-after') ?? '?';
+        return "Bạn hỏi hơi nhanh, thử lại sau $retryAfter giây nhé.";
+      }
       return "Xin lỗi, stylist đang bận hoặc mất kết nối. Vui lòng thử lại sau.";
     }
   }